@@ -6,5 +6,8 @@ class AccountsConfig(AppConfig):
     name = "accounts"
 
     def ready(self):
-        # Import signals if any
-        pass
+        from django.conf import settings
+        from .indexes import set_auto_create_index
+
+        # Every app's models are imported by now, so this covers them all
+        set_auto_create_index(getattr(settings, "MONGODB_AUTO_CREATE_INDEX", True))
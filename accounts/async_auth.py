@@ -0,0 +1,202 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+import jwt
+from django.conf import settings
+from django.core.cache import cache
+from pymongo import AsyncMongoClient
+from redis import asyncio as aioredis
+from .authentication import JWTAuthentication
+from .broadcast import broadcast
+from .jwt_utils import JWTUtils
+from .models import User
+from .user_cache import is_missing, user_cache
+
+logger = logging.getLogger("accounts")
+
+# Identity fields loaded from MongoDB, as in JWTUtils._load_user_identity
+IDENTITY_PROJECTION = {
+    "email": 1,
+    "username": 1,
+    "is_active": 1,
+    "is_staff": 1,
+    "is_superuser": 1,
+}
+
+
+class AsyncAuthenticator:
+    """
+    Event-loop friendly counterpart of ``JWTUtils.authenticate_token``.
+
+    Signature, expiry, blacklist, generation and identity handling are the
+    sync path's own helpers; only the I/O differs: Redis goes through
+    ``redis.asyncio`` and MongoDB through pymongo's ``AsyncMongoClient``.
+    Keys and values are encoded exactly as django-redis does, so both paths
+    share one cache.
+
+    Clients are created on first use and bound to that event loop, which
+    matches one ASGI server loop per worker process.
+    """
+
+    def __init__(self):
+        self._redis = None
+        self._users = None
+
+    @property
+    def redis(self):
+        if self._redis is None:
+            options = settings.CACHES["default"].get("OPTIONS", {})
+            self._redis = aioredis.Redis.from_url(
+                settings.CACHES["default"]["LOCATION"],
+                **options.get("CONNECTION_POOL_KWARGS", {}),
+            )
+        return self._redis
+
+    @property
+    def users(self):
+        if self._users is None:
+            mongo = settings.MONGODB_SETTINGS
+            client = AsyncMongoClient(
+                host=mongo["host"],
+                port=mongo["port"],
+                username=mongo.get("username") or None,
+                password=mongo.get("password") or None,
+                authSource=mongo.get("authentication_source", "admin"),
+            )
+            self._users = client[mongo["db"]][User._get_collection_name()]
+        return self._users
+
+    async def preauthenticate(self, request):
+        """
+        Authenticate a Django request ahead of the (sync) DRF view.
+
+        The outcome is left on the request as ``jwt_preauth`` for
+        ``JWTAuthentication``, which then does no I/O of its own. On
+        infrastructure errors nothing is left and the sync path runs as
+        usual.
+        """
+        authentication = JWTAuthentication()
+        header = authentication.get_authorization_header(request)
+        token = authentication.get_token_from_header(header) if header else None
+        if not token:
+            return
+
+        try:
+            payload, identity = await self.authenticate_token(token)
+        except jwt.InvalidTokenError as e:
+            request.jwt_preauth = (token, None, None, e)
+        except Exception as e:
+            logger.warning(f"Async authentication failed, falling back: {e}")
+        else:
+            request.jwt_preauth = (token, payload, identity, None)
+
+    async def authenticate_token(self, token):
+        """
+        Validate an access token and resolve its user without blocking.
+
+        Returns:
+            tuple: (payload, identity); identity is None if the user is gone
+
+        Raises:
+            jwt.InvalidTokenError: If the token is invalid, expired, revoked
+                or not an access token
+        """
+        broadcast.start()
+
+        payload = JWTUtils._verify_signature(token)
+        JWTUtils._check_expiry(payload, allow_grace_period=True)
+
+        if payload.get("token_type") != "access":
+            raise jwt.InvalidTokenError("Invalid token type")
+        user_id = payload.get("user_id")
+        if not user_id:
+            raise jwt.InvalidTokenError("Invalid token payload")
+
+        keys = JWTUtils._revocation_keys(payload)
+        identity, version = user_cache.get_local(user_id)
+        if identity is None:
+            keys.append(user_cache.key(user_id))
+
+        state = await self.get_many(keys)
+        JWTUtils._check_revocation(payload, state)
+
+        if identity is None:
+            identity = state.get(user_cache.key(user_id))
+            if identity is not None:
+                user_cache.remember(user_id, identity, version)
+            else:
+                return payload, await self.load_user_identity(user_id)
+        return payload, None if is_missing(identity) else identity
+
+    async def load_user_identity(self, user_id):
+        """Async ``JWTUtils._load_user_identity`` (single-flight, negative cache)."""
+        wait = settings.JWT_SETTINGS.get(
+            "USER_LOAD_WAIT", timedelta(seconds=2)
+        ).total_seconds()
+        lock_key = cache.make_key(f"user_lock:{user_id}")
+
+        locked = await self.redis.set(lock_key, 1, nx=True, ex=max(1, int(wait)))
+        if not locked:
+            identity = await self._wait_for_identity(user_id, wait)
+            if identity is not None:
+                return None if is_missing(identity) else identity
+
+        try:
+            document = await self.users.find_one(
+                {"_id": user_id}, projection=IDENTITY_PROJECTION
+            )
+            if document is None:
+                await self.set(
+                    user_cache.key(user_id),
+                    {"id": str(user_id), "missing": True},
+                    settings.JWT_SETTINGS.get("USER_NEGATIVE_CACHE_TIMEOUT", 60),
+                )
+                return None
+
+            identity = {
+                "id": str(document["_id"]),
+                "email": document.get("email"),
+                "username": document.get("username"),
+                "is_active": document.get("is_active", True),
+                "is_staff": document.get("is_staff", False),
+                "is_superuser": document.get("is_superuser", False),
+            }
+            _, version = user_cache.get_local(user_id)
+            await self.set(user_cache.key(user_id), identity, user_cache.timeout)
+            user_cache.remember(user_id, identity, version)
+            return identity
+        finally:
+            if locked:
+                await self.redis.delete(lock_key)
+
+    async def _wait_for_identity(self, user_id, wait):
+        key = user_cache.key(user_id)
+        deadline = time.monotonic() + wait
+
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+            identity = (await self.get_many([key])).get(key)
+            if identity is not None:
+                return identity
+        return None
+
+    async def get_many(self, keys):
+        """``cache.get_many`` over the async client."""
+        if not keys:
+            return {}
+        values = await self.redis.mget([cache.make_key(key) for key in keys])
+        return {
+            key: cache.client.decode(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    async def set(self, key, value, timeout):
+        """``cache.set`` over the async client."""
+        await self.redis.set(
+            cache.make_key(key), cache.client.encode(value), ex=int(timeout)
+        )
+
+
+async_authenticator = AsyncAuthenticator()
@@ -1,7 +1,6 @@
 from django.contrib.auth.backends import BaseBackend
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from django.core.cache import cache
 import jwt
 from .models import User
 from .jwt_utils import JWTUtils
@@ -20,13 +19,17 @@ class MongoEngineBackend(BaseBackend):
 
         if email and password:
             try:
-                user = User.objects.get(email=email)
+                user = (
+                    User.objects.profile("auth")
+                    .case_insensitive()
+                    .get(email=User.normalize_email(email))
+                )
                 if user.check_password(password) and user.is_active:
                     # Update last login
                     from datetime import datetime
+                    from .last_login import record_login
 
-                    user.last_login = datetime.utcnow()
-                    user.save()
+                    record_login(user, datetime.utcnow())
                     return user
             except User.DoesNotExist:
                 pass
@@ -35,11 +38,72 @@ class MongoEngineBackend(BaseBackend):
     def get_user(self, user_id):
         """Get user by ID."""
         try:
-            return User.objects.get(id=user_id)
+            return User.objects.profile("auth").get(id=user_id)
         except User.DoesNotExist:
             return None
 
 
+class AuthenticatedUser:
+    """
+    Request user built from the cached identity.
+
+    Carries the identity fields, which is all authentication and permission
+    checks need. Any other attribute loads the full ``User`` document once
+    and is served from it for the rest of the request; views that need the
+    document itself (to modify and save it) call ``load()``.
+    """
+
+    __slots__ = (
+        "id",
+        "email",
+        "username",
+        "is_active",
+        "is_staff",
+        "is_superuser",
+        "_user",
+    )
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, identity):
+        self.id = identity["id"]
+        self.email = identity["email"]
+        self.username = identity["username"]
+        self.is_active = identity["is_active"]
+        # Identities cached before these fields were added lack them
+        self.is_staff = identity.get("is_staff", False)
+        self.is_superuser = identity.get("is_superuser", False)
+        self._user = None
+
+    @property
+    def pk(self):
+        return self.id
+
+    def load(self):
+        """
+        Return the full User document, fetching it on first use.
+
+        Raises:
+            User.DoesNotExist: If the user was deleted
+        """
+        if self._user is None:
+            self._user = User.objects.profile("full").get(id=self.id)
+        return self._user
+
+    def __getattr__(self, name):
+        # Only called for attributes not set above
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.load(), name)
+
+    def __str__(self):
+        return self.email
+
+    def __repr__(self):
+        return f"<AuthenticatedUser: {self.email}>"
+
+
 class JWTAuthentication(BaseAuthentication):
     """
     Custom JWT authentication for Django REST Framework.
@@ -62,7 +126,7 @@ class JWTAuthentication(BaseAuthentication):
         if not token:
             return None
 
-        return self.authenticate_credentials(token)
+        return self.authenticate_credentials(token, request)
 
     def get_authorization_header(self, request):
         """Get authorization header from request."""
@@ -88,12 +152,17 @@ class JWTAuthentication(BaseAuthentication):
         except UnicodeDecodeError:
             return None
 
-    def authenticate_credentials(self, token):
+    def authenticate_credentials(self, token, request=None):
         """
         Authenticate user from JWT token.
 
+        Tokens that expired within ACCESS_TOKEN_GRACE_PERIOD are still
+        accepted. When the client should refresh soon, a hint is left on the
+        request for TokenRefreshMiddleware to turn into response headers.
+
         Args:
             token: JWT token string
+            request: Request being authenticated (optional)
 
         Returns:
             tuple: (user, token)
@@ -102,27 +171,30 @@ class JWTAuthentication(BaseAuthentication):
             AuthenticationFailed: If authentication fails
         """
         try:
-            # Decode and validate token
-            payload = JWTUtils.decode_token(token)
-
-            # Check token type
-            if payload.get("token_type") != "access":
-                raise AuthenticationFailed("Invalid token type")
-
-            user_id = payload.get("user_id")
-            if not user_id:
-                raise AuthenticationFailed("Invalid token payload")
-
-            # Try to get user from cache first
-            cached_user = cache.get(f"user:{user_id}")
-            if cached_user and cached_user.get("is_active"):
-                # Create a minimal user object for the request
-                user = self.get_cached_user(cached_user)
+            # Under ASGI, AsyncJWTAuthenticationMiddleware has already done
+            # this without blocking; otherwise validate the token and fetch
+            # the user's identity in a single Redis round trip
+            django_request = getattr(request, "_request", request)
+            preauth = getattr(django_request, "jwt_preauth", None)
+            if preauth is not None and preauth[0] == token:
+                _, payload, identity, error = preauth
+                if error is not None:
+                    raise error
             else:
-                # Get user from database
-                user = User.objects.get(id=user_id)
-                if not user.is_active:
-                    raise AuthenticationFailed("User account is disabled")
+                payload, identity = JWTUtils.authenticate_token(token)
+            if identity is None:
+                raise AuthenticationFailed("User not found")
+            if not identity["is_active"]:
+                raise AuthenticationFailed("User account is disabled")
+
+            # The full document is only loaded if a view asks for it
+            user = AuthenticatedUser(identity)
+
+            if request is not None:
+                hint = JWTUtils.refresh_hint(payload)
+                if hint:
+                    # Set on the Django request, which is what middleware sees
+                    django_request.token_refresh_hint = hint
 
             return (user, token)
 
@@ -133,20 +205,6 @@ class JWTAuthentication(BaseAuthentication):
         except Exception as e:
             raise AuthenticationFailed(f"Authentication failed: {str(e)}")
 
-    def get_cached_user(self, cached_user):
-        """Create user object from cached data."""
-
-        class CachedUser:
-            def __init__(self, data):
-                self.id = data["id"]
-                self.email = data["email"]
-                self.username = data["username"]
-                self.is_active = data["is_active"]
-                self.is_authenticated = True
-                self.is_anonymous = False
-
-        return CachedUser(cached_user)
-
     def authenticate_header(self, request):
         """Return authentication header for 401 responses."""
         return "Bearer"
@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from django.core.cache import cache
+from .bloom import BloomFilter
+
+logger = logging.getLogger("accounts")
+
+BLACKLIST_CHANNEL = "jwt:blacklist"
+
+
+class BlacklistFilter:
+    """
+    Per-worker Bloom filter of blacklisted token ids.
+
+    The filter is rebuilt from the ``blacklist:*`` keys in Redis whenever
+    the pub/sub subscription (re)connects and every ``rebuild_interval``
+    seconds after that, which also sheds jtis whose blacklist entry has
+    expired. Between rebuilds it is kept current by messages published from
+    ``JWTUtils.blacklist_token``. While there is no filter (before the first
+    subscription, or after losing it) every lookup reports a possible match,
+    so callers fall back to Redis.
+    """
+
+    def __init__(self, capacity=100000, error_rate=0.001, rebuild_interval=600):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_interval = rebuild_interval
+        self._filter = None
+        self._lock = threading.Lock()
+        self._rebuild_lock = threading.Lock()
+        self._arrived_during_scan = None
+        self._rebuilding = False
+        self._next_rebuild = 0.0
+        # Bumped by every invalidation; a rebuild that started before one
+        # must not install its filter after it
+        self._version = 0
+
+    @property
+    def ready(self):
+        return self._filter is not None
+
+    def might_contain(self, jti):
+        """
+        Return False only if the jti is definitely not blacklisted.
+
+        A True result must be confirmed against Redis.
+        """
+        bloom = self._filter
+        if bloom is None:
+            return True
+
+        if time.monotonic() >= self._next_rebuild:
+            self._schedule_rebuild()
+        return bloom.might_contain(jti)
+
+    def invalidate(self):
+        """
+        Drop the filter until the next rebuild.
+
+        Called when the pub/sub subscription is lost: blacklist messages
+        published while disconnected would be missed, so every lookup goes
+        to Redis until the subscription is back and the filter rebuilt.
+        """
+        with self._lock:
+            self._version += 1
+            self._filter = None
+
+    def add(self, jti):
+        """Record a newly blacklisted jti."""
+        with self._lock:
+            if self._filter is not None:
+                self._filter.add(jti)
+            if self._arrived_during_scan is not None:
+                self._arrived_during_scan.append(jti)
+
+    def rebuild(self, version=None):
+        """
+        Replace the filter with one built from the keys in Redis.
+
+        Args:
+            version: Invalidation count the rebuild was scheduled under
+                (defaults to the current one); the new filter is discarded
+                if ``invalidate`` has been called since
+        """
+        with self._rebuild_lock:
+            with self._lock:
+                # Pushed forward first so a failing Redis isn't hammered
+                self._next_rebuild = time.monotonic() + self.rebuild_interval
+                self._arrived_during_scan = []
+                if version is None:
+                    version = self._version
+
+            try:
+                jtis = [
+                    key.split(":", 1)[1]
+                    for key in cache.iter_keys("blacklist:*", itersize=1000)
+                ]
+                bloom = BloomFilter(
+                    capacity=max(self.capacity, 2 * len(jtis)),
+                    error_rate=self.error_rate,
+                )
+                for jti in jtis:
+                    bloom.add(jti)
+
+                with self._lock:
+                    if version != self._version:
+                        # The subscription dropped meanwhile; messages are
+                        # being missed, so lookups must keep going to Redis
+                        logger.info("Token blacklist filter rebuild discarded")
+                        return
+                    # Messages delivered while SCAN was running may have
+                    # missed the keyspace snapshot
+                    for jti in self._arrived_during_scan:
+                        bloom.add(jti)
+                    self._filter = bloom
+            finally:
+                with self._lock:
+                    self._arrived_during_scan = None
+
+        logger.info(f"Token blacklist filter rebuilt with {len(jtis)} entries")
+
+    def _schedule_rebuild(self):
+        with self._lock:
+            if self._rebuilding:
+                return
+            self._rebuilding = True
+            self._next_rebuild = time.monotonic() + self.rebuild_interval
+            version = self._version
+
+        threading.Thread(
+            target=self._rebuild_in_background,
+            args=(version,),
+            name="blacklist-rebuild",
+            daemon=True,
+        ).start()
+
+    def _rebuild_in_background(self, version):
+        try:
+            self.rebuild(version)
+        except Exception as e:
+            logger.warning(f"Token blacklist filter rebuild failed: {e}")
+        finally:
+            with self._lock:
+                self._rebuilding = False
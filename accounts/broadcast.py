@@ -0,0 +1,139 @@
+import logging
+import os
+import threading
+import time
+from django_redis import get_redis_connection
+
+logger = logging.getLogger("accounts")
+
+
+class Broadcast:
+    """
+    Per-worker Redis pub/sub listener that fans messages out to handlers.
+
+    Handlers run on a single daemon thread, so they must be quick and
+    thread-safe. ``on_connect`` callbacks run every time the subscription
+    is (re-)established, which is where subscribers resynchronise any state
+    they may have missed; ``on_disconnect`` callbacks run when it is lost.
+    """
+
+    def __init__(self, alias="default", reconnect_delay=1.0):
+        self.alias = alias
+        self.reconnect_delay = reconnect_delay
+        self._handlers = {}  # channel -> [handler]
+        self._on_connect = []
+        self._on_disconnect = []
+        self._lock = threading.Lock()
+        self._pending = set()  # channels registered after the thread started
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, channel, handler, on_connect=None, on_disconnect=None):
+        """
+        Register a handler for messages on ``channel``.
+
+        Args:
+            channel: Redis channel name
+            handler: Callable taking the decoded message string
+            on_connect: Optional callable run after every (re)subscription
+            on_disconnect: Optional callable run when the subscription drops
+        """
+        with self._lock:
+            self._handlers.setdefault(channel, []).append(handler)
+            if on_connect is not None:
+                self._on_connect.append(on_connect)
+            if on_disconnect is not None:
+                self._on_disconnect.append(on_disconnect)
+            self._pending.add(channel)
+
+    def publish(self, channel, message):
+        """Publish a message to every worker (including this one)."""
+        try:
+            get_redis_connection(self.alias).publish(channel, message)
+        except Exception as e:
+            logger.warning(f"Broadcast publish to {channel} failed: {e}")
+
+    def start(self):
+        """Start the listener thread once per process (safe to call often)."""
+        pid = os.getpid()
+        if (self._thread is not None and self._pid == pid) or not self._handlers:
+            return
+
+        with self._lock:
+            # A forked worker inherits the attribute but not the thread
+            if self._thread is not None and self._pid == pid:
+                return
+            self._pid = pid
+            self._pending = set(self._handlers)
+            self._thread = threading.Thread(
+                target=self._run, name="accounts-broadcast", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                logger.warning(f"Broadcast listener disconnected: {e}")
+            self._run_callbacks(self._on_disconnect)
+            time.sleep(self.reconnect_delay)
+
+    def _listen(self):
+        pubsub = get_redis_connection(self.alias).pubsub(
+            ignore_subscribe_messages=True
+        )
+        try:
+            with self._lock:
+                channels = list(self._handlers)
+                self._pending.clear()
+            if channels:
+                pubsub.subscribe(*channels)
+
+            # Subscribed before resync, so nothing published in between is lost
+            self._run_callbacks(self._on_connect)
+
+            while True:
+                with self._lock:
+                    pending = list(self._pending)
+                    self._pending.clear()
+                if pending:
+                    pubsub.subscribe(*pending)
+                    self._run_callbacks(self._on_connect)
+
+                if not pubsub.subscribed:
+                    time.sleep(self.reconnect_delay)
+                    continue
+
+                message = pubsub.get_message(timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+                self._dispatch(message["channel"], message["data"])
+        finally:
+            pubsub.close()
+
+    def _run_callbacks(self, registry):
+        with self._lock:
+            callbacks = list(registry)
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.warning(f"Broadcast callback failed: {e}")
+
+    def _dispatch(self, channel, data):
+        if isinstance(channel, bytes):
+            channel = channel.decode("utf-8")
+        if isinstance(data, bytes):
+            data = data.decode("utf-8")
+
+        with self._lock:
+            handlers = list(self._handlers.get(channel, ()))
+        for handler in handlers:
+            try:
+                handler(data)
+            except Exception as e:
+                logger.warning(f"Broadcast handler for {channel} failed: {e}")
+
+
+broadcast = Broadcast()
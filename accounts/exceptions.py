@@ -29,6 +29,12 @@ def custom_exception_handler(exc, context):
             custom_response_data["message"] = "Resource not found"
         elif response.status_code == 400:
             custom_response_data["message"] = "Bad request"
+        elif response.status_code == 429:
+            # DRF has set Retry-After from the throttle's wait()
+            custom_response_data["message"] = "Too many requests"
+        elif response.status_code == 503:
+            custom_response_data["message"] = "Service temporarily unavailable"
+            response["Retry-After"] = "1"
         elif response.status_code >= 500:
             custom_response_data["message"] = "Internal server error"
             logger.error(f"Server error: {exc}", exc_info=True)
@@ -0,0 +1,128 @@
+import json
+import logging
+import os
+import threading
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+    get_hasher,
+)
+
+logger = logging.getLogger("accounts")
+
+
+class Calibration:
+    """
+    Hasher choice and cost parameters measured on this host.
+
+    Written by ``manage.py calibrate_password_hasher`` to
+    PASSWORD_HASHER_CALIBRATION_FILE as::
+
+        {"preferred": "bcrypt_sha256",
+         "params": {"bcrypt_sha256": {"rounds": 12}, ...}}
+
+    The file is re-read when its modification time changes, so a new
+    calibration takes effect without a restart. Without a file Django's
+    defaults apply.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._data = {}
+        self._lock = threading.Lock()
+
+    @property
+    def data(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        if mtime != self._mtime:
+            with self._lock:
+                if mtime != self._mtime:
+                    self._data = self._load() if mtime is not None else {}
+                    self._mtime = mtime
+        return self._data
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring password hasher calibration {self.path}: {e}")
+            return {}
+
+    def param(self, algorithm, name, default):
+        """Calibrated value of one hasher parameter."""
+        return self.data.get("params", {}).get(algorithm, {}).get(name, default)
+
+    @property
+    def preferred(self):
+        """Algorithm new hashes should use ("default" means PASSWORD_HASHERS[0])."""
+        return self.data.get("preferred") or "default"
+
+
+calibration = Calibration(
+    getattr(settings, "PASSWORD_HASHER_CALIBRATION_FILE", "password_hasher.json")
+)
+
+
+def preferred_hasher():
+    """
+    Return the hasher new and upgraded password hashes should use.
+
+    Falls back to the default hasher if the calibrated algorithm is not in
+    PASSWORD_HASHERS.
+    """
+    try:
+        return get_hasher(calibration.preferred)
+    except ValueError:
+        logger.error(
+            f"Calibrated password hasher {calibration.preferred!r} is not in "
+            "PASSWORD_HASHERS; using the default"
+        )
+        return get_hasher()
+
+
+# The hashers below keep Django's algorithm names, so existing hashes keep
+# verifying, and take their cost from the calibration. Django's must_update
+# compares a stored hash's cost with these values in both directions, so a
+# successful login re-hashes passwords to the calibrated cost. Costs never
+# go below Django's defaults, whatever the calibration file says, so that
+# re-hash can never weaken a password below the stock settings.
+
+
+class CalibratedPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    @property
+    def iterations(self):
+        default = PBKDF2PasswordHasher.iterations
+        return max(calibration.param(self.algorithm, "iterations", default), default)
+
+
+class CalibratedBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    @property
+    def rounds(self):
+        default = BCryptSHA256PasswordHasher.rounds
+        return max(calibration.param(self.algorithm, "rounds", default), default)
+
+
+class CalibratedArgon2PasswordHasher(Argon2PasswordHasher):
+    @property
+    def time_cost(self):
+        default = Argon2PasswordHasher.time_cost
+        return max(calibration.param(self.algorithm, "time_cost", default), default)
+
+    @property
+    def memory_cost(self):
+        default = Argon2PasswordHasher.memory_cost
+        return max(calibration.param(self.algorithm, "memory_cost", default), default)
+
+    @property
+    def parallelism(self):
+        return calibration.param(
+            self.algorithm, "parallelism", Argon2PasswordHasher.parallelism
+        )
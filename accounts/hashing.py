@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+logger = logging.getLogger("accounts")
+
+
+class PasswordHashingBusy(APIException):
+    """Raised when a hash could not start within the queue timeout."""
+
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many password operations in progress, retry shortly."
+    default_code = "password_hashing_busy"
+
+
+class PasswordHashingExecutor:
+    """
+    Per-worker concurrency cap for password hashing.
+
+    At most ``max_concurrency`` hashes run at once in this process; callers
+    beyond that wait up to ``queue_timeout`` seconds for a slot and then get
+    ``PasswordHashingBusy``. A login burst therefore queues behind the cap
+    instead of taking every CPU the worker has, and other endpoints keep
+    their share. PBKDF2, bcrypt and argon2 release the GIL while hashing,
+    so the slots run in parallel.
+
+    ``run`` executes in the calling thread (no hand-off for WSGI workers);
+    ``arun`` runs on a private thread pool sized to the cap and can be
+    awaited from ASGI code.
+    """
+
+    def __init__(self, max_concurrency=2, queue_timeout=5.0):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._pool = None
+
+        self.completed = 0
+        self.rejected = 0
+        self.waiting = 0
+        self.running = 0
+        self.queue_time_total = 0.0
+        self.queue_time_max = 0.0
+
+    def run(self, func, *args, **kwargs):
+        """
+        Run ``func`` once a hashing slot is free.
+
+        Raises:
+            PasswordHashingBusy: If no slot freed up within the queue timeout
+        """
+        return self._run(time.monotonic(), func, args, kwargs)
+
+    async def arun(self, func, *args, **kwargs):
+        """Awaitable ``run``; the event loop never blocks on a hash."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._get_pool(), self._run, time.monotonic(), func, args, kwargs
+        )
+
+    def _run(self, queued_at, func, args, kwargs):
+        with self._lock:
+            self.waiting += 1
+        # Time spent in the thread pool's queue counts against the timeout
+        remaining = self.queue_timeout - (time.monotonic() - queued_at)
+        acquired = remaining > 0 and self._slots.acquire(timeout=remaining)
+        waited = time.monotonic() - queued_at
+
+        with self._lock:
+            self.waiting -= 1
+            if not acquired:
+                self.rejected += 1
+            else:
+                self.running += 1
+                self.queue_time_total += waited
+                self.queue_time_max = max(self.queue_time_max, waited)
+
+        if not acquired:
+            logger.warning(
+                f"Password hashing rejected after {waited:.2f}s in queue "
+                f"({self.max_concurrency} slots busy)"
+            )
+            raise PasswordHashingBusy()
+
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.running -= 1
+                self.completed += 1
+
+    def _get_pool(self):
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.max_concurrency,
+                        thread_name_prefix="password-hashing",
+                    )
+        return self._pool
+
+    def stats(self):
+        """Counters for monitoring; queue times are in seconds."""
+        with self._lock:
+            started = self.completed + self.running
+            return {
+                "max_concurrency": self.max_concurrency,
+                "running": self.running,
+                "waiting": self.waiting,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "queue_time_avg": self.queue_time_total / started if started else 0.0,
+                "queue_time_max": self.queue_time_max,
+            }
+
+
+password_hashing = PasswordHashingExecutor(
+    max_concurrency=getattr(
+        settings, "PASSWORD_HASHING_CONCURRENCY", max(1, (os.cpu_count() or 2) // 2)
+    ),
+    queue_timeout=getattr(settings, "PASSWORD_HASHING_QUEUE_TIMEOUT", 5.0),
+)
@@ -0,0 +1,215 @@
+import json
+import logging
+from mongoengine.base import _document_registry
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger("accounts")
+
+
+def managed_documents():
+    """
+    Every top-level Document class, one per collection.
+
+    Embedded documents, abstract bases and inheriting subclasses (which
+    share their parent's collection) are left out.
+    """
+    documents = {}
+    for document in _document_registry.values():
+        meta = getattr(document, "_meta", {})
+        if meta.get("abstract") or not getattr(document, "_is_document", False):
+            continue
+        collection = document._get_collection_name()
+        if collection and collection not in documents:
+            documents[collection] = document
+    return [documents[name] for name in sorted(documents)]
+
+
+def set_auto_create_index(enabled):
+    """
+    Switch MongoEngine's lazy ``ensure_indexes`` on first collection access.
+
+    With it off, indexes are only built by ``manage.py sync_indexes``, so
+    the first requests after a deploy never wait on (or start) an index
+    build.
+    """
+    for document in managed_documents():
+        document._meta["auto_create_index"] = enabled
+        if not enabled:
+            # Off by default; only a document that opts in re-checks its
+            # indexes on every save(), and it must not while this is off
+            document._meta["auto_create_index_on_save"] = False
+    if not enabled:
+        logger.info("MongoDB auto index creation is off; run sync_indexes")
+
+
+# Options that change what an index holds or enforces; two indexes with the
+# same key pattern but different values here are different indexes
+COMPARED_OPTIONS = (
+    "unique",
+    "sparse",
+    "partialFilterExpression",
+    "expireAfterSeconds",
+    "collation",
+)
+
+# Server error codes for an index that clashes with an existing one by name
+# or by key pattern
+INDEX_CONFLICT_CODES = {85, 86}
+
+
+def _canonical_filter(expression):
+    # The server may store {"f": v} as {"f": {"$eq": v}}
+    canonical = {}
+    for field, value in expression.items():
+        if field in ("$and", "$or"):
+            canonical[field] = [_canonical_filter(item) for item in value]
+        elif isinstance(value, dict) and any(k.startswith("$") for k in value):
+            canonical[field] = value
+        else:
+            canonical[field] = {"$eq": value}
+    return canonical
+
+
+def _canonical_collation(collation):
+    # The server reports every collation field; only locale and strength
+    # are declared here (strength defaults to 3)
+    if not collation or collation.get("locale") == "simple":
+        return None
+    return {"locale": collation["locale"], "strength": collation.get("strength", 3)}
+
+
+def index_signature(keys, options):
+    """
+    Identity of an index: its key pattern plus ``COMPARED_OPTIONS``.
+
+    Works for both MongoEngine index specs and ``index_information()``
+    entries, so declared and existing indexes can be matched regardless of
+    their names.
+    """
+    pattern = tuple(
+        (field, int(direction) if isinstance(direction, float) else direction)
+        for field, direction in keys
+    )
+    compared = []
+    for name in COMPARED_OPTIONS:
+        value = options.get(name)
+        if name == "partialFilterExpression" and value:
+            value = _canonical_filter(value)
+        elif name == "collation":
+            value = _canonical_collation(value)
+        elif name == "expireAfterSeconds" and value is not None:
+            value = int(value)
+        if value is None or value is False:
+            continue
+        compared.append((name, json.dumps(value, sort_keys=True, default=str)))
+    return pattern, tuple(compared)
+
+
+def diff_indexes(document):
+    """
+    Compare a document's declared indexes with those in MongoDB.
+
+    Unlike MongoEngine's ``compare_indexes`` this takes collation, unique,
+    sparse, TTL and partial filters into account, so an index redeclared
+    with new options on the same keys shows up as missing.
+
+    Returns:
+        dict: ``missing`` declared specs, ``undeclared`` existing index
+            names, and ``replaced``: undeclared index name -> the missing
+            spec with the same key pattern that supersedes it
+    """
+    existing = {
+        name: info
+        for name, info in document._get_collection().index_information().items()
+        if name != "_id_"
+    }
+    existing_signatures = {
+        index_signature(info["key"], info) for info in existing.values()
+    }
+    specs = document._meta["index_specs"]
+    declared_signatures = {index_signature(spec["fields"], spec) for spec in specs}
+
+    missing = [
+        spec
+        for spec in specs
+        if index_signature(spec["fields"], spec) not in existing_signatures
+    ]
+    undeclared = [
+        name
+        for name, info in existing.items()
+        if index_signature(info["key"], info) not in declared_signatures
+    ]
+    replaced = {}
+    for name in undeclared:
+        keys = index_signature(existing[name]["key"], {})[0]
+        for spec in missing:
+            if index_signature(spec["fields"], {})[0] == keys:
+                replaced[name] = spec
+    return {"missing": missing, "undeclared": undeclared, "replaced": replaced}
+
+
+def build_index(document, spec, replaces=()):
+    """
+    Create one declared index, then drop the indexes it replaces.
+
+    The new index is built first so a unique constraint never lapses. If
+    the server refuses it because an index in ``replaces`` already has its
+    name or key pattern, that index is dropped first instead.
+    """
+    collection = document._get_collection()
+    options = {k: v for k, v in spec.items() if k not in ("fields", "cls")}
+    try:
+        collection.create_index(spec["fields"], **options)
+    except OperationFailure as e:
+        if e.code not in INDEX_CONFLICT_CODES or not replaces:
+            raise
+        for name in replaces:
+            logger.info(f"Dropping {name} before building its replacement")
+            collection.drop_index(name)
+        collection.create_index(spec["fields"], **options)
+        return
+
+    for name in replaces:
+        collection.drop_index(name)
+
+
+def index_usage(document):
+    """
+    Accesses per index name since the server (or the index) started.
+
+    Returns:
+        dict: index name -> ops, empty if $indexStats is not permitted
+    """
+    try:
+        stats = document._get_collection().aggregate([{"$indexStats": {}}])
+        return {entry["name"]: entry["accesses"]["ops"] for entry in stats}
+    except Exception as e:
+        logger.warning(f"$indexStats on {document._get_collection_name()}: {e}")
+        return {}
+
+
+def plan_summary(queryset):
+    """
+    Explain a MongoEngine queryset's winning plan.
+
+    Returns:
+        tuple: (set of stage names, set of index names used)
+    """
+    explain = queryset.explain()
+    stages, indexes = set(), set()
+
+    def walk(node):
+        if isinstance(node, dict):
+            if "stage" in node:
+                stages.add(node["stage"])
+            if "indexName" in node:
+                indexes.add(node["indexName"])
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    # Newer servers nest the plan under winningPlan.queryPlan
+    walk(explain["queryPlanner"]["winningPlan"])
+    return stages, indexes
@@ -1,9 +1,79 @@
 import jwt
+import logging
 import uuid
+import hashlib
+import math
+import secrets
+import time
 from datetime import datetime, timedelta
 from django.conf import settings
 from django.core.cache import cache
-from .models import User
+from .models import User, Session
+from .blacklist import BLACKLIST_CHANNEL, BlacklistFilter
+from .broadcast import broadcast
+from .keys import KeyRing, KeyRingFile
+from .user_cache import is_missing, user_cache
+from .verifier import TokenVerifier, check_revocation
+
+
+logger = logging.getLogger("accounts")
+
+# Expired access tokens are still accepted this long when the caller allows it
+GRACE_SECONDS = settings.JWT_SETTINGS.get(
+    "ACCESS_TOKEN_GRACE_PERIOD", timedelta(0)
+).total_seconds()
+
+# Signing and verification keys, parsed once per process, and the
+# per-worker cache of verified payloads. With KEY_RING_FILE the keys are
+# reloaded whenever the file changes.
+if settings.JWT_SETTINGS.get("KEY_RING_FILE"):
+    _key_ring = None
+    _key_ring_file = KeyRingFile(
+        settings.JWT_SETTINGS["KEY_RING_FILE"],
+        check_interval=settings.JWT_SETTINGS.get("KEY_RING_CHECK_INTERVAL", 5),
+    )
+else:
+    _key_ring = KeyRing.from_settings(settings.JWT_SETTINGS)
+    _key_ring_file = None
+
+verifier = TokenVerifier(
+    key_ring=_key_ring,
+    key_ring_file=_key_ring_file,
+    grace_seconds=GRACE_SECONDS,
+    claim_profile=settings.JWT_SETTINGS.get("TOKEN_CLAIM_PROFILE", "full"),
+    include_user_claims=settings.JWT_SETTINGS.get("TOKEN_USER_CLAIMS", True),
+    cache_size=settings.JWT_SETTINGS.get("TOKEN_CACHE_SIZE", 10000),
+)
+token_cache = verifier.token_cache
+
+# Per-worker Bloom filter of blacklisted jtis, kept in sync over pub/sub
+blacklist_filter = BlacklistFilter(
+    capacity=settings.JWT_SETTINGS.get("BLACKLIST_FILTER_CAPACITY", 100000),
+    error_rate=settings.JWT_SETTINGS.get("BLACKLIST_FILTER_ERROR_RATE", 0.001),
+    rebuild_interval=settings.JWT_SETTINGS.get(
+        "BLACKLIST_FILTER_REBUILD_INTERVAL", 600
+    ),
+)
+
+
+def _on_token_blacklisted(jti):
+    """Apply a blacklist entry to this worker's in-process state."""
+    blacklist_filter.add(jti)
+    token_cache.invalidate_jti(jti)
+
+
+if settings.JWT_SETTINGS.get("BLACKLIST_FILTER_ENABLED", True):
+    broadcast.subscribe(
+        BLACKLIST_CHANNEL,
+        _on_token_blacklisted,
+        on_connect=blacklist_filter.rebuild,
+        on_disconnect=blacklist_filter.invalidate,
+    )
+
+
+def get_token_codec():
+    """Return the codec for the live key ring."""
+    return verifier.codec()
 
 
 class JWTUtils:
@@ -13,72 +83,42 @@ class JWTUtils:
     """
 
     @staticmethod
-    def generate_tokens(user):
+    def generate_tokens(user, device_id=None):
         """
         Generate access and refresh tokens for a user.
 
         Args:
             user: User instance
+            device_id: Optional client/device identifier stored on the session
 
         Returns:
             dict: Contains 'access', 'refresh', and token metadata
         """
         now = datetime.utcnow()
 
-        # Generate unique JTI (JWT ID) for both tokens
-        access_jti = str(uuid.uuid4())
-        refresh_jti = str(uuid.uuid4())
+        # Tokens are only valid while the user's generation stays the same
+        generation = JWTUtils.get_token_generation(user.id)
 
-        # Access token payload
-        access_payload = {
-            "user_id": str(user.id),
-            "email": user.email,
-            "username": user.username,
-            "token_type": "access",
-            "iat": now,
-            "exp": now + settings.JWT_SETTINGS["ACCESS_TOKEN_LIFETIME"],
-            "jti": access_jti,
-        }
-
-        # Refresh token payload
-        refresh_payload = {
-            "user_id": str(user.id),
-            "email": user.email,
-            "token_type": "refresh",
-            "iat": now,
-            "exp": now + settings.JWT_SETTINGS["REFRESH_TOKEN_LIFETIME"],
-            "jti": refresh_jti,
-        }
-
-        # Generate tokens
-        access_token = jwt.encode(
-            access_payload,
-            settings.JWT_SETTINGS["SIGNING_KEY"],
-            algorithm=settings.JWT_SETTINGS["ALGORITHM"],
+        access_payload = JWTUtils._access_payload(
+            user.id, user.email, user.username, generation, now
         )
-
-        refresh_token = jwt.encode(
-            refresh_payload,
-            settings.JWT_SETTINGS["SIGNING_KEY"],
-            algorithm=settings.JWT_SETTINGS["ALGORITHM"],
+        access_token = get_token_codec().encode(access_payload)
+        refresh_token, refresh_payload, token_hash = JWTUtils._issue_refresh_token(
+            user.id, user.email, generation, now
         )
 
-        # Store refresh token in user's active tokens
-        user.add_refresh_token(refresh_jti)
+        # Open a refresh session for this login
+        Session.open(
+            user.id,
+            jti=refresh_payload["jti"],
+            expires_at=refresh_payload["exp"],
+            gen=generation,
+            device_id=device_id,
+            token_hash=token_hash,
+        )
 
         # Cache user data for quick access
-        cache.set(
-            f"user:{user.id}",
-            {
-                "id": str(user.id),
-                "email": user.email,
-                "username": user.username,
-                "is_active": user.is_active,
-            },
-            timeout=int(
-                settings.JWT_SETTINGS["REFRESH_TOKEN_LIFETIME"].total_seconds()
-            ),
-        )
+        JWTUtils.cache_user(user)
 
         return {
             "access": access_token,
@@ -89,104 +129,632 @@ class JWTUtils:
         }
 
     @staticmethod
-    def decode_token(token, verify_exp=True):
+    def decode_token(token, verify_exp=True, allow_grace_period=False):
         """
         Decode and validate a JWT token.
 
+        The signature is verified once with expiry checking switched off and
+        ``exp`` is then compared here, so a single pass tells valid,
+        in-grace and expired tokens apart.
+
         Args:
             token: JWT token string
             verify_exp: Whether to verify token expiration
+            allow_grace_period: Accept tokens that expired less than
+                ACCESS_TOKEN_GRACE_PERIOD ago; their payload is returned with
+                ``_grace_period`` set to True
 
         Returns:
             dict: Token payload if valid
 
         Raises:
+            jwt.ExpiredSignatureError: If the token has expired
             jwt.InvalidTokenError: If token is invalid
         """
-        try:
-            payload = jwt.decode(
-                token,
-                settings.JWT_SETTINGS["SIGNING_KEY"],
-                algorithms=[settings.JWT_SETTINGS["ALGORITHM"]],
-                options={"verify_exp": verify_exp},
-            )
+        # Starts the blacklist listener in this worker on first use
+        broadcast.start()
 
-            # Check if token is blacklisted
-            jti = payload.get("jti")
-            if jti and cache.get(f"blacklist:{jti}"):
-                raise jwt.InvalidTokenError("Token is blacklisted")
+        payload = JWTUtils._verify_signature(token)
 
-            return payload
+        if verify_exp:
+            JWTUtils._check_expiry(payload, allow_grace_period)
 
-        except jwt.InvalidTokenError:
-            raise
+        # Check the token blacklist and the user's revocation watermark in
+        # a single round trip
+        keys = JWTUtils._revocation_keys(payload)
+        JWTUtils._check_revocation(payload, cache.get_many(keys) if keys else {})
+        return payload
 
     @staticmethod
-    def refresh_access_token(refresh_token):
+    def authenticate_token(token):
         """
-        Generate new access token from refresh token.
+        Validate an access token and resolve its user for authentication.
+
+        The blacklist entry, the user's revocation watermark and (when this
+        worker has no fresh copy) the user's cached identity are fetched
+        with a single MGET, so a warm request costs at most one round trip.
+        Tokens in their grace period are accepted.
+
+        Args:
+            token: JWT token string
+
+        Returns:
+            tuple: (payload, identity); identity is None if the user is gone
+
+        Raises:
+            jwt.InvalidTokenError: If the token is invalid, expired, revoked
+                or not an access token
+        """
+        broadcast.start()
+
+        payload = JWTUtils._verify_signature(token)
+        JWTUtils._check_expiry(payload, allow_grace_period=True)
+
+        if payload.get("token_type") != "access":
+            raise jwt.InvalidTokenError("Invalid token type")
+        user_id = payload.get("user_id")
+        if not user_id:
+            raise jwt.InvalidTokenError("Invalid token payload")
+
+        keys = JWTUtils._revocation_keys(payload)
+        identity, version = user_cache.get_local(user_id)
+        if identity is None:
+            keys.append(user_cache.key(user_id))
+
+        state = cache.get_many(keys)
+        JWTUtils._check_revocation(payload, state)
+
+        if identity is None:
+            identity = state.get(user_cache.key(user_id))
+            if identity is not None:
+                user_cache.remember(user_id, identity, version)
+            else:
+                return payload, JWTUtils._load_user_identity(user_id)
+        return payload, None if is_missing(identity) else identity
+
+    @staticmethod
+    def _verify_signature(token):
+        """Verify a token's signature and return its payload (expiry unchecked)."""
+        return verifier.verify_signature(token)
+
+    @staticmethod
+    def _revocation_keys(payload):
+        """
+        Cache keys ``_check_revocation`` needs for a payload.
+
+        The blacklist key is only included when the local filter cannot
+        rule the jti out.
+        """
+        jti = payload.get("jti")
+        user_id = payload.get("user_id")
+        keys = []
+        if jti and blacklist_filter.might_contain(jti):
+            keys.append(f"blacklist:{jti}")
+        if user_id:
+            keys.append(f"token_gen:{user_id}")
+        return keys
+
+    @staticmethod
+    def _check_revocation(payload, state):
+        """
+        Reject blacklisted tokens and tokens older than the user's generation.
+
+        Args:
+            payload: Verified token payload
+            state: Values fetched for ``_revocation_keys(payload)``
+
+        Raises:
+            jwt.InvalidTokenError: If the token has been revoked
+        """
+        jti = payload.get("jti")
+        user_id = payload.get("user_id")
+        check_revocation(
+            payload,
+            bool(jti) and bool(state.get(f"blacklist:{jti}")),
+            state.get(f"token_gen:{user_id}") if user_id else 0,
+        )
+
+    @staticmethod
+    def introspect_tokens(tokens):
+        """
+        RFC 7662-style introspection of a batch of tokens.
+
+        Signatures are verified locally and the revocation state of the
+        whole batch is read in one round trip; User documents are never
+        loaded. Results are cached for INTROSPECTION_CACHE_TTL, so a token
+        revoked within that window may still be reported active.
+
+        Args:
+            tokens: List of token strings
+
+        Returns:
+            list: One ``{"active": bool, ...claims}`` dict per token, in order
+        """
+        broadcast.start()
+
+        now = time.time()
+        ttl = settings.JWT_SETTINGS.get("INTROSPECTION_CACHE_TTL", 5)
+        cache_keys = {
+            token: f"introspect:{hashlib.sha256(token.encode()).hexdigest()}"
+            for token in tokens
+        }
+        cached = cache.get_many(list(set(cache_keys.values())))
+
+        results = {}
+        pending = {}
+        for token, key in cache_keys.items():
+            if key in cached:
+                result = cached[key]
+                # Never report a token active past its expiry
+                exp = result.get("exp")
+                if result["active"] and exp is not None and exp <= now:
+                    result = {"active": False}
+                results[token] = result
+                continue
+
+            try:
+                payload = JWTUtils._verify_signature(token)
+                JWTUtils._check_expiry(payload)
+            except jwt.InvalidTokenError:
+                results[token] = {"active": False}
+            else:
+                pending[token] = payload
+
+        revocation_keys = {
+            key
+            for payload in pending.values()
+            for key in JWTUtils._revocation_keys(payload)
+        }
+        state = cache.get_many(list(revocation_keys)) if revocation_keys else {}
+        for token, payload in pending.items():
+            try:
+                JWTUtils._check_revocation(payload, state)
+            except jwt.InvalidTokenError:
+                results[token] = {"active": False}
+            else:
+                results[token] = JWTUtils._introspection_claims(payload)
+
+        fresh = {
+            cache_keys[token]: results[token]
+            for token in cache_keys
+            if cache_keys[token] not in cached
+        }
+        if fresh and ttl:
+            cache.set_many(fresh, timeout=ttl)
+
+        return [results[token] for token in tokens]
+
+    @staticmethod
+    def _introspection_claims(payload):
+        """Map a verified payload to an RFC 7662 active response."""
+        claims = {
+            "active": True,
+            "sub": payload.get("user_id"),
+            "token_type": payload.get("token_type"),
+            "exp": payload.get("exp"),
+            "iat": payload.get("iat"),
+            "jti": payload.get("jti"),
+        }
+        for name in ("username", "email"):
+            if payload.get(name):
+                claims[name] = payload[name]
+        return claims
+
+    @staticmethod
+    def _check_expiry(payload, allow_grace_period=False):
+        """
+        Enforce ``exp`` on an already verified payload.
+
+        Raises:
+            jwt.ExpiredSignatureError: If expired (beyond the grace period)
+        """
+        verifier.check_expiry(payload, allow_grace_period)
+
+    @staticmethod
+    def refresh_hint(payload):
+        """
+        Tell whether the client should refresh this access token now.
+
+        A refresh is suggested for tokens in their grace period and for
+        tokens inside REFRESH_HINT_WINDOW of expiry. Where inside that window
+        the hint starts is derived from the jti, so a cohort of tokens
+        issued together spreads its refreshes out instead of stampeding.
 
         Args:
-            refresh_token: Valid refresh token
+            payload: Payload returned by decode_token
+
+        Returns:
+            dict: {'expires_in': seconds, 'grace_period': bool}, or None
+        """
+        exp = payload.get("exp")
+        if not exp:
+            return None
+
+        expires_in = int(exp - time.time())
+        if payload.get("_grace_period"):
+            return {"expires_in": expires_in, "grace_period": True}
+
+        window = settings.JWT_SETTINGS.get(
+            "REFRESH_HINT_WINDOW", timedelta(0)
+        ).total_seconds()
+        jti = payload.get("jti") or ""
+        spread = hashlib.blake2b(jti.encode("utf-8"), digest_size=2).digest()
+        threshold = window * (0.5 + int.from_bytes(spread, "big") / 131070)
+
+        if expires_in <= threshold:
+            return {"expires_in": expires_in, "grace_period": False}
+        return None
+
+    @staticmethod
+    def refresh_sliding_token(token):
+        """
+        Extend a sliding-session access token.
+
+        The token may be in its grace period but its session ceiling
+        (``refresh_exp``) must not have passed; the new token keeps that
+        ceiling.
+
+        Args:
+            token: Access token issued with SLIDING_TOKENS enabled
 
         Returns:
             dict: New access token data
 
+        Raises:
+            jwt.InvalidTokenError: If the token cannot be extended, including
+                when it has been extended before
+        """
+        payload = JWTUtils.decode_token(token, allow_grace_period=True)
+
+        if payload.get("token_type") != "access" or "refresh_exp" not in payload:
+            raise jwt.InvalidTokenError("Not a sliding token")
+        if time.time() >= payload["refresh_exp"]:
+            raise jwt.ExpiredSignatureError("Sliding session has expired")
+
+        user_id = payload.get("user_id")
+        identity = JWTUtils.get_user_identity(user_id)
+        if identity is None:
+            raise jwt.InvalidTokenError("User not found")
+        if not identity.get("is_active"):
+            raise jwt.InvalidTokenError("User account is disabled")
+
+        refresh_exp = datetime.utcfromtimestamp(payload["refresh_exp"])
+        access_payload = JWTUtils._access_payload(
+            user_id,
+            identity["email"],
+            identity["username"],
+            payload.get("gen", 0),
+            datetime.utcnow(),
+            refresh_exp=refresh_exp,
+        )
+        access_token = get_token_codec().encode(access_payload)
+
+        # The presented token is spent; otherwise one sliding token could be
+        # extended into any number of live tokens until refresh_exp. Of
+        # concurrent extensions only the first gets the blacklist entry in.
+        if not JWTUtils._blacklist_jti(payload.get("jti"), payload["exp"], claim=True):
+            raise jwt.InvalidTokenError("Token has already been extended")
+
+        return {
+            "access": access_token,
+            "expires": access_payload["exp"],
+            "refresh_expires": refresh_exp,
+            "user_id": str(user_id),
+        }
+
+    @staticmethod
+    def refresh_access_token(refresh_token, rotate=None):
+        """
+        Generate new access token from refresh token.
+
+        Concurrent calls with the same refresh token (several SPA tabs
+        refreshing at once) are coalesced: the first caller takes a short
+        Redis lock and does the work, and callers waiting on that lock
+        receive the same result (or error) instead of repeating it. The
+        result is only kept for REFRESH_COALESCE_WAIT, so a rotated refresh
+        token replayed later goes through the session check and fails.
+
+        Args:
+            refresh_token: Valid refresh token (JWT or opaque)
+            rotate: Whether to rotate the refresh token (default from settings)
+
+        Returns:
+            dict: See _refresh_access_token
+
         Raises:
             jwt.InvalidTokenError: If refresh token is invalid
         """
-        try:
-            # Decode refresh token
-            payload = JWTUtils.decode_token(refresh_token)
+        if rotate is None:
+            rotate = settings.JWT_SETTINGS.get("ROTATE_REFRESH_TOKENS", False)
 
-            if payload.get("token_type") != "refresh":
-                raise jwt.InvalidTokenError("Invalid token type")
+        window = int(
+            settings.JWT_SETTINGS.get(
+                "REFRESH_COALESCE_WINDOW", timedelta(0)
+            ).total_seconds()
+        )
+        if window <= 0:
+            return JWTUtils._refresh_access_token(refresh_token, rotate)
+
+        flight = f"{JWTUtils._hash_refresh_token(refresh_token)}:{int(rotate)}"
+        result_key = f"refresh_result:{flight}"
+        lock_key = f"refresh_lock:{flight}"
+        # Long enough for the followers that were waiting to pick it up
+        share_for = max(1, int(JWTUtils._refresh_wait()))
+
+        outcome = cache.get(result_key)
+        if outcome is None and not cache.add(lock_key, 1, timeout=window):
+            # Another request is refreshing this token; wait for its result
+            outcome = JWTUtils._wait_for_refresh(result_key)
+
+        if outcome is None:
+            try:
+                result = JWTUtils._refresh_access_token(refresh_token, rotate)
+            except jwt.InvalidTokenError as e:
+                # add, not set: a later leader's failure (its session claim
+                # loses to the first rotation) must never hide a success
+                cache.add(result_key, {"error": str(e)}, timeout=share_for)
+                cache.delete(lock_key)
+                raise
+            except Exception:
+                cache.delete(lock_key)
+                raise
+
+            # Published before the lock goes, so no request can slip in
+            # between and become a second leader
+            cache.set(result_key, {"result": result}, timeout=share_for)
+            cache.delete(lock_key)
+            return result
+
+        if "error" in outcome:
+            raise jwt.InvalidTokenError(outcome["error"])
+        return outcome["result"]
+
+    @staticmethod
+    def _refresh_wait():
+        """Seconds a follower waits for (and a leader shares) a refresh result."""
+        return settings.JWT_SETTINGS.get(
+            "REFRESH_COALESCE_WAIT", timedelta(seconds=2)
+        ).total_seconds()
+
+    @staticmethod
+    def _wait_for_refresh(result_key):
+        """
+        Poll for the leader's refresh outcome.
+
+        Returns:
+            dict: The outcome, or None if the leader didn't publish one in
+                time (the caller then refreshes on its own)
+        """
+        deadline = time.monotonic() + JWTUtils._refresh_wait()
 
-            # Get user
-            user_id = payload.get("user_id")
-            user = User.objects.get(id=user_id)
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            outcome = cache.get(result_key)
+            if outcome is not None:
+                return outcome
+        return None
+
+    @staticmethod
+    def _refresh_access_token(refresh_token, rotate):
+        """
+        Generate new access token from refresh token.
+
+        The refresh token's session is looked up (and, with
+        ``ROTATE_REFRESH_TOKENS``, rotated to a new refresh token) in one
+        atomic update on the sessions collection, so of several concurrent
+        refreshes with the same token only one wins. The user's identity
+        comes from the user cache; the users collection is only read on a
+        cache miss.
+
+        Everything that can fail (identity lookup, token encoding) happens
+        before the session is claimed, so an error never leaves the client
+        with a refresh token that was rotated away.
+
+        Args:
+            refresh_token: Valid refresh token (JWT or opaque)
+            rotate: Whether to rotate the refresh token
 
-            if not user.is_active:
+        Returns:
+            dict: New access token data, plus 'refresh' and
+                'refresh_expires' when the refresh token was rotated
+
+        Raises:
+            jwt.InvalidTokenError: If refresh token is invalid
+        """
+        try:
+            now = datetime.utcnow()
+            opaque = JWTUtils._is_opaque(refresh_token)
+
+            if opaque:
+                payload = {}
+                lookup = {"token_hash": JWTUtils._hash_refresh_token(refresh_token)}
+                # The user is only known from the session
+                current = Session.find_live(lookup)
+                if current is None:
+                    raise jwt.InvalidTokenError(
+                        "Refresh token not found in user's active tokens"
+                    )
+                user_id = current["user_id"]
+                generation = current.get("gen", 0)
+            else:
+                # Decode refresh token
+                payload = JWTUtils.decode_token(refresh_token)
+                if payload.get("token_type") != "refresh":
+                    raise jwt.InvalidTokenError("Invalid token type")
+                lookup = {"jti": payload.get("jti")}
+                user_id = payload.get("user_id")
+                if not user_id:
+                    raise jwt.InvalidTokenError("Invalid token payload")
+                generation = payload.get("gen", 0)
+
+            identity = JWTUtils.get_user_identity(user_id)
+            if identity is None:
+                raise User.DoesNotExist
+            if not identity.get("is_active"):
                 raise jwt.InvalidTokenError("User account is disabled")
 
-            # Check if refresh token is in user's active tokens
-            refresh_jti = payload.get("jti")
-            if refresh_jti not in user.refresh_tokens:
+            # Generate new access token
+            access_payload = JWTUtils._access_payload(
+                user_id, identity["email"], identity["username"], generation, now
+            )
+            access_token = get_token_codec().encode(access_payload)
+
+            rotate_to = None
+            if rotate:
+                new_refresh, new_payload, new_hash = JWTUtils._issue_refresh_token(
+                    user_id,
+                    identity["email"],
+                    generation,
+                    now,
+                    opaque=opaque or None,
+                )
+                rotate_to = {
+                    "jti": new_payload["jti"],
+                    "token_hash": new_hash,
+                    "expires_at": new_payload["exp"],
+                }
+
+            # Commit point: the old refresh token stops working here
+            session = Session.claim(lookup, rotate_to)
+            if session is None and not opaque:
+                session = JWTUtils._claim_legacy_session(payload, rotate_to)
+            if session is None or session["user_id"] != str(user_id):
                 raise jwt.InvalidTokenError(
                     "Refresh token not found in user's active tokens"
                 )
 
-            # Generate new access token
-            now = datetime.utcnow()
-            access_jti = str(uuid.uuid4())
-
-            access_payload = {
-                "user_id": str(user.id),
-                "email": user.email,
-                "username": user.username,
-                "token_type": "access",
-                "iat": now,
-                "exp": now + settings.JWT_SETTINGS["ACCESS_TOKEN_LIFETIME"],
-                "jti": access_jti,
-            }
-
-            access_token = jwt.encode(
-                access_payload,
-                settings.JWT_SETTINGS["SIGNING_KEY"],
-                algorithm=settings.JWT_SETTINGS["ALGORITHM"],
-            )
+            if rotate and payload and settings.JWT_SETTINGS.get(
+                "BLACKLIST_AFTER_ROTATION", True
+            ):
+                try:
+                    JWTUtils._blacklist_jti(payload.get("jti"), payload.get("exp"))
+                except Exception as e:
+                    # The session no longer accepts the old token anyway
+                    logger.warning(f"Blacklisting rotated refresh token failed: {e}")
 
-            return {
+            result = {
                 "access": access_token,
                 "expires": access_payload["exp"],
-                "user_id": str(user.id),
+                "user_id": str(user_id),
             }
+            if rotate:
+                result["refresh"] = new_refresh
+                result["refresh_expires"] = new_payload["exp"]
+
+            return result
 
         except User.DoesNotExist:
             raise jwt.InvalidTokenError("User not found")
         except Exception as e:
             raise jwt.InvalidTokenError(f"Token refresh failed: {str(e)}")
 
+    @staticmethod
+    def _claim_legacy_session(payload, rotate_to=None):
+        """
+        Move a refresh token issued before sessions existed into a session.
+
+        Such tokens are only listed in ``User.refresh_tokens``; the JTI is
+        pulled from that list atomically so it can be migrated only once.
+        This can go once REFRESH_TOKEN_LIFETIME has passed since the switch.
+        """
+        user_id = payload.get("user_id")
+        jti = payload.get("jti")
+        if not (user_id and jti):
+            return None
+
+        migrated = User.objects(id=user_id, refresh_tokens=jti).update_one(
+            pull__refresh_tokens=jti
+        )
+        if not migrated:
+            return None
+
+        rotate_to = rotate_to or {}
+        session = Session.open(
+            user_id,
+            jti=rotate_to.get("jti", jti),
+            expires_at=rotate_to.get(
+                "expires_at", datetime.utcfromtimestamp(payload["exp"])
+            ),
+            gen=payload.get("gen", 0),
+            token_hash=rotate_to.get("token_hash"),
+        )
+        return {"user_id": session.user_id, "gen": session.gen}
+
+    @staticmethod
+    def _access_payload(user_id, email, username, generation, now, refresh_exp=None):
+        """
+        Build the claims of a new access token.
+
+        With SLIDING_TOKENS the token is short-lived (SLIDING_TOKEN_LIFETIME)
+        and carries a ``refresh_exp`` ceiling up to which it can be extended
+        through refresh_sliding_token.
+        """
+        payload = {
+            "user_id": str(user_id),
+            "email": email,
+            "username": username,
+            "token_type": "access",
+            "iat": now,
+            "exp": now + settings.JWT_SETTINGS["ACCESS_TOKEN_LIFETIME"],
+            "jti": str(uuid.uuid4()),
+            "gen": generation,
+        }
+
+        if settings.JWT_SETTINGS.get("SLIDING_TOKENS", False):
+            refresh_exp = refresh_exp or (
+                now + settings.JWT_SETTINGS["SLIDING_TOKEN_REFRESH_LIFETIME"]
+            )
+            payload["exp"] = min(
+                now + settings.JWT_SETTINGS["SLIDING_TOKEN_LIFETIME"], refresh_exp
+            )
+            payload["refresh_exp"] = refresh_exp
+
+        return payload
+
+    @staticmethod
+    def _refresh_payload(user_id, email, generation, now):
+        """Build the claims of a new refresh token."""
+        return {
+            "user_id": str(user_id),
+            "email": email,
+            "token_type": "refresh",
+            "iat": now,
+            "exp": now + settings.JWT_SETTINGS["REFRESH_TOKEN_LIFETIME"],
+            "jti": str(uuid.uuid4()),
+            "gen": generation,
+        }
+
+    @staticmethod
+    def _issue_refresh_token(user_id, email, generation, now, opaque=None):
+        """
+        Mint a refresh token for a new or rotated session.
+
+        With ``OPAQUE_REFRESH_TOKENS`` (or ``opaque=True``) the token is a
+        random string and only its SHA-256 hash is stored on the session;
+        otherwise it is a signed JWT.
+
+        Returns:
+            tuple: (token, payload, token_hash or None)
+        """
+        if opaque is None:
+            opaque = settings.JWT_SETTINGS.get("OPAQUE_REFRESH_TOKENS", False)
+
+        payload = JWTUtils._refresh_payload(user_id, email, generation, now)
+        if opaque:
+            token = secrets.token_urlsafe(32)
+            return token, payload, JWTUtils._hash_refresh_token(token)
+        return get_token_codec().encode(payload), payload, None
+
+    @staticmethod
+    def _is_opaque(token):
+        """Opaque refresh tokens are URL-safe base64 and never contain dots."""
+        return "." not in token
+
+    @staticmethod
+    def _hash_refresh_token(token):
+        """Return the hash under which an opaque refresh token is stored."""
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
     @staticmethod
     def blacklist_token(token):
         """
@@ -200,28 +768,202 @@ class JWTUtils:
         """
         try:
             payload = JWTUtils.decode_token(token, verify_exp=False)
-            jti = payload.get("jti")
-            exp = payload.get("exp")
+            return JWTUtils._blacklist_jti(payload.get("jti"), payload.get("exp"))
 
-            if jti and exp:
-                # Calculate TTL (time until expiration)
-                exp_datetime = datetime.fromtimestamp(exp)
-                ttl = int((exp_datetime - datetime.utcnow()).total_seconds())
+        except Exception:
+            return False
 
-                if ttl > 0:
-                    # Add to blacklist with TTL
-                    cache.set(f"blacklist:{jti}", "1", timeout=ttl)
-                    return True
+    @staticmethod
+    def _blacklist_jti(jti, exp, claim=False):
+        """
+        Blacklist a token id until the token's expiry plus the grace
+        period, during which expired access tokens are still accepted.
+
+        Args:
+            jti: Token id
+            exp: Token expiry as a Unix timestamp
+            claim: Only write the entry if there is none yet, so exactly one
+                of several concurrent callers succeeds
 
+        Returns:
+            bool: True if an entry was written
+        """
+        if not (jti and exp):
             return False
 
-        except Exception:
+        # Until the token can no longer be accepted at all; exp is UTC
+        # epoch seconds, so no datetime (and no local offset) is involved
+        ttl = math.ceil(exp + GRACE_SECONDS - time.time())
+        if ttl <= 0:
             return False
 
+        # Add to blacklist with TTL
+        if claim:
+            if not cache.add(f"blacklist:{jti}", "1", timeout=ttl):
+                return False
+        else:
+            cache.set(f"blacklist:{jti}", "1", timeout=ttl)
+
+        # Apply locally right away, then tell the other workers
+        _on_token_blacklisted(jti)
+        broadcast.publish(BLACKLIST_CHANNEL, jti)
+        return True
+
+    @staticmethod
+    def get_token_generation(user_id):
+        """
+        Return the user's current token generation.
+
+        Tokens carry the generation they were issued under in their ``gen``
+        claim and are rejected once the stored generation moves past it.
+
+        Args:
+            user_id: User id
+
+        Returns:
+            int: Current generation (0 if the user never revoked tokens)
+        """
+        return int(cache.get(f"token_gen:{user_id}") or 0)
+
+    @staticmethod
+    def revoke_user_tokens(user_id):
+        """
+        Invalidate every access and refresh token issued to a user so far.
+
+        A single counter bump replaces per-token blacklist entries. The key
+        never expires: if it did, the counter would restart at 0 and tokens
+        minted under a higher generation would become valid again.
+
+        Args:
+            user_id: User id
+
+        Returns:
+            int: The new generation
+        """
+        key = f"token_gen:{user_id}"
+        cache.add(key, 0, timeout=None)
+        return cache.incr(key)
+
+    @staticmethod
+    def token_cache_stats():
+        """
+        Return hit/miss counters of this worker's verified-token cache.
+
+        Returns:
+            dict: hits, misses, hit_rate, size and max_size
+        """
+        return token_cache.stats()
+
+    @staticmethod
+    def jwks():
+        """
+        Return the public JWK Set used to verify tokens issued here.
+
+        Returns:
+            dict: {'keys': [...]} (symmetric keys are never included)
+        """
+        return get_token_codec().key_ring.jwks()
+
+    @staticmethod
+    def cache_user(user):
+        """
+        Cache the identity fields used by authentication and refresh.
+
+        Args:
+            user: User instance
+
+        Returns:
+            dict: The cached identity
+        """
+        identity = {
+            "id": str(user.id),
+            "email": user.email,
+            "username": user.username,
+            "is_active": user.is_active,
+            "is_staff": user.is_staff,
+            "is_superuser": user.is_superuser,
+        }
+        user_cache.set(identity["id"], identity)
+        return identity
+
+    @staticmethod
+    def get_user_identity(user_id):
+        """
+        Return a user's cached identity, loading it on a cache miss.
+
+        Args:
+            user_id: User id
+
+        Returns:
+            dict: Identity as stored by cache_user, or None if no such user
+        """
+        identity = user_cache.get(user_id)
+        if identity is None:
+            return JWTUtils._load_user_identity(user_id)
+        return None if is_missing(identity) else identity
+
+    @staticmethod
+    def _load_user_identity(user_id):
+        """
+        Load a user's identity from MongoDB and cache it.
+
+        Only one caller per user queries MongoDB at a time; the others wait
+        up to USER_LOAD_WAIT for its result to appear in the cache. Users
+        that don't exist are cached as a short-lived negative entry so junk
+        tokens stop reaching MongoDB (disabled users are cached like any
+        other identity and rejected on ``is_active``).
+
+        Returns:
+            dict: Identity, or None if no such user
+        """
+        wait = settings.JWT_SETTINGS.get(
+            "USER_LOAD_WAIT", timedelta(seconds=2)
+        ).total_seconds()
+        lock_key = f"user_lock:{user_id}"
+
+        locked = cache.add(lock_key, 1, timeout=max(1, int(wait)))
+        if not locked:
+            identity = JWTUtils._wait_for_identity(user_id, wait)
+            if identity is not None:
+                return None if is_missing(identity) else identity
+            # The loader is stuck or gone; load without the lock
+
+        try:
+            try:
+                user = User.objects.only(
+                    "id", "email", "username", "is_active", "is_staff", "is_superuser"
+                ).get(id=user_id)
+            except User.DoesNotExist:
+                negative_timeout = settings.JWT_SETTINGS.get(
+                    "USER_NEGATIVE_CACHE_TIMEOUT", 60
+                )
+                user_cache.set(
+                    user_id,
+                    {"id": str(user_id), "missing": True},
+                    timeout=negative_timeout,
+                )
+                return None
+            return JWTUtils.cache_user(user)
+        finally:
+            if locked:
+                cache.delete(lock_key)
+
+    @staticmethod
+    def _wait_for_identity(user_id, wait):
+        """Poll for an identity being loaded by another request."""
+        deadline = time.monotonic() + wait
+
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            identity = cache.get(user_cache.key(user_id))
+            if identity is not None:
+                return identity
+        return None
+
     @staticmethod
     def logout_user(user, refresh_token=None):
         """
-        Logout user by blacklisting tokens.
+        Logout user by ending sessions and blacklisting tokens.
 
         Args:
             user: User instance
@@ -233,20 +975,26 @@ class JWTUtils:
         try:
             if refresh_token:
                 # Logout from specific device
-                payload = JWTUtils.decode_token(refresh_token, verify_exp=False)
-                jti = payload.get("jti")
-
-                # Remove from user's active tokens
-                user.remove_refresh_token(jti)
-
-                # Blacklist the refresh token
-                JWTUtils.blacklist_token(refresh_token)
+                if JWTUtils._is_opaque(refresh_token):
+                    Session.revoke(
+                        {"token_hash": JWTUtils._hash_refresh_token(refresh_token)},
+                        user_id=user.id,
+                    )
+                else:
+                    payload = JWTUtils.decode_token(refresh_token, verify_exp=False)
+                    jti = payload.get("jti")
+
+                    # End the session, then blacklist the refresh token
+                    Session.revoke({"jti": jti}, user_id=user.id)
+                    JWTUtils._blacklist_jti(jti, payload.get("exp"))
             else:
-                # Logout from all devices
-                user.clear_refresh_tokens()
+                # Logout from all devices: every token issued so far,
+                # including live access tokens, stops validating
+                JWTUtils.revoke_user_tokens(user.id)
+                Session.revoke_all(user.id)
 
             # Clear user cache
-            cache.delete(f"user:{user.id}")
+            user_cache.invalidate(user.id)
 
             return True
 
@@ -0,0 +1,389 @@
+import hmac
+import json
+import logging
+import os
+import secrets
+import time
+from datetime import datetime, timezone
+import jwt
+from jwt.algorithms import get_default_algorithms
+
+# Tokens minted before key ids were introduced carry no ``kid`` header and
+# are verified with the key registered under this id, if any.
+DEFAULT_KID = "default"
+
+SYMMETRIC_ALGORITHMS = ("HS256", "HS384", "HS512")
+
+# Curve used for each ECDSA algorithm (names as in cryptography's ec module)
+EC_CURVES = {"ES256": "SECP256R1", "ES384": "SECP384R1", "ES512": "SECP521R1"}
+
+logger = logging.getLogger("accounts")
+
+
+class UnknownKeyError(jwt.InvalidTokenError):
+    """The token names a ``kid`` that is not in the ring."""
+
+
+def _read(value, path):
+    """Return key material given inline or as a file path."""
+    if value:
+        return value
+    if path:
+        with open(path, "rb") as fh:
+            return fh.read()
+    return None
+
+
+def parse_timestamp(value):
+    """
+    Normalise a key expiry to a UNIX timestamp.
+
+    Args:
+        value: None, seconds since the epoch, an aware/naive-UTC datetime or
+            an ISO 8601 string
+
+    Returns:
+        float or None
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def format_timestamp(value):
+    """Render a UNIX timestamp as the ISO 8601 form used in key ring files."""
+    return datetime.fromtimestamp(value, timezone.utc).isoformat()
+
+
+def generate_key_config(kid, algorithm):
+    """
+    Create a fresh key entry in the ``SIGNING_KEYS`` format.
+
+    HMAC keys get a random secret; asymmetric keys get a new private key as
+    inline PEM (requires the ``cryptography`` package).
+    """
+    if algorithm in SYMMETRIC_ALGORITHMS:
+        secret = secrets.token_urlsafe(64)
+        return {"kid": kid, "algorithm": algorithm, "secret": secret}
+
+    from cryptography.hazmat.primitives import serialization
+    from cryptography.hazmat.primitives.asymmetric import ec, ed25519, rsa
+
+    if algorithm.startswith(("RS", "PS")):
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    elif algorithm in EC_CURVES:
+        private_key = ec.generate_private_key(getattr(ec, EC_CURVES[algorithm])())
+    elif algorithm == "EdDSA":
+        private_key = ed25519.Ed25519PrivateKey.generate()
+    else:
+        raise ValueError(f"Cannot generate keys for {algorithm!r}")
+
+    pem = private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+    return {"kid": kid, "algorithm": algorithm, "private_key": pem.decode("ascii")}
+
+
+class SigningKey:
+    """
+    A single signing/verification key with its ``kid`` and algorithm.
+
+    Key material is parsed exactly once, when the key is constructed, so
+    per-request signing and verification never re-read PEM data.
+
+    ``not_after`` ends the key's verification window: once it has passed,
+    tokens carrying its ``kid`` are rejected. Retired keys are kept in the
+    ring until then so tokens they signed stay valid after a rotation.
+    """
+
+    def __init__(
+        self,
+        kid,
+        algorithm,
+        secret=None,
+        private_key=None,
+        public_key=None,
+        not_after=None,
+    ):
+        algorithms = get_default_algorithms()
+        if algorithm not in algorithms:
+            raise ValueError(
+                f"Unsupported JWT algorithm {algorithm!r} "
+                "(asymmetric algorithms require the 'cryptography' package)"
+            )
+
+        self.kid = kid
+        self.algorithm = algorithm
+        self.not_after = parse_timestamp(not_after)
+        self._algorithm = algorithms[algorithm]
+
+        if self.is_symmetric:
+            if not secret:
+                raise ValueError(f"Key {kid!r} ({algorithm}) requires a secret")
+            self.signing_key = self._algorithm.prepare_key(secret)
+            self.verification_key = self.signing_key
+            # Keyed once; sign() copies it instead of re-deriving the pads
+            self._hmac = hmac.new(self.signing_key, digestmod=self._algorithm.hash_alg)
+            return
+
+        if not private_key and not public_key:
+            raise ValueError(f"Key {kid!r} ({algorithm}) requires a PEM key")
+
+        # Verification-only keys (e.g. keys of a peer service) have no
+        # private half and can never be used to sign.
+        self.signing_key = (
+            self._algorithm.prepare_key(private_key) if private_key else None
+        )
+        if public_key:
+            self.verification_key = self._algorithm.prepare_key(public_key)
+        else:
+            self.verification_key = self.signing_key.public_key()
+
+    @property
+    def is_symmetric(self):
+        return self.algorithm in SYMMETRIC_ALGORITHMS
+
+    @property
+    def can_sign(self):
+        return self.signing_key is not None
+
+    def is_expired(self, now=None):
+        """Return True once the key's verification window has closed."""
+        if self.not_after is None:
+            return False
+        return (time.time() if now is None else now) >= self.not_after
+
+    def sign(self, message):
+        """Return the raw signature of ``message`` (bytes)."""
+        if self.is_symmetric:
+            mac = self._hmac.copy()
+            mac.update(message)
+            return mac.digest()
+        return self._algorithm.sign(message, self.signing_key)
+
+    def verify(self, message, signature):
+        """Return True if ``signature`` is valid for ``message``."""
+        if self.is_symmetric:
+            return hmac.compare_digest(self.sign(message), signature)
+        return self._algorithm.verify(message, self.verification_key, signature)
+
+    def to_jwk(self):
+        """
+        Return the public JWK for this key.
+
+        Returns:
+            dict: JWK, or None for symmetric keys which must never be published
+        """
+        if self.is_symmetric:
+            return None
+
+        jwk = self._algorithm.to_jwk(self.verification_key, as_dict=True)
+        jwk.update({"kid": self.kid, "alg": self.algorithm, "use": "sig"})
+        return jwk
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build a key from a settings entry.
+
+        Args:
+            config: dict with ``kid``, ``algorithm``, one of ``secret``,
+                ``private_key``/``private_key_path`` or
+                ``public_key``/``public_key_path`` and an optional
+                ``not_after``
+        """
+        return cls(
+            kid=config["kid"],
+            algorithm=config["algorithm"],
+            secret=config.get("secret"),
+            private_key=_read(
+                config.get("private_key"), config.get("private_key_path")
+            ),
+            public_key=_read(config.get("public_key"), config.get("public_key_path")),
+            not_after=config.get("not_after"),
+        )
+
+    def __repr__(self):
+        return f"<SigningKey: {self.kid} ({self.algorithm})>"
+
+
+class KeyRing:
+    """
+    Set of verification keys indexed by ``kid`` plus the current signing key.
+
+    New tokens are signed with ``current`` and carry its ``kid`` header;
+    verification picks the key named by the token header, so several keys
+    can be accepted at the same time. Rings are immutable: rotation builds
+    a new ring (see ``KeyRingFile``) and swaps it in.
+    """
+
+    def __init__(self, keys, current_kid):
+        self.keys = {key.kid: key for key in keys}
+
+        if current_kid not in self.keys:
+            raise ValueError(f"Signing key {current_kid!r} is not in the ring")
+        if not self.keys[current_kid].can_sign:
+            raise ValueError(f"Signing key {current_kid!r} has no private key")
+        if self.keys[current_kid].is_expired():
+            raise ValueError(f"Signing key {current_kid!r} has expired")
+
+        self.current = self.keys[current_kid]
+        # Earliest key expiry; owners prune the ring once it has passed
+        self.next_expiry = min(
+            (key.not_after for key in keys if key.not_after is not None),
+            default=None,
+        )
+        self._jwks = None
+
+    def get(self, kid):
+        """
+        Return the verification key for a ``kid`` header value.
+
+        Raises:
+            jwt.InvalidTokenError: If the key is unknown
+        """
+        key = self.keys.get(kid or DEFAULT_KID)
+        if key is None:
+            raise UnknownKeyError("Unknown signing key")
+        if key.is_expired():
+            raise jwt.InvalidTokenError("Signing key has expired")
+        return key
+
+    def prune(self, now=None):
+        """
+        Return a ring without the keys whose verification window has closed.
+
+        Returns ``self`` when nothing has expired.
+        """
+        now = time.time() if now is None else now
+        live = [
+            key
+            for key in self.keys.values()
+            # An expired current key is a configuration error; keep signing
+            # with it rather than failing every login
+            if key is self.current or not key.is_expired(now)
+        ]
+        if len(live) == len(self.keys):
+            return self
+        return KeyRing(live, self.current.kid)
+
+    def jwks(self):
+        """
+        Return the JWK Set of all public keys in the ring.
+
+        The document is built once per ring and reused.
+        """
+        if self._jwks is None:
+            self._jwks = {
+                "keys": [
+                    jwk
+                    for jwk in (key.to_jwk() for key in self.keys.values())
+                    if jwk is not None
+                ]
+            }
+        return self._jwks
+
+    @classmethod
+    def from_settings(cls, jwt_settings):
+        """
+        Build the ring from ``JWT_SETTINGS``.
+
+        Without ``SIGNING_KEYS`` the ring holds a single key built from the
+        legacy ``SIGNING_KEY``/``ALGORITHM`` pair under ``DEFAULT_KID``.
+        """
+        configs = jwt_settings.get("SIGNING_KEYS")
+        if not configs:
+            key = SigningKey(
+                DEFAULT_KID,
+                jwt_settings["ALGORITHM"],
+                secret=jwt_settings["SIGNING_KEY"],
+            )
+            return cls([key], DEFAULT_KID)
+
+        return cls.from_config(
+            {
+                "keys": configs,
+                "current_kid": jwt_settings.get("CURRENT_SIGNING_KID"),
+            }
+        )
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Build the ring from a ``{"current_kid": ..., "keys": [...]}`` dict.
+
+        Keys whose ``not_after`` has already passed are skipped. Without
+        ``current_kid`` the first key signs.
+        """
+        keys = [SigningKey.from_config(entry) for entry in config["keys"]]
+        keys = [key for key in keys if not key.is_expired()]
+        if not keys:
+            raise ValueError("Key ring has no unexpired keys")
+        return cls(keys, config.get("current_kid") or keys[0].kid)
+
+
+class KeyRingFile:
+    """
+    Key ring loaded from a JSON file and reloaded when the file changes.
+
+    The file holds ``{"current_kid": ..., "keys": [...]}`` with entries in
+    the ``SIGNING_KEYS`` format. Every worker polls its modification time
+    at most once per ``check_interval`` seconds, so a rotation written to
+    the file (see the ``rotate_signing_key`` command) reaches all workers
+    without a restart. Writers should replace the file atomically.
+    """
+
+    def __init__(self, path, check_interval=5.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._mtime = None
+        self._next_check = 0.0
+        self.ring = self._load()
+
+    def read(self):
+        """Return the file's parsed contents."""
+        with open(self.path, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        ring = KeyRing.from_config(self.read())
+        self._mtime = mtime
+        return ring
+
+    def refresh(self, force=False):
+        """
+        Reload the ring if the file changed since the last check.
+
+        Args:
+            force: Check the file now instead of waiting for the interval
+
+        A file that fails to parse is logged and ignored, leaving the
+        previous ring in place.
+
+        Returns:
+            KeyRing: The live ring
+        """
+        now = time.monotonic()
+        if now < self._next_check and not force:
+            return self.ring
+        self._next_check = now + self.check_interval
+
+        try:
+            if os.stat(self.path).st_mtime_ns != self._mtime:
+                self.ring = self._load()
+                logger.info(
+                    f"Reloaded signing keys from {self.path} "
+                    f"(current: {self.ring.current.kid})"
+                )
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Failed to reload signing keys from {self.path}: {e}")
+        return self.ring
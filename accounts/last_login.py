@@ -0,0 +1,123 @@
+import atexit
+import logging
+import os
+import threading
+from pymongo import UpdateOne
+from django.conf import settings
+from .models import User
+
+logger = logging.getLogger("accounts")
+
+
+class LastLoginBuffer:
+    """
+    Per-worker write-behind buffer for ``User.last_login``.
+
+    Logins only record the timestamp in memory; a daemon thread writes the
+    buffered values every ``flush_interval`` seconds as one unordered
+    ``bulk_write`` of ``$max`` updates, so out-of-order flushes from
+    several workers can never move ``last_login`` backwards. Pending
+    updates are flushed at interpreter exit; a worker that is killed loses
+    at most one interval of last_login values.
+    """
+
+    def __init__(self, flush_interval=5.0, max_pending=10000):
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = {}  # user_id -> latest login datetime
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+
+    def record(self, user, when):
+        """
+        Buffer a login.
+
+        ``user.last_login`` is updated in memory right away so responses
+        built from ``user`` show the new value.
+        """
+        user.last_login = when
+        user_id = str(user.id)
+        with self._lock:
+            previous = self._pending.get(user_id)
+            if previous is None or when > previous:
+                self._pending[user_id] = when
+            backlog = len(self._pending)
+
+        self._start()
+        if backlog >= self.max_pending:
+            # Don't let a login storm grow the buffer without bound
+            self._wakeup.set()
+
+    def flush(self):
+        """Write every buffered update now; returns the number written."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        requests = [
+            UpdateOne({"_id": user_id}, {"$max": {"last_login": when}})
+            for user_id, when in pending.items()
+        ]
+        try:
+            User._get_collection().bulk_write(requests, ordered=False)
+        except Exception as e:
+            logger.warning(f"last_login flush of {len(requests)} users failed: {e}")
+            # Put them back for the next attempt, keeping the latest value
+            with self._lock:
+                for user_id, when in pending.items():
+                    current = self._pending.get(user_id)
+                    if current is None or when > current:
+                        self._pending[user_id] = when
+            return 0
+        return len(requests)
+
+    def _start(self):
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid:
+            return
+
+        with self._lock:
+            # A forked worker inherits the attribute but not the thread
+            if self._thread is not None and self._pid == pid:
+                return
+            self._pid = pid
+            self._thread = threading.Thread(
+                target=self._run, name="last-login-flush", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
+
+
+last_login_buffer = LastLoginBuffer(
+    flush_interval=settings.JWT_SETTINGS.get("LAST_LOGIN_FLUSH_INTERVAL", 5),
+    max_pending=settings.JWT_SETTINGS.get("LAST_LOGIN_MAX_PENDING", 10000),
+)
+atexit.register(last_login_buffer.flush)
+
+
+def record_login(user, when):
+    """
+    Update ``user.last_login`` per the UPDATE_LAST_LOGIN settings.
+
+    With LAST_LOGIN_WRITE_BEHIND the write is buffered (see
+    ``LastLoginBuffer``); otherwise it is a single ``$max`` update that
+    leaves the rest of the document alone.
+    """
+    if not settings.JWT_SETTINGS.get("UPDATE_LAST_LOGIN", True):
+        return
+
+    if settings.JWT_SETTINGS.get("LAST_LOGIN_WRITE_BEHIND", True):
+        last_login_buffer.record(user, when)
+    else:
+        user.last_login = when
+        User._get_collection().update_one(
+            {"_id": str(user.id)}, {"$max": {"last_login": when}}
+        )
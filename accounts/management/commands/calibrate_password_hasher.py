@@ -0,0 +1,177 @@
+import json
+import os
+import platform
+import statistics
+import time
+from datetime import datetime
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+)
+from django.core.management.base import BaseCommand, CommandError
+
+PASSWORD = "calibration-Passw0rd!"
+
+# Never recommend less than Django's own defaults, whatever the budget:
+# logins re-hash to the calibrated cost, so a lower one would silently
+# weaken every stored hash
+MIN_PBKDF2_ITERATIONS = PBKDF2PasswordHasher.iterations
+MIN_BCRYPT_ROUNDS = BCryptSHA256PasswordHasher.rounds
+MIN_ARGON2_TIME_COST = Argon2PasswordHasher.time_cost
+MIN_ARGON2_MEMORY_KIB = Argon2PasswordHasher.memory_cost
+MAX_BCRYPT_ROUNDS = 16
+MAX_ARGON2_TIME_COST = 10
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark password hashers on this host and pick the cost that fits "
+        "a per-hash latency budget. With --write the result is saved to "
+        "PASSWORD_HASHER_CALIBRATION_FILE, and logins re-hash existing "
+        "passwords to it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--budget-ms",
+            type=float,
+            default=250,
+            help="Target time for one hash on this host (default: 250)",
+        )
+        parser.add_argument(
+            "--algorithms",
+            default="argon2,bcrypt_sha256,pbkdf2_sha256",
+            help=(
+                "Candidates in order of preference; the first that fits the "
+                "budget is used for new hashes"
+            ),
+        )
+        parser.add_argument(
+            "--argon2-memory-kib",
+            type=int,
+            default=MIN_ARGON2_MEMORY_KIB,
+            help="Argon2 memory cost in KiB (default and minimum: Django's)",
+        )
+        parser.add_argument(
+            "--samples", type=int, default=5, help="Hashes timed per setting"
+        )
+        parser.add_argument(
+            "--write", action="store_true", help="Save the calibration file"
+        )
+
+    def handle(self, *args, **options):
+        self.samples = options["samples"]
+        budget = options["budget_ms"] / 1000.0
+        if options["argon2_memory_kib"] < MIN_ARGON2_MEMORY_KIB:
+            raise CommandError(
+                f"--argon2-memory-kib must be at least {MIN_ARGON2_MEMORY_KIB}"
+            )
+        calibrators = {
+            "pbkdf2_sha256": self.calibrate_pbkdf2,
+            "bcrypt_sha256": self.calibrate_bcrypt,
+            "argon2": lambda budget: self.calibrate_argon2(
+                budget, options["argon2_memory_kib"]
+            ),
+        }
+
+        params = {}
+        preferred = None
+        for algorithm in options["algorithms"].split(","):
+            algorithm = algorithm.strip()
+            if algorithm not in calibrators:
+                raise CommandError(f"Unknown algorithm {algorithm!r}")
+            try:
+                result = calibrators[algorithm](budget)
+            except (ImportError, ValueError) as e:
+                # e.g. argon2-cffi / bcrypt not installed
+                self.stdout.write(f"{algorithm}: unavailable ({e})")
+                continue
+            if result is None:
+                self.stdout.write(f"{algorithm}: minimum cost exceeds the budget")
+                continue
+
+            found, elapsed = result
+            params[algorithm] = found
+            self.stdout.write(f"{algorithm}: {found} -> {elapsed * 1000:.0f} ms")
+            preferred = preferred or algorithm
+
+        if preferred is None:
+            raise CommandError("No candidate hasher fits the budget")
+
+        calibration = {
+            "preferred": preferred,
+            "params": params,
+            "budget_ms": options["budget_ms"],
+            "host": platform.node(),
+            "cpu_count": os.cpu_count(),
+            "calibrated_at": datetime.utcnow().isoformat(),
+        }
+        self.stdout.write(self.style.SUCCESS(f"New hashes will use {preferred}"))
+
+        if not options["write"]:
+            self.stdout.write(json.dumps(calibration, indent=2))
+            return
+
+        path = settings.PASSWORD_HASHER_CALIBRATION_FILE
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as fh:
+            json.dump(calibration, fh, indent=2)
+        os.replace(tmp_path, path)
+        self.stdout.write(f"Written to {path}")
+
+    def time_hasher(self, hasher):
+        """Median seconds for one hash."""
+        salt = hasher.salt()
+        timings = []
+        for _ in range(self.samples):
+            started = time.perf_counter()
+            hasher.encode(PASSWORD, salt)
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
+
+    def calibrate_pbkdf2(self, budget):
+        # Cost is linear in the iteration count: measure once and scale
+        hasher = PBKDF2PasswordHasher()
+        hasher.iterations = MIN_PBKDF2_ITERATIONS
+        per_iteration = self.time_hasher(hasher) / hasher.iterations
+
+        iterations = int(budget / per_iteration) // 10000 * 10000
+        if iterations < MIN_PBKDF2_ITERATIONS:
+            return None
+        hasher.iterations = iterations
+        return {"iterations": iterations}, self.time_hasher(hasher)
+
+    def calibrate_bcrypt(self, budget):
+        # Each round doubles the cost: take the highest that fits
+        hasher = BCryptSHA256PasswordHasher()
+        hasher._load_library()
+        best = None
+        for rounds in range(MIN_BCRYPT_ROUNDS, MAX_BCRYPT_ROUNDS + 1):
+            hasher.rounds = rounds
+            elapsed = self.time_hasher(hasher)
+            if elapsed > budget:
+                break
+            best = ({"rounds": rounds}, elapsed)
+        return best
+
+    def calibrate_argon2(self, budget, memory_cost):
+        hasher = Argon2PasswordHasher()
+        hasher._load_library()
+        hasher.memory_cost = memory_cost
+        best = None
+        for time_cost in range(MIN_ARGON2_TIME_COST, MAX_ARGON2_TIME_COST + 1):
+            hasher.time_cost = time_cost
+            elapsed = self.time_hasher(hasher)
+            if elapsed > budget:
+                break
+            best = (
+                {
+                    "time_cost": time_cost,
+                    "memory_cost": memory_cost,
+                    "parallelism": hasher.parallelism,
+                },
+                elapsed,
+            )
+        return best
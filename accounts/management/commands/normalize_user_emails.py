@@ -0,0 +1,112 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from accounts.models import CASE_INSENSITIVE, User
+from accounts.user_cache import user_cache
+
+# Emails that differ from their stored form (trimmed, lower case)
+NOT_NORMALIZED = {
+    "$expr": {"$ne": ["$email", {"$toLower": {"$trim": {"input": "$email"}}}]}
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Rewrite stored emails to lower case in batches and report emails and "
+        "usernames that only differ in case. Run before building the "
+        "case-insensitive email_ci/username_ci indexes with sync_indexes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Users per bulk write"
+        )
+        parser.add_argument(
+            "--dry-run", action="store_true", help="Report without writing"
+        )
+
+    def handle(self, *args, **options):
+        collection = User._get_collection()
+        cursor = collection.find(
+            NOT_NORMALIZED, {"email": 1}, batch_size=options["batch_size"]
+        )
+
+        updated = conflicts = 0
+        batch = []
+        for document in cursor:
+            batch.append(document)
+            if len(batch) >= options["batch_size"]:
+                done, clashed = self.normalize(collection, batch, options["dry_run"])
+                updated, conflicts = updated + done, conflicts + clashed
+                batch = []
+        if batch:
+            done, clashed = self.normalize(collection, batch, options["dry_run"])
+            updated, conflicts = updated + done, conflicts + clashed
+
+        verb = "Would normalize" if options["dry_run"] else "Normalized"
+        self.stdout.write(f"{verb} {updated} email(s); {conflicts} conflict(s)")
+        self.report_duplicate_usernames(collection)
+
+    def normalize(self, collection, batch, dry_run):
+        """Normalize one batch; returns (updated, conflicts)."""
+        targets = {}
+        for document in batch:
+            email = User.normalize_email(document["email"])
+            targets.setdefault(email, []).append(document)
+
+        # Every user holding each normalized email, in any case
+        owners = {}
+        for document in collection.find(
+            {"email": {"$in": list(targets)}},
+            {"email": 1},
+            collation=CASE_INSENSITIVE,
+        ):
+            email = User.normalize_email(document["email"])
+            owners.setdefault(email, set()).add(document["_id"])
+
+        requests, user_ids = [], []
+        conflicts = 0
+        for email, documents in targets.items():
+            ids = [document["_id"] for document in documents]
+            if len(documents) > 1 or owners.get(email, set()) - set(ids):
+                conflicts += 1
+                self.stdout.write(
+                    self.style.WARNING(f"  {email} is shared by users {ids}")
+                )
+                continue
+            document = documents[0]
+            user_ids.append(document["_id"])
+            requests.append(
+                UpdateOne(
+                    # Skipped if the email changed since it was read
+                    {"_id": document["_id"], "email": document["email"]},
+                    {"$set": {"email": email}},
+                )
+            )
+
+        if dry_run or not requests:
+            return len(requests), conflicts
+
+        collection.bulk_write(requests, ordered=False)
+        for user_id in user_ids:
+            user_cache.invalidate(user_id)
+        return len(requests), conflicts
+
+    def report_duplicate_usernames(self, collection):
+        """Usernames are not rewritten; clashes need a manual rename."""
+        duplicates = collection.aggregate(
+            [
+                {
+                    "$group": {
+                        "_id": {"$toLower": "$username"},
+                        "ids": {"$push": "$_id"},
+                    }
+                },
+                {"$match": {"ids.1": {"$exists": True}}},
+            ]
+        )
+        for duplicate in duplicates:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  username {duplicate['_id']!r} is shared by {duplicate['ids']}"
+                )
+            )
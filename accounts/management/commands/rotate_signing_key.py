@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from accounts.keys import (
+    DEFAULT_KID,
+    KeyRing,
+    format_timestamp,
+    generate_key_config,
+    parse_timestamp,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Add a new signing key to JWT_SETTINGS['KEY_RING_FILE'] and make it "
+        "current. The previous key keeps verifying tokens until it expires, "
+        "so no session is cut short by the rotation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--algorithm",
+            default=settings.JWT_SETTINGS["ALGORITHM"],
+            help="Algorithm of the new key (default: JWT_SETTINGS['ALGORITHM'])",
+        )
+        parser.add_argument(
+            "--kid",
+            help="Key id of the new key (default: derived from the current time)",
+        )
+        parser.add_argument(
+            "--overlap",
+            type=int,
+            help=(
+                "Seconds the previous key keeps verifying tokens (default: the "
+                "refresh token lifetime plus its grace period)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        path = settings.JWT_SETTINGS.get("KEY_RING_FILE")
+        if not path:
+            raise CommandError("JWT_SETTINGS['KEY_RING_FILE'] is not set")
+
+        config = self._read(path)
+        now = time.time()
+
+        kid = options["kid"] or datetime.utcnow().strftime("k%Y%m%d%H%M%S")
+        if any(entry["kid"] == kid for entry in config["keys"]):
+            raise CommandError(f"Key {kid!r} is already in the ring")
+
+        overlap = options["overlap"]
+        if overlap is None:
+            jwt_settings = settings.JWT_SETTINGS
+            overlap = (
+                jwt_settings["REFRESH_TOKEN_LIFETIME"]
+                + jwt_settings.get("REFRESH_TOKEN_GRACE_PERIOD", timedelta(0))
+            ).total_seconds()
+
+        # Retire the signing key: it verifies the tokens it already issued
+        # until the longest of them has expired
+        previous_kid = config.get("current_kid") or config["keys"][0]["kid"]
+        keys = []
+        retired_until = None
+        for entry in config["keys"]:
+            not_after = parse_timestamp(entry.get("not_after"))
+            if entry["kid"] == previous_kid and not_after is None:
+                not_after = now + overlap
+            if not_after is not None:
+                if not_after <= now:
+                    self.stdout.write(f"Dropping expired key {entry['kid']}")
+                    continue
+                entry["not_after"] = format_timestamp(not_after)
+            if entry["kid"] == previous_kid:
+                retired_until = entry["not_after"]
+            keys.append(entry)
+
+        try:
+            keys.insert(0, generate_key_config(kid, options["algorithm"]))
+            config = {"current_kid": kid, "keys": keys}
+            # Refuse to write anything the workers could not load
+            KeyRing.from_config(config)
+        except (ValueError, ImportError) as e:
+            raise CommandError(str(e))
+
+        self._write(path, config)
+        self.stdout.write(
+            self.style.SUCCESS(f"Signing with {kid} ({options['algorithm']})")
+        )
+        if retired_until:
+            self.stdout.write(f"{previous_kid} verifies tokens until {retired_until}")
+
+    def _read(self, path):
+        """Load the key ring file, seeding it from the settings if missing."""
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+
+        jwt_settings = settings.JWT_SETTINGS
+        if jwt_settings.get("SIGNING_KEYS"):
+            return {
+                "current_kid": jwt_settings.get("CURRENT_SIGNING_KID"),
+                "keys": [dict(entry) for entry in jwt_settings["SIGNING_KEYS"]],
+            }
+        return {
+            "current_kid": DEFAULT_KID,
+            "keys": [
+                {
+                    "kid": DEFAULT_KID,
+                    "algorithm": jwt_settings["ALGORITHM"],
+                    "secret": jwt_settings["SIGNING_KEY"],
+                }
+            ],
+        }
+
+    def _write(self, path, config):
+        """Replace the file atomically so workers never read a partial ring."""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".keyring-")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as fh:
+                json.dump(config, fh, indent=2)
+            os.chmod(tmp_path, 0o600)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -0,0 +1,97 @@
+from django.core.management.base import BaseCommand, CommandError
+from pymongo.errors import DuplicateKeyError
+from accounts.indexes import build_index, diff_indexes, index_usage, managed_documents
+
+
+def describe(keys, options=None):
+    text = ", ".join(
+        f"{'-' if direction == -1 else ''}{field}" for field, direction in keys
+    )
+    options = options or {}
+    flags = [name for name in ("unique", "sparse") if options.get(name)]
+    if options.get("collation"):
+        flags.append(f"collation={options['collation'].get('locale')}")
+    if options.get("partialFilterExpression"):
+        flags.append(f"partial={options['partialFilterExpression']}")
+    if options.get("expireAfterSeconds") is not None:
+        flags.append(f"ttl={options['expireAfterSeconds']}")
+    return f"{text} [{'; '.join(flags)}]" if flags else text
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the indexes declared in model meta with those in MongoDB, "
+        "by key pattern and options (collation, unique, sparse, TTL, partial "
+        "filter). Reports missing, undeclared and unused indexes; --apply "
+        "builds the missing ones and drops the undeclared indexes they "
+        "replace. Run at deploy time with MONGODB_AUTO_CREATE_INDEX off."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--apply",
+            action="store_true",
+            help="Build missing indexes and drop the ones they replace",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Exit with an error if any declared index is missing",
+        )
+
+    def handle(self, *args, **options):
+        missing_total = 0
+
+        for document in managed_documents():
+            collection = document._get_collection()
+            diff = diff_indexes(document)
+            usage = index_usage(document)
+            existing = collection.index_information()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(collection.name))
+            for spec in diff["missing"]:
+                label = f"{spec['name']} " if spec.get("name") else ""
+                self.stdout.write(
+                    f"  missing    {label}{describe(spec['fields'], spec)}"
+                )
+            for name in diff["undeclared"]:
+                info = existing[name]
+                replaced = " (replaced)" if name in diff["replaced"] else ""
+                self.stdout.write(
+                    f"  undeclared {name} {describe(info['key'], info)}{replaced}"
+                )
+            for name, info in existing.items():
+                if name != "_id_" and usage.get(name) == 0:
+                    self.stdout.write(f"  unused     {name} {describe(info['key'])}")
+
+            if not diff["missing"]:
+                continue
+            if not options["apply"]:
+                missing_total += len(diff["missing"])
+                continue
+
+            for spec in diff["missing"]:
+                replaces = [
+                    name
+                    for name, replacement in diff["replaced"].items()
+                    if replacement is spec
+                ]
+                try:
+                    build_index(document, spec, replaces)
+                except DuplicateKeyError as e:
+                    raise CommandError(
+                        f"Cannot build unique index {describe(spec['fields'], spec)} "
+                        f"on {collection.name}: existing documents clash ({e}). "
+                        "For users, run normalize_user_emails first."
+                    )
+                dropped = f", dropped {', '.join(replaces)}" if replaces else ""
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"  built {describe(spec['fields'], spec)}{dropped}"
+                    )
+                )
+
+        if missing_total and options["check"]:
+            raise CommandError(f"{missing_total} declared index(es) missing")
+        if missing_total:
+            self.stdout.write(f"{missing_total} missing; run with --apply to build")
@@ -1,28 +1,56 @@
-# from django.utils.deprecation import MiddlewareMixin
-# from django.http import JsonResponse
-# from django.conf import settings
-# from .jwt_utils import EnhancedJWTUtils
-# import json
-
-
-# class TokenRefreshMiddleware(MiddlewareMixin):
-#     """Middleware to automatically refresh tokens in grace period."""
-
-#     def process_response(self, request, response):
-#         """Add refresh hint headers if token needs refresh."""
-#         if hasattr(request, "token_needs_refresh") and request.token_needs_refresh:
-#             # Add header suggesting client should refresh token
-#             response["X-Token-Refresh-Suggested"] = "true"
-#             response["X-Refresh-JTI"] = request.refresh_jti
-
-#             # Optionally auto-refresh if configured
-#             if getattr(settings, "JWT_AUTO_REFRESH_IN_RESPONSE", False):
-#                 try:
-#                     refresh_jti = request.refresh_jti
-#                     # Find refresh token (this would need to be stored somewhere accessible)
-#                     # For demo purposes, we'll skip the actual refresh here
-#                     pass
-#                 except Exception:
-#                     pass
-
-#         return response
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.deprecation import MiddlewareMixin
+
+
+class AsyncJWTAuthenticationMiddleware:
+    """
+    Authenticate bearer tokens on the event loop under ASGI.
+
+    Token validation and the user lookup run with async Redis and MongoDB
+    clients before the view; ``JWTAuthentication`` then reuses the result
+    instead of making blocking calls. Under WSGI this is a pass-through.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        # Imported here so WSGI deployments never load the async clients
+        from .async_auth import async_authenticator
+
+        await async_authenticator.preauthenticate(request)
+        return await self.get_response(request)
+
+
+class TokenRefreshMiddleware(MiddlewareMixin):
+    """
+    Add refresh hint headers to responses for tokens close to expiry.
+
+    JWTAuthentication leaves ``token_refresh_hint`` on the request when the
+    access token is in its grace period or inside REFRESH_HINT_WINDOW of
+    expiring; clients can then refresh ahead of time instead of waiting for
+    a 401.
+    """
+
+    def process_response(self, request, response):
+        """Add refresh hint headers if token needs refresh."""
+        hint = getattr(request, "token_refresh_hint", None)
+        if hint:
+            # Header suggesting client should refresh token
+            response["X-Token-Refresh-Suggested"] = "true"
+            response["X-Token-Expires-In"] = str(hint["expires_in"])
+            if hint["grace_period"]:
+                response["X-Token-Grace-Period"] = "true"
+
+        return response
@@ -6,11 +6,52 @@ from mongoengine import (
     DateTimeField,
     URLField,
     ListField,
+    IntField,
+    QuerySet,
 )
 from django.contrib.auth.hashers import make_password, check_password
 from django.utils import timezone
 from datetime import datetime
 import uuid
+from .hashers import preferred_hasher
+from .hashing import password_hashing
+from .user_cache import user_cache
+
+
+# Collation of the email and username indexes: equal up to case
+CASE_INSENSITIVE = {"locale": "en", "strength": 2}
+
+
+class UserQuerySet(QuerySet):
+    """QuerySet for User with named field profiles."""
+
+    def case_insensitive(self):
+        """
+        Match strings regardless of case.
+
+        Email and username lookups must use this to be answered from their
+        (case-insensitive) unique indexes.
+        """
+        return self.collation(CASE_INSENSITIVE)
+
+    def profile(self, name):
+        """
+        Load only the fields of a named profile.
+
+        "auth" is what credential checks and identities need, "card" what
+        author listings show, and "full" everything but the legacy
+        ``refresh_tokens`` list. Documents loaded with a profile can still
+        be saved; only changed fields are written.
+
+        Raises:
+            ValueError: If there is no such profile
+        """
+        document = self._document
+        if name == "full":
+            return self.exclude(*document.FULL_PROFILE_EXCLUDE)
+        if name not in document.FIELD_PROFILES:
+            raise ValueError(f"Unknown user field profile {name!r}")
+        return self.only(*document.FIELD_PROFILES[name])
 
 
 class User(Document):
@@ -21,8 +62,9 @@ class User(Document):
 
     # Primary identification
     id = StringField(primary_key=True, default=lambda: str(uuid.uuid4()))
-    email = EmailField(required=True, unique=True)
-    username = StringField(required=True, unique=True, max_length=150)
+    # Unique regardless of case, see meta
+    email = EmailField(required=True)
+    username = StringField(required=True, max_length=150)
 
     # Password (hashed)
     password = StringField(required=True)
@@ -44,29 +86,124 @@ class User(Document):
     last_login = DateTimeField()
     updated_at = DateTimeField(default=datetime.utcnow)
 
-    # Additional fields for JWT
-    refresh_tokens = ListField(
-        StringField(), default=list
-    )  # Store active refresh tokens
+    # Legacy list of active refresh token JTIs. Sessions now live in the
+    # Session collection; this is only read to migrate tokens issued before.
+    refresh_tokens = ListField(StringField(), default=list)
+
+    # Changes to any other field invalidate cached identities on save
+    UNCACHED_FIELDS = {"password", "last_login", "updated_at", "refresh_tokens"}
+
+    # Field profiles for User.objects.profile()
+    FIELD_PROFILES = {
+        "auth": (
+            "id",
+            "email",
+            "username",
+            "password",
+            "is_active",
+            "is_staff",
+            "is_superuser",
+        ),
+        "card": ("id", "username", "first_name", "last_name", "profile_image"),
+    }
+    FULL_PROFILE_EXCLUDE = ("refresh_tokens",)
 
     meta = {
         "collection": "users",
-        "indexes": ["email", "username", "-date_joined", "is_active"],
+        "indexes": [
+            # Normalize stored emails with `manage.py normalize_user_emails`
+            # before building these
+            {
+                "name": "email_ci",
+                "fields": ["email"],
+                "unique": True,
+                "collation": CASE_INSENSITIVE,
+            },
+            {
+                "name": "username_ci",
+                "fields": ["username"],
+                "unique": True,
+                "collation": CASE_INSENSITIVE,
+            },
+            "-date_joined",
+            "is_active",
+        ],
+        "queryset_class": UserQuerySet,
     }
 
     def set_password(self, raw_password):
-        """Set password with Django's password hashing."""
-        self.password = make_password(raw_password)
+        """
+        Set password with Django's password hashing.
+
+        Uses the calibrated hasher (see ``accounts.hashers``). Hashing runs
+        under the per-worker concurrency cap (see ``accounts.hashing``) and
+        may raise ``PasswordHashingBusy``.
+        """
+        self.password = password_hashing.run(self._make_password, raw_password)
 
     def check_password(self, raw_password):
-        """Check password using Django's password verification."""
-        return check_password(raw_password, self.password)
+        """
+        Check password using Django's password verification.
+
+        A correct password stored with another hasher or cost than the
+        calibrated one is re-hashed and saved on the spot.
+        """
+        return password_hashing.run(self._check_password, raw_password)
+
+    async def aset_password(self, raw_password):
+        """``set_password`` for async code; hashes off the event loop."""
+        self.password = await password_hashing.arun(self._make_password, raw_password)
+
+    async def acheck_password(self, raw_password):
+        """``check_password`` for async code; hashes off the event loop."""
+        return await password_hashing.arun(self._check_password, raw_password)
+
+    def _make_password(self, raw_password):
+        return make_password(raw_password, hasher=preferred_hasher())
+
+    def _check_password(self, raw_password):
+        # Runs inside a hashing slot already, so the rehash hashes directly
+        def rehash(raw_password):
+            previous = self.password
+            self.password = self._make_password(raw_password)
+            if self.pk:
+                # Only replaces the hash that was verified, so a concurrent
+                # password change is never overwritten
+                User.objects(id=self.pk, password=previous).update_one(
+                    set__password=self.password
+                )
+
+        return check_password(
+            raw_password, self.password, setter=rehash, preferred=preferred_hasher()
+        )
 
     def save(self, *args, **kwargs):
-        """Override save to update timestamp."""
+        """
+        Override save to update timestamp.
+
+        Saving a change to the account status or profile drops the user's
+        cached identity on every worker. ``QuerySet.update`` bypasses this;
+        call ``user_cache.invalidate`` after such updates.
+        """
+        if self.email:
+            self.email = self.normalize_email(self.email)
+        changed = set() if self._created else set(self._get_changed_fields())
         self.updated_at = datetime.utcnow()
         super().save(*args, **kwargs)
 
+        if changed - self.UNCACHED_FIELDS:
+            user_cache.invalidate(self.id)
+
+    def delete(self, *args, **kwargs):
+        """Delete the user and drop their cached identity."""
+        super().delete(*args, **kwargs)
+        user_cache.invalidate(self.id)
+
+    @staticmethod
+    def normalize_email(email):
+        """Return the stored form of an email address."""
+        return email.strip().lower()
+
     def get_full_name(self):
         """Return full name."""
         return f"{self.first_name} {self.last_name}".strip()
@@ -92,23 +229,132 @@ class User(Document):
         """Always return False for authenticated users."""
         return False
 
-    # Helper methods
-    def add_refresh_token(self, token_jti):
-        """Add refresh token JTI to user's active tokens."""
-        if token_jti not in self.refresh_tokens:
-            self.refresh_tokens.append(token_jti)
-            # Keep only last 5 refresh tokens
-            if len(self.refresh_tokens) > 5:
-                self.refresh_tokens = self.refresh_tokens[-5:]
-            self.save()
-
-    def remove_refresh_token(self, token_jti):
-        """Remove refresh token JTI from user's active tokens."""
-        if token_jti in self.refresh_tokens:
-            self.refresh_tokens.remove(token_jti)
-            self.save()
-
-    def clear_refresh_tokens(self):
-        """Clear all refresh tokens (logout from all devices)."""
-        self.refresh_tokens = []
-        self.save()
+
+class Session(Document):
+    """
+    Refresh-token session, one per device login.
+
+    Kept out of the users collection so refresh and logout never rewrite
+    the user document. Sessions are looked up by the current refresh token
+    JTI (or by the hash of an opaque refresh token) and removed by MongoDB's
+    TTL monitor once ``expires_at`` passes.
+    """
+
+    MAX_PER_USER = 5
+
+    id = StringField(primary_key=True, default=lambda: str(uuid.uuid4()))
+    user_id = StringField(required=True)
+    device_id = StringField(default="")
+
+    # Current refresh token; both change on rotation
+    jti = StringField(required=True)
+    token_hash = StringField()  # SHA-256 of an opaque refresh token
+
+    # User's token generation when the session was opened
+    gen = IntField(default=0)
+
+    created_at = DateTimeField(default=datetime.utcnow)
+    last_used = DateTimeField(default=datetime.utcnow)
+    expires_at = DateTimeField(required=True)
+
+    meta = {
+        "collection": "sessions",
+        "indexes": [
+            {"fields": ["jti"], "unique": True},
+            {
+                "fields": ["token_hash"],
+                "unique": True,
+                "partialFilterExpression": {"token_hash": {"$type": "string"}},
+            },
+            ("user_id", "-created_at"),
+            {"fields": ["expires_at"], "expireAfterSeconds": 0},
+        ],
+    }
+
+    def __str__(self):
+        return f"{self.user_id}:{self.device_id or self.id}"
+
+    @classmethod
+    def open(cls, user_id, jti, expires_at, gen=0, device_id="", token_hash=None):
+        """
+        Start a session and drop the user's oldest beyond ``MAX_PER_USER``.
+
+        Returns:
+            Session: The new session
+        """
+        session = cls(
+            user_id=str(user_id),
+            jti=jti,
+            token_hash=token_hash,
+            gen=gen,
+            device_id=device_id or "",
+            expires_at=expires_at,
+        )
+        session.save(force_insert=True)
+
+        stale = [
+            doc["_id"]
+            for doc in cls._get_collection()
+            .find({"user_id": str(user_id)}, {"_id": 1})
+            .sort("created_at", -1)
+            .skip(cls.MAX_PER_USER)
+        ]
+        if stale:
+            cls._get_collection().delete_many({"_id": {"$in": stale}})
+
+        return session
+
+    @classmethod
+    def find_live(cls, lookup):
+        """
+        Read a live session without touching it.
+
+        Returns:
+            dict: The raw session's ``user_id`` and ``gen``, or None
+        """
+        return cls._get_collection().find_one(
+            dict(lookup, expires_at={"$gt": datetime.utcnow()}),
+            {"user_id": 1, "gen": 1},
+        )
+
+    @classmethod
+    def claim(cls, lookup, rotate_to=None):
+        """
+        Atomically mark a live session as used, optionally rotating it.
+
+        Of several concurrent calls rotating the same token only the first
+        matches, because the others no longer find the old JTI/hash.
+
+        Args:
+            lookup: {"jti": ...} or {"token_hash": ...}
+            rotate_to: Optional dict of new ``jti``, ``token_hash`` and
+                ``expires_at`` values
+
+        Returns:
+            dict: The raw session document as it was before the update,
+                or None if no live session matched
+        """
+        now = datetime.utcnow()
+        changes = {"last_used": now}
+        if rotate_to:
+            changes.update(
+                {key: value for key, value in rotate_to.items() if value is not None}
+            )
+
+        return cls._get_collection().find_one_and_update(
+            dict(lookup, expires_at={"$gt": now}), {"$set": changes}
+        )
+
+    @classmethod
+    def revoke(cls, lookup, user_id=None):
+        """Delete a single session; returns True if one was removed."""
+        query = dict(lookup)
+        if user_id is not None:
+            query["user_id"] = str(user_id)
+        return cls._get_collection().delete_one(query).deleted_count > 0
+
+    @classmethod
+    def revoke_all(cls, user_id):
+        """Delete every session of a user (logout from all devices)."""
+        result = cls._get_collection().delete_many({"user_id": str(user_id)})
+        return result.deleted_count
@@ -0,0 +1,26 @@
+import hmac
+from django.conf import settings
+from rest_framework import permissions
+
+
+class HasIntrospectionKey(permissions.BasePermission):
+    """
+    Allow internal services that present a key from INTROSPECTION_KEYS.
+
+    The key is sent in the ``X-Introspection-Key`` header. With no keys
+    configured every request is denied.
+    """
+
+    message = "A valid introspection key is required."
+
+    def has_permission(self, request, view):
+        presented = request.META.get("HTTP_X_INTROSPECTION_KEY", "")
+        if not presented:
+            return False
+
+        # Compared against every key so the timing doesn't reveal which matched
+        matched = False
+        for key in settings.JWT_SETTINGS.get("INTROSPECTION_KEYS", ()):
+            if key and hmac.compare_digest(presented.encode(), key.encode()):
+                matched = True
+        return matched
@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth.password_validation import validate_password
 from django.core.exceptions import ValidationError as DjangoValidationError
 from .models import User
@@ -17,12 +18,16 @@ class UserRegistrationSerializer(serializers.Serializer):
     password_confirm = serializers.CharField(write_only=True)
     phone = serializers.CharField(max_length=20, required=False, allow_blank=True)
     bio = serializers.CharField(required=False, allow_blank=True)
+    device_id = serializers.CharField(
+        max_length=100, required=False, allow_blank=True, write_only=True
+    )
 
     def validate_email(self, value):
         """Validate email uniqueness."""
-        if User.objects.filter(email=value).first():
+        email = User.normalize_email(value)
+        if User.objects.case_insensitive().filter(email=email).only("id").first():
             raise serializers.ValidationError("User with this email already exists.")
-        return value.lower()
+        return email
 
     def validate_username(self, value):
         """Validate username uniqueness and format."""
@@ -32,7 +37,7 @@ class UserRegistrationSerializer(serializers.Serializer):
                 "Username can only contain letters, numbers, and underscores."
             )
 
-        if User.objects.filter(username=value).first():
+        if User.objects.case_insensitive().filter(username=value).only("id").first():
             raise serializers.ValidationError("Username already exists.")
         return value
 
@@ -64,6 +69,7 @@ class UserRegistrationSerializer(serializers.Serializer):
     def create(self, validated_data):
         """Create new user."""
         validated_data.pop("password_confirm")
+        validated_data.pop("device_id", None)  # Session data, not the user's
         password = validated_data.pop("password")
 
         user = User(**validated_data)
@@ -77,11 +83,12 @@ class UserLoginSerializer(serializers.Serializer):
 
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
+    device_id = serializers.CharField(max_length=100, required=False, allow_blank=True)
     remember_me = serializers.BooleanField(default=False, required=False)
 
     def validate(self, attrs):
         """Validate user credentials."""
-        email = attrs.get("email", "").lower()
+        email = User.normalize_email(attrs.get("email", ""))
         password = attrs.get("password")
 
         if not email or not password:
@@ -96,7 +103,8 @@ class UserLoginSerializer(serializers.Serializer):
         # session tokens will be expired as per given time
 
         try:
-            user = User.objects.get(email=email)
+            # The response echoes the profile, so bio and image are needed
+            user = User.objects.profile("full").case_insensitive().get(email=email)
         except User.DoesNotExist:
             raise serializers.ValidationError(
                 {"non_field_errors": "Invalid email or password."}
@@ -150,7 +158,13 @@ class UserUpdateSerializer(serializers.Serializer):
     def validate_username(self, value):
         """Validate username uniqueness."""
         user = self.context["user"]
-        if User.objects.filter(username=value).exclude(id=user.id).first():
+        taken = (
+            User.objects.case_insensitive()
+            .filter(username=value, id__ne=user.id)
+            .only("id")
+            .first()
+        )
+        if taken:
             raise serializers.ValidationError("Username already exists.")
         return value
 
@@ -209,6 +223,29 @@ class RefreshTokenSerializer(serializers.Serializer):
     refresh = serializers.CharField(required=True)
 
 
+class SlidingTokenRefreshSerializer(serializers.Serializer):
+    """Serializer for sliding token refresh."""
+
+    token = serializers.CharField(required=True)
+
+
+class TokenIntrospectionSerializer(serializers.Serializer):
+    """Serializer for token introspection (a single token or a batch)."""
+
+    token = serializers.CharField(required=False)
+    tokens = serializers.ListField(
+        child=serializers.CharField(),
+        required=False,
+        allow_empty=False,
+        max_length=settings.JWT_SETTINGS.get("INTROSPECTION_MAX_BATCH", 500),
+    )
+
+    def validate(self, attrs):
+        if ("token" in attrs) == ("tokens" in attrs):
+            raise serializers.ValidationError("Provide either 'token' or 'tokens'.")
+        return attrs
+
+
 class LogoutSerializer(serializers.Serializer):
     """Serializer for user logout."""
 
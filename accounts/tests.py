@@ -1,3 +1,1423 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import hmac
+import io
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+)
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+import jwt
+from cryptography.hazmat.primitives import serialization
+from .blacklist import BlacklistFilter
+from .bloom import BloomFilter
+from .hashers import (
+    Calibration,
+    CalibratedArgon2PasswordHasher,
+    CalibratedBCryptSHA256PasswordHasher,
+    CalibratedPBKDF2PasswordHasher,
+)
+from .hashing import PasswordHashingBusy, PasswordHashingExecutor
+from .indexes import managed_documents, set_auto_create_index
+from .jwt_utils import JWTUtils, get_token_codec, token_cache
+from .keys import (
+    DEFAULT_KID,
+    KeyRing,
+    KeyRingFile,
+    SigningKey,
+    UnknownKeyError,
+    format_timestamp,
+    generate_key_config,
+)
+from .models import User
+from .throttling import LoginThrottle, parse_rate
+from .token_cache import TokenCache
+from .token_codec import TokenCodec, b64decode, b64encode
+from .verifier import TokenVerifier, check_revocation
+from .views import get_device_id
 
-# Create your tests here.
+
+def make_token(header, payload, sign):
+    """Assemble a compact JWS from raw parts; ``sign`` maps input to bytes."""
+    signing_input = (
+        b64encode(json.dumps(header).encode("utf-8"))
+        + b"."
+        + b64encode(json.dumps(payload).encode("utf-8"))
+    )
+    return (signing_input + b"." + b64encode(sign(signing_input))).decode("ascii")
+
+
+def access_payload(**extra):
+    now = datetime.now(timezone.utc)
+    payload = {
+        "user_id": str(uuid.uuid4()),
+        "email": "ada@example.com",
+        "username": "ada",
+        "token_type": "access",
+        "jti": str(uuid.uuid4()),
+        "gen": 0,
+        "iat": now,
+        "exp": now + timedelta(minutes=15),
+    }
+    payload.update(extra)
+    return payload
+
+
+def timestamps(payload):
+    """The claims a decoded token should carry for ``payload``."""
+    return {
+        name: int(value.timestamp()) if isinstance(value, datetime) else value
+        for name, value in payload.items()
+    }
+
+
+class TokenCodecTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.hs_key = SigningKey.from_config(generate_key_config("hs", "HS256"))
+        cls.rs_key = SigningKey.from_config(generate_key_config("rs", "RS256"))
+
+    def codec(self, current="hs", profile="full", keys=None):
+        ring = KeyRing(keys or [self.hs_key, self.rs_key], current)
+        return TokenCodec(ring, profile=profile)
+
+    def test_round_trip_full_profile(self):
+        for current in ("hs", "rs"):
+            with self.subTest(key=current):
+                codec = self.codec(current)
+                payload = access_payload()
+                token = codec.encode(payload)
+
+                self.assertEqual(codec.decode(token), timestamps(payload))
+                wire = json.loads(b64decode(token.split(".")[1].encode("ascii")))
+                self.assertIn("user_id", wire)
+
+    def test_round_trip_compact_profile(self):
+        codec = self.codec(profile="compact")
+        payload = access_payload()
+        token = codec.encode(payload)
+
+        self.assertEqual(codec.decode(token), timestamps(payload))
+        wire = json.loads(b64decode(token.split(".")[1].encode("ascii")))
+        self.assertEqual(wire["sub"], payload["user_id"])
+        self.assertEqual(wire["tt"], "access")
+        self.assertEqual(wire["em"], payload["email"])
+        self.assertNotIn("user_id", wire)
+
+    def test_profiles_read_each_others_tokens(self):
+        payload = access_payload()
+        full, compact = self.codec(), self.codec(profile="compact")
+
+        self.assertEqual(full.decode(compact.encode(payload)), timestamps(payload))
+        self.assertEqual(compact.decode(full.encode(payload)), timestamps(payload))
+
+    def test_user_claims_can_be_left_out(self):
+        ring = KeyRing([self.hs_key], "hs")
+        codec = TokenCodec(ring, include_user_claims=False)
+
+        claims = codec.decode(codec.encode(access_payload()))
+        self.assertNotIn("email", claims)
+        self.assertNotIn("username", claims)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            self.codec(profile="tiny")
+
+    def test_pyjwt_decodes_codec_tokens(self):
+        for current, profile in (("hs", "full"), ("rs", "full"), ("rs", "compact")):
+            with self.subTest(key=current, profile=profile):
+                codec = self.codec(current, profile)
+                key = codec.key_ring.current
+                payload = access_payload()
+                token = codec.encode(payload)
+
+                header = jwt.get_unverified_header(token)
+                self.assertEqual(
+                    header, {"alg": key.algorithm, "kid": current, "typ": "JWT"}
+                )
+                claims = jwt.decode(
+                    token, key.verification_key, algorithms=[key.algorithm]
+                )
+                self.assertEqual(claims["jti"], payload["jti"])
+                self.assertEqual(claims["exp"], timestamps(payload)["exp"])
+
+    def test_codec_decodes_pyjwt_tokens(self):
+        for current in ("hs", "rs"):
+            with self.subTest(key=current):
+                codec = self.codec(current)
+                key = codec.key_ring.current
+                payload = access_payload()
+
+                token = jwt.encode(
+                    payload,
+                    key.signing_key,
+                    algorithm=key.algorithm,
+                    headers={"kid": current},
+                )
+                self.assertEqual(codec.decode(token), timestamps(payload))
+
+                # Other header layouts take the slow path through the ring
+                token = jwt.encode(
+                    payload,
+                    key.signing_key,
+                    algorithm=key.algorithm,
+                    headers={"kid": current, "cty": "at+jwt"},
+                )
+                self.assertEqual(codec.decode(token), timestamps(payload))
+
+    def test_rejects_hs_token_signed_with_rs_public_key(self):
+        codec = self.codec()
+        public_pem = self.rs_key.verification_key.public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        token = make_token(
+            {"alg": "HS256", "kid": "rs", "typ": "JWT"},
+            timestamps(access_payload()),
+            lambda data: hmac.new(public_pem, data, hashlib.sha256).digest(),
+        )
+
+        with self.assertRaises(jwt.InvalidAlgorithmError):
+            codec.decode(token)
+
+    def test_rejects_unknown_kid(self):
+        codec = self.codec()
+        stranger = SigningKey.from_config(generate_key_config("other", "HS256"))
+        token = TokenCodec(KeyRing([stranger], "other")).encode(access_payload())
+
+        with self.assertRaises(UnknownKeyError):
+            codec.decode(token)
+
+    def test_rejects_alg_none(self):
+        codec = self.codec()
+        payload = timestamps(access_payload())
+
+        for header in (
+            {"alg": "none", "kid": "hs", "typ": "JWT"},
+            {"alg": "none", "typ": "JWT"},
+        ):
+            with self.subTest(header=header):
+                token = make_token(header, payload, lambda data: b"")
+                with self.assertRaises(jwt.InvalidTokenError):
+                    codec.decode(token)
+
+    def test_rejects_tampered_payload(self):
+        for current in ("hs", "rs"):
+            with self.subTest(key=current):
+                codec = self.codec(current)
+                header, _, signature = codec.encode(access_payload()).split(".")
+                forged = timestamps(access_payload(user_id=str(uuid.uuid4())))
+                payload = b64encode(json.dumps(forged).encode("utf-8")).decode()
+
+                with self.assertRaises(jwt.InvalidSignatureError):
+                    codec.decode(f"{header}.{payload}.{signature}")
+
+    def test_rejects_tampered_signature(self):
+        for current in ("hs", "rs"):
+            with self.subTest(key=current):
+                codec = self.codec(current)
+                header, payload, signature = codec.encode(access_payload()).split(".")
+                raw = bytearray(b64decode(signature.encode("ascii")))
+                raw[0] ^= 1
+                signature = b64encode(bytes(raw)).decode("ascii")
+
+                with self.assertRaises(jwt.InvalidSignatureError):
+                    codec.decode(f"{header}.{payload}.{signature}")
+
+    def test_rejects_malformed_tokens(self):
+        codec = self.codec()
+        for token in ("", "abc", "a.b", "a.b.!!"):
+            with self.subTest(token=token):
+                with self.assertRaises(jwt.DecodeError):
+                    codec.decode(token)
+
+
+class KeyRingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.hs_key = SigningKey.from_config(generate_key_config("hs", "HS256"))
+        cls.rs_key = SigningKey.from_config(generate_key_config("rs", "RS256"))
+
+    def test_keys_are_looked_up_by_kid(self):
+        ring = KeyRing([self.hs_key, self.rs_key], "rs")
+
+        self.assertIs(ring.get("hs"), self.hs_key)
+        self.assertIs(ring.current, self.rs_key)
+        with self.assertRaises(UnknownKeyError):
+            ring.get("other")
+        # Tokens without a kid header need a "default" key
+        with self.assertRaises(UnknownKeyError):
+            ring.get(None)
+
+    def test_legacy_settings_build_a_default_key(self):
+        ring = KeyRing.from_settings({"SIGNING_KEY": "x" * 32, "ALGORITHM": "HS256"})
+
+        self.assertEqual(ring.current.kid, DEFAULT_KID)
+        self.assertIs(ring.get(None), ring.current)
+
+    def test_verification_only_key_cannot_sign(self):
+        public_pem = self.rs_key.verification_key.public_bytes(
+            serialization.Encoding.PEM,
+            serialization.PublicFormat.SubjectPublicKeyInfo,
+        )
+        peer = SigningKey("peer", "RS256", public_key=public_pem)
+
+        self.assertFalse(peer.can_sign)
+        with self.assertRaisesMessage(ValueError, "has no private key"):
+            KeyRing([peer], "peer")
+        ring = KeyRing([self.hs_key, peer], "hs")
+        self.assertIs(ring.get("peer"), peer)
+
+    def test_jwks_publishes_only_public_keys(self):
+        ring = KeyRing([self.hs_key, self.rs_key], "hs")
+
+        jwks = ring.jwks()
+        self.assertEqual([jwk["kid"] for jwk in jwks["keys"]], ["rs"])
+        jwk = jwks["keys"][0]
+        self.assertEqual((jwk["alg"], jwk["use"], jwk["kty"]), ("RS256", "sig", "RSA"))
+        self.assertNotIn("d", jwk)
+        self.assertIs(ring.jwks(), jwks)
+
+    def test_published_jwk_verifies_tokens(self):
+        codec = TokenCodec(KeyRing([self.rs_key], "rs"))
+        token = codec.encode(access_payload())
+
+        jwk = jwt.PyJWK(codec.key_ring.jwks()["keys"][0])
+        claims = jwt.decode(token, jwk.key, algorithms=["RS256"])
+        self.assertEqual(claims["token_type"], "access")
+
+
+class KeyRotationTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.new = SigningKey.from_config(generate_key_config("new", "HS256"))
+
+    def write_ring(self, path, config):
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump(config, fh)
+        # Make the change visible even within the filesystem's mtime resolution
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_rejects_expired_key(self):
+        old = SigningKey.from_config(generate_key_config("old", "HS256"))
+        payload = access_payload()
+        tokens = {
+            "codec": TokenCodec(KeyRing([old], "old")).encode(payload),
+            "pyjwt": jwt.encode(
+                timestamps(payload),
+                old.signing_key,
+                algorithm="HS256",
+                headers={"kid": "old", "cty": "at+jwt"},
+            ),
+        }
+
+        # Retired by a rotation, then past its verification window
+        retired = SigningKey(
+            "old", "HS256", secret=old.signing_key, not_after=time.time() - 1
+        )
+        codec = TokenCodec(KeyRing([self.new, retired], "new"))
+        for source, token in tokens.items():
+            with self.subTest(source=source):
+                with self.assertRaisesMessage(
+                    jwt.InvalidTokenError, "Signing key has expired"
+                ):
+                    codec.decode(token)
+
+        # Once pruned from the ring the key is simply unknown
+        pruned = TokenCodec(codec.key_ring.prune())
+        with self.assertRaises(UnknownKeyError):
+            pruned.decode(tokens["codec"])
+
+    def test_retired_key_verifies_until_not_after(self):
+        old = SigningKey.from_config(generate_key_config("old", "HS256"))
+        token = TokenCodec(KeyRing([old], "old")).encode(access_payload())
+
+        retired = SigningKey(
+            "old", "HS256", secret=old.signing_key, not_after=time.time() + 60
+        )
+        codec = TokenCodec(KeyRing([self.new, retired], "new"))
+        self.assertEqual(codec.decode(token)["token_type"], "access")
+
+    def test_ring_refuses_an_expired_current_key(self):
+        expired = SigningKey(
+            "old", "HS256", secret="x" * 32, not_after=time.time() - 1
+        )
+        with self.assertRaisesMessage(ValueError, "has expired"):
+            KeyRing([expired], "old")
+
+    def test_prune_keeps_live_keys(self):
+        now = time.time()
+        retiring = SigningKey("old", "HS256", secret="x" * 32, not_after=now + 60)
+        ring = KeyRing([self.new, retiring], "new")
+
+        self.assertEqual(ring.next_expiry, now + 60)
+        self.assertIs(ring.prune(now), ring)
+        pruned = ring.prune(now + 60)
+        self.assertEqual(set(pruned.keys), {"new"})
+        self.assertIs(pruned.current, self.new)
+        self.assertIsNone(pruned.next_expiry)
+
+    def test_from_config_skips_expired_keys(self):
+        config = {
+            "current_kid": "new",
+            "keys": [
+                generate_key_config("new", "HS256"),
+                dict(generate_key_config("old", "HS256"), not_after=time.time() - 1),
+            ],
+        }
+        self.assertEqual(set(KeyRing.from_config(config).keys), {"new"})
+
+    def test_verifier_follows_a_rotated_ring_file(self):
+        old = generate_key_config("old", "HS256")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "keys.json")
+            self.write_ring(path, {"current_kid": "old", "keys": [old]})
+            verifier = TokenVerifier(key_ring_file=KeyRingFile(path, 3600))
+            before = verifier.codec().encode(access_payload())
+
+            # What rotate_signing_key writes: a new current key, the old one
+            # verifying until its not_after
+            not_after = time.time() + 60
+            self.write_ring(
+                path,
+                {
+                    "current_kid": "new",
+                    "keys": [
+                        generate_key_config("new", "HS256"),
+                        dict(old, not_after=format_timestamp(not_after)),
+                    ],
+                },
+            )
+            # Another worker already signs with the new key; its kid forces
+            # a reload despite the long check interval
+            after = TokenCodec(KeyRingFile(path).ring).encode(access_payload())
+            self.assertEqual(verifier.verify_signature(after)["token_type"], "access")
+            self.assertEqual(verifier.codec().key_ring.current.kid, "new")
+
+            # The retired key verifies until not_after, even past the cache
+            self.assertEqual(verifier.verify_signature(before)["token_type"], "access")
+            with mock.patch("time.time", return_value=not_after + 1):
+                with self.assertRaises(UnknownKeyError):
+                    verifier.verify_signature(before)
+                self.assertEqual(verifier.token_cache.stats()["size"], 0)
+
+    def test_rotate_signing_key_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "keys.json")
+            self.write_ring(
+                path,
+                {"current_kid": "old", "keys": [generate_key_config("old", "HS256")]},
+            )
+            jwt_settings = {**settings.JWT_SETTINGS, "KEY_RING_FILE": path}
+            with override_settings(JWT_SETTINGS=jwt_settings):
+                call_command(
+                    "rotate_signing_key", kid="new", overlap=60, stdout=io.StringIO()
+                )
+
+            with open(path, encoding="utf-8") as fh:
+                config = json.load(fh)
+            ring = KeyRing.from_config(config)
+            self.assertEqual(ring.current.kid, "new")
+            retired = ring.keys["old"]
+            self.assertAlmostEqual(retired.not_after, time.time() + 60, delta=5)
+
+
+class TokenCacheTests(TestCase):
+    def setUp(self):
+        self.cache = TokenCache(max_size=3)
+
+    def test_get_returns_a_copy(self):
+        self.cache.set("t1", {"jti": "a"}, expires_at=time.time() + 60)
+
+        self.cache.get("t1")["jti"] = "changed"
+        self.assertEqual(self.cache.get("t1"), {"jti": "a"})
+
+    def test_entries_expire(self):
+        now = time.time()
+        self.cache.set("t1", {"jti": "a", "exp": now + 60})
+
+        with mock.patch("accounts.token_cache.time.time", return_value=now + 59):
+            self.assertIsNotNone(self.cache.get("t1"))
+        with mock.patch("accounts.token_cache.time.time", return_value=now + 60):
+            self.assertIsNone(self.cache.get("t1"))
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_expired_payloads_are_not_stored(self):
+        self.cache.set("t1", {"jti": "a", "exp": time.time() - 1})
+        self.cache.set("t2", {"jti": "b"})
+
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+    def test_invalidate_jti(self):
+        expires_at = time.time() + 60
+        self.cache.set("t1", {"jti": "a"}, expires_at=expires_at)
+        self.cache.set("t2", {"jti": "b"}, expires_at=expires_at)
+
+        self.cache.invalidate_jti("a")
+        self.cache.invalidate_jti("unknown")
+        self.assertIsNone(self.cache.get("t1"))
+        self.assertEqual(self.cache.get("t2"), {"jti": "b"})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        expires_at = time.time() + 60
+        for token in ("t1", "t2", "t3"):
+            self.cache.set(token, {"jti": token}, expires_at=expires_at)
+        self.cache.get("t1")
+        self.cache.set("t4", {"jti": "t4"}, expires_at=expires_at)
+
+        self.assertIsNone(self.cache.get("t2"))
+        self.assertIsNotNone(self.cache.get("t1"))
+        # The evicted entry's jti no longer points anywhere
+        self.cache.invalidate_jti("t2")
+        self.assertEqual(self.cache.stats()["size"], 3)
+
+    def test_stats(self):
+        self.cache.set("t1", {"jti": "a"}, expires_at=time.time() + 60)
+        self.cache.get("t1")
+        self.cache.get("t1")
+        self.cache.get("t2")
+
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (2, 1))
+        self.assertAlmostEqual(stats["hit_rate"], 2 / 3)
+        self.assertEqual((stats["size"], stats["max_size"]), (1, 3))
+
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()["hits"], 0)
+        self.assertIsNone(self.cache.get("t1"))
+
+    def test_zero_size_disables_the_cache(self):
+        cache = TokenCache(max_size=0)
+        cache.set("t1", {"jti": "a"}, expires_at=time.time() + 60)
+
+        self.assertIsNone(cache.get("t1"))
+        self.assertEqual(cache.stats()["size"], 0)
+
+
+def jtis(count):
+    return [str(uuid.uuid4()) for _ in range(count)]
+
+
+class BloomFilterTests(TestCase):
+    def test_added_items_are_present(self):
+        bloom = BloomFilter(capacity=5000, error_rate=0.001)
+        added = jtis(5000)
+        for jti in added:
+            bloom.add(jti)
+
+        self.assertTrue(all(jti in bloom for jti in added))
+        self.assertEqual(len(bloom), 5000)
+
+    def test_sizing(self):
+        bloom = BloomFilter(capacity=1000, error_rate=0.01)
+
+        expected_bits = -1000 * math.log(0.01) / math.log(2) ** 2
+        self.assertAlmostEqual(bloom.num_bits, expected_bits, delta=1)
+        self.assertEqual(bloom.num_hashes, 7)
+        self.assertEqual(len(bloom._bits), math.ceil(bloom.num_bits / 8))
+
+    def test_false_positive_rate_at_capacity(self):
+        bloom = BloomFilter(capacity=2000, error_rate=0.01)
+        for jti in jtis(2000):
+            bloom.add(jti)
+
+        false_positives = sum(jti in bloom for jti in jtis(20000))
+        self.assertLess(false_positives / 20000, 0.02)
+
+
+class BlacklistFilterTests(TestCase):
+    def setUp(self):
+        self.blacklist = BlacklistFilter(capacity=100, rebuild_interval=3600)
+        patcher = mock.patch("accounts.blacklist.cache")
+        self.cache = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def keys(self, stored, arriving=()):
+        """Fake SCAN of ``blacklist:*``; ``arriving`` are published mid-scan."""
+
+        def iter_keys(pattern, itersize=None):
+            for jti in arriving:
+                self.blacklist.add(jti)
+            for jti in stored:
+                yield f"blacklist:{jti}"
+
+        self.cache.iter_keys.side_effect = iter_keys
+
+    def test_everything_matches_before_the_first_rebuild(self):
+        self.assertFalse(self.blacklist.ready)
+        self.assertTrue(self.blacklist.might_contain("anything"))
+
+    def test_stored_jtis_are_present_after_rebuild(self):
+        # More than the configured capacity, so the filter is resized
+        stored = jtis(500)
+        self.keys(stored)
+        self.blacklist.rebuild()
+
+        self.assertTrue(self.blacklist.ready)
+        self.assertTrue(all(self.blacklist.might_contain(jti) for jti in stored))
+
+    def test_jtis_published_during_rebuild_are_present(self):
+        stored, arriving = jtis(50), jtis(5)
+        self.keys(stored, arriving)
+        self.blacklist.rebuild()
+
+        for jti in stored + arriving:
+            self.assertTrue(self.blacklist.might_contain(jti))
+
+    def test_added_jtis_are_present(self):
+        self.keys(jtis(10))
+        self.blacklist.rebuild()
+
+        added = jtis(50)
+        for jti in added:
+            self.blacklist.add(jti)
+        self.assertTrue(all(self.blacklist.might_contain(jti) for jti in added))
+
+    def test_rebuild_overtaken_by_invalidate_is_discarded(self):
+        stored = jtis(10)
+
+        def iter_keys(pattern, itersize=None):
+            # The subscription drops while the periodic rebuild scans
+            self.blacklist.invalidate()
+            for jti in stored:
+                yield f"blacklist:{jti}"
+
+        self.cache.iter_keys.side_effect = iter_keys
+        self.blacklist.rebuild()
+
+        self.assertFalse(self.blacklist.ready)
+        self.assertTrue(self.blacklist.might_contain("anything"))
+
+        # The rebuild on reconnect installs a filter again
+        self.keys(stored)
+        self.blacklist.rebuild()
+        self.assertTrue(self.blacklist.ready)
+
+    def test_rebuild_scheduled_before_invalidate_is_discarded(self):
+        self.keys(jtis(10))
+        self.blacklist.rebuild()
+        version = self.blacklist._version
+
+        # Queued behind the rebuild lock while the subscription dropped
+        self.blacklist.invalidate()
+        self.blacklist.rebuild(version)
+        self.assertFalse(self.blacklist.ready)
+
+    def test_invalidate_falls_back_to_redis(self):
+        self.keys([])
+        self.blacklist.rebuild()
+        self.blacklist.invalidate()
+
+        self.assertFalse(self.blacklist.ready)
+        self.assertTrue(self.blacklist.might_contain("anything"))
+
+
+LOCAL_CACHE = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class FakeSessions:
+    """In-memory stand-in for ``Session`` with the same claim semantics."""
+
+    def __init__(self):
+        self.documents = []
+
+    def open(self, user_id, jti, expires_at, gen=0, device_id="", token_hash=None):
+        document = {
+            "_id": str(uuid.uuid4()),
+            "user_id": str(user_id),
+            "device_id": device_id or "",
+            "jti": jti,
+            "token_hash": token_hash,
+            "gen": gen,
+            "expires_at": expires_at,
+        }
+        self.documents.append(document)
+        return SimpleNamespace(**document)
+
+    def _live(self, lookup):
+        now = datetime.utcnow()
+        for document in self.documents:
+            if document["expires_at"] > now and all(
+                document.get(name) == value for name, value in lookup.items()
+            ):
+                return document
+        return None
+
+    def find_live(self, lookup):
+        document = self._live(lookup)
+        return dict(document) if document else None
+
+    def claim(self, lookup, rotate_to=None):
+        document = self._live(lookup)
+        if document is None:
+            return None
+        before = dict(document)
+        document.update(
+            {name: value for name, value in (rotate_to or {}).items() if value}
+        )
+        return before
+
+    def revoke(self, lookup, user_id=None):
+        document = self._live(lookup)
+        if document is None or user_id and document["user_id"] != str(user_id):
+            return False
+        self.documents.remove(document)
+        return True
+
+    def revoke_all(self, user_id):
+        before = len(self.documents)
+        self.documents = [
+            document
+            for document in self.documents
+            if document["user_id"] != str(user_id)
+        ]
+        return before - len(self.documents)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class JWTFlowTestCase(TestCase):
+    """
+    Token flows against a local-memory cache.
+
+    Pub/sub is switched off and sessions live in a ``FakeSessions``, so
+    neither Redis nor MongoDB is needed; identities come from the cache
+    entry ``generate_tokens`` writes.
+    """
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.sessions = FakeSessions()
+        for target, value in (
+            ("accounts.jwt_utils.broadcast", mock.MagicMock()),
+            ("accounts.user_cache.broadcast", mock.MagicMock()),
+            ("accounts.jwt_utils.Session", self.sessions),
+        ):
+            patcher = mock.patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # Legacy User.refresh_tokens lists: none unless a test adds one
+        patcher = mock.patch.object(User, "objects")
+        self.users = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.users.return_value.update_one.return_value = 0
+        self.user = self.make_user()
+
+    def make_user(self, **fields):
+        user = {
+            "id": str(uuid.uuid4()),
+            "email": "ada@example.com",
+            "username": "ada",
+            "is_active": True,
+            "is_staff": False,
+            "is_superuser": False,
+        }
+        user.update(fields)
+        return SimpleNamespace(**user)
+
+    def jwt_settings(self, **overrides):
+        return override_settings(JWT_SETTINGS={**settings.JWT_SETTINGS, **overrides})
+
+    def assertRejected(self, token, message=None):
+        with self.assertRaises(jwt.InvalidTokenError) as raised:
+            JWTUtils.decode_token(token, allow_grace_period=True)
+        if message:
+            self.assertIn(message, str(raised.exception))
+
+
+class TokenGenerationTests(JWTFlowTestCase):
+    def test_revoke_bumps_the_generation(self):
+        self.assertEqual(JWTUtils.get_token_generation(self.user.id), 0)
+        self.assertEqual(JWTUtils.revoke_user_tokens(self.user.id), 1)
+        self.assertEqual(JWTUtils.revoke_user_tokens(self.user.id), 2)
+        self.assertEqual(JWTUtils.get_token_generation(self.user.id), 2)
+
+    def test_revoke_rejects_every_earlier_token(self):
+        first = JWTUtils.generate_tokens(self.user)
+        second = JWTUtils.generate_tokens(self.user)
+        JWTUtils.decode_token(first["access"])
+
+        JWTUtils.revoke_user_tokens(self.user.id)
+
+        for tokens in (first, second):
+            self.assertRejected(tokens["access"], "revoked")
+            self.assertRejected(tokens["refresh"], "revoked")
+            with self.assertRaises(jwt.InvalidTokenError):
+                JWTUtils.refresh_access_token(tokens["refresh"])
+
+    def test_tokens_issued_after_revoke_are_valid(self):
+        JWTUtils.revoke_user_tokens(self.user.id)
+        tokens = JWTUtils.generate_tokens(self.user)
+
+        payload = JWTUtils.decode_token(tokens["access"])
+        self.assertEqual(payload["gen"], 1)
+        refreshed = JWTUtils.refresh_access_token(tokens["refresh"], rotate=False)
+        self.assertEqual(JWTUtils.decode_token(refreshed["access"])["gen"], 1)
+
+    def test_other_users_are_unaffected(self):
+        other = self.make_user(email="grace@example.com", username="grace")
+        tokens = JWTUtils.generate_tokens(other)
+
+        JWTUtils.revoke_user_tokens(self.user.id)
+        self.assertEqual(JWTUtils.decode_token(tokens["access"])["gen"], 0)
+
+    def test_authenticate_token_checks_the_generation(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+        payload, identity = JWTUtils.authenticate_token(tokens["access"])
+        self.assertEqual(identity["id"], self.user.id)
+
+        JWTUtils.revoke_user_tokens(self.user.id)
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "revoked"):
+            JWTUtils.authenticate_token(tokens["access"])
+
+    def test_check_revocation(self):
+        payload = {"jti": "a", "gen": 2}
+
+        check_revocation(payload, False, 2)
+        check_revocation(payload, False, None)
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "revoked"):
+            check_revocation(payload, False, 3)
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "blacklisted"):
+            check_revocation(payload, True, 0)
+
+
+class RefreshRotationTests(JWTFlowTestCase):
+    def setUp(self):
+        super().setUp()
+        # Coalescing would hand a replay inside its window the shared result
+        overrides = self.jwt_settings(REFRESH_COALESCE_WINDOW=timedelta(0))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_rotation_issues_a_new_refresh_token(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+        refreshed = JWTUtils.refresh_access_token(tokens["refresh"], rotate=True)
+
+        self.assertNotEqual(refreshed["refresh"], tokens["refresh"])
+        payload = JWTUtils.decode_token(refreshed["refresh"])
+        self.assertEqual(self.sessions.documents[0]["jti"], payload["jti"])
+        access = JWTUtils.decode_token(refreshed["access"])
+        self.assertEqual(access["user_id"], self.user.id)
+
+        again = JWTUtils.refresh_access_token(refreshed["refresh"], rotate=True)
+        self.assertIn("refresh", again)
+
+    def test_rotated_refresh_token_is_blacklisted(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+        JWTUtils.refresh_access_token(tokens["refresh"], rotate=True)
+
+        self.assertRejected(tokens["refresh"], "blacklisted")
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "blacklisted"):
+            JWTUtils.refresh_access_token(tokens["refresh"], rotate=True)
+
+    def test_replay_is_rejected_by_the_session_claim(self):
+        with self.jwt_settings(
+            REFRESH_COALESCE_WINDOW=timedelta(0), BLACKLIST_AFTER_ROTATION=False
+        ):
+            tokens = JWTUtils.generate_tokens(self.user)
+            refreshed = JWTUtils.refresh_access_token(tokens["refresh"], rotate=True)
+
+            # Still a valid JWT, but no session holds its jti any more
+            JWTUtils.decode_token(tokens["refresh"])
+            for rotate in (True, False):
+                with self.assertRaisesMessage(
+                    jwt.InvalidTokenError, "not found in user's active tokens"
+                ):
+                    JWTUtils.refresh_access_token(tokens["refresh"], rotate=rotate)
+            JWTUtils.refresh_access_token(refreshed["refresh"], rotate=True)
+
+    def test_without_rotation_the_refresh_token_is_reused(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+        jti = self.sessions.documents[0]["jti"]
+
+        for _ in range(2):
+            refreshed = JWTUtils.refresh_access_token(tokens["refresh"], rotate=False)
+            self.assertNotIn("refresh", refreshed)
+        self.assertEqual(self.sessions.documents[0]["jti"], jti)
+
+    def test_access_tokens_cannot_refresh(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "Invalid token type"):
+            JWTUtils.refresh_access_token(tokens["access"])
+
+    def test_session_of_another_user_is_rejected(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+        self.sessions.documents[0]["user_id"] = str(uuid.uuid4())
+
+        with self.assertRaisesMessage(
+            jwt.InvalidTokenError, "not found in user's active tokens"
+        ):
+            JWTUtils.refresh_access_token(tokens["refresh"], rotate=False)
+
+    def test_legacy_refresh_token_is_migrated_once(self):
+        JWTUtils.cache_user(self.user)
+        legacy, payload, _ = JWTUtils._issue_refresh_token(
+            self.user.id, self.user.email, 0, datetime.utcnow(), opaque=False
+        )
+
+        # Pulled from User.refresh_tokens by the first claim only
+        self.users.return_value.update_one.side_effect = [1, 0]
+        with self.jwt_settings(
+            REFRESH_COALESCE_WINDOW=timedelta(0), BLACKLIST_AFTER_ROTATION=False
+        ):
+            refreshed = JWTUtils.refresh_access_token(legacy, rotate=True)
+            with self.assertRaisesMessage(
+                jwt.InvalidTokenError, "not found in user's active tokens"
+            ):
+                JWTUtils.refresh_access_token(legacy, rotate=True)
+
+        self.users.assert_called_with(id=self.user.id, refresh_tokens=payload["jti"])
+        session = self.sessions.documents[0]
+        self.assertEqual(
+            session["jti"], JWTUtils.decode_token(refreshed["refresh"])["jti"]
+        )
+        JWTUtils.refresh_access_token(refreshed["refresh"], rotate=True)
+
+    def test_unknown_refresh_token_is_rejected(self):
+        JWTUtils.cache_user(self.user)
+        stray, _, _ = JWTUtils._issue_refresh_token(
+            self.user.id, self.user.email, 0, datetime.utcnow(), opaque=False
+        )
+
+        with self.assertRaisesMessage(
+            jwt.InvalidTokenError, "not found in user's active tokens"
+        ):
+            JWTUtils.refresh_access_token(stray, rotate=True)
+        self.assertEqual(self.sessions.documents, [])
+
+
+class SessionStoreTests(JWTFlowTestCase):
+    def setUp(self):
+        super().setUp()
+        overrides = self.jwt_settings(
+            REFRESH_COALESCE_WINDOW=timedelta(0), OPAQUE_REFRESH_TOKENS=True
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_opaque_refresh_token_is_stored_by_hash(self):
+        tokens = JWTUtils.generate_tokens(self.user, device_id="phone")
+
+        self.assertNotIn(".", tokens["refresh"])
+        session = self.sessions.documents[0]
+        self.assertEqual(
+            session["token_hash"], JWTUtils._hash_refresh_token(tokens["refresh"])
+        )
+        self.assertEqual(session["device_id"], "phone")
+        self.assertNotIn(tokens["refresh"], session.values())
+
+    def test_opaque_refresh_token_is_looked_up_by_hash(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+
+        refreshed = JWTUtils.refresh_access_token(tokens["refresh"], rotate=False)
+        payload = JWTUtils.decode_token(refreshed["access"])
+        self.assertEqual(payload["user_id"], self.user.id)
+
+    def test_opaque_rotation_replaces_the_hash(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+        refreshed = JWTUtils.refresh_access_token(tokens["refresh"], rotate=True)
+
+        self.assertNotIn(".", refreshed["refresh"])
+        self.assertEqual(
+            self.sessions.documents[0]["token_hash"],
+            JWTUtils._hash_refresh_token(refreshed["refresh"]),
+        )
+        with self.assertRaisesMessage(
+            jwt.InvalidTokenError, "not found in user's active tokens"
+        ):
+            JWTUtils.refresh_access_token(tokens["refresh"], rotate=True)
+        JWTUtils.refresh_access_token(refreshed["refresh"], rotate=True)
+
+    def test_unknown_or_expired_opaque_token_is_rejected(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+
+        for token in ("not-a-session", tokens["refresh"] + "x"):
+            with self.subTest(token=token):
+                with self.assertRaisesMessage(
+                    jwt.InvalidTokenError, "not found in user's active tokens"
+                ):
+                    JWTUtils.refresh_access_token(token, rotate=False)
+
+        self.sessions.documents[0]["expires_at"] = datetime.utcnow()
+        with self.assertRaisesMessage(
+            jwt.InvalidTokenError, "not found in user's active tokens"
+        ):
+            JWTUtils.refresh_access_token(tokens["refresh"], rotate=False)
+
+    def test_logout_ends_only_that_session(self):
+        phone = JWTUtils.generate_tokens(self.user, device_id="phone")
+        laptop = JWTUtils.generate_tokens(self.user, device_id="laptop")
+
+        self.assertTrue(JWTUtils.logout_user(self.user, phone["refresh"]))
+        JWTUtils.cache_user(self.user)
+        self.assertEqual(
+            [session["device_id"] for session in self.sessions.documents],
+            ["laptop"],
+        )
+        with self.assertRaises(jwt.InvalidTokenError):
+            JWTUtils.refresh_access_token(phone["refresh"], rotate=False)
+        JWTUtils.refresh_access_token(laptop["refresh"], rotate=False)
+
+    def test_failed_refresh_leaves_the_session_unclaimed(self):
+        tokens = JWTUtils.generate_tokens(self.user)
+        session = dict(self.sessions.documents[0])
+
+        JWTUtils.cache_user(self.make_user(id=self.user.id, is_active=False))
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "disabled"):
+            JWTUtils.refresh_access_token(tokens["refresh"], rotate=True)
+        self.assertEqual(self.sessions.documents[0], session)
+
+        # Reactivated, the client's refresh token still works
+        JWTUtils.cache_user(self.user)
+        JWTUtils.refresh_access_token(tokens["refresh"], rotate=True)
+
+    def test_device_id_from_field_or_header(self):
+        request = SimpleNamespace(META={"HTTP_X_DEVICE_ID": " tablet "})
+        self.assertEqual(get_device_id(request, {"device_id": "phone"}), "phone")
+        self.assertEqual(get_device_id(request, {}), "tablet")
+        self.assertEqual(get_device_id(SimpleNamespace(META={}), {}), "")
+        self.assertEqual(len(get_device_id(request, {"device_id": "x" * 200})), 100)
+
+
+class SlidingTokenTests(JWTFlowTestCase):
+    def setUp(self):
+        super().setUp()
+        overrides = self.jwt_settings(SLIDING_TOKENS=True)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+    def test_extension_keeps_the_session_ceiling(self):
+        first = JWTUtils.generate_tokens(self.user)["access"]
+        original = JWTUtils.decode_token(first)
+
+        extended = JWTUtils.refresh_sliding_token(first)
+        payload = JWTUtils.decode_token(extended["access"])
+        self.assertEqual(payload["refresh_exp"], original["refresh_exp"])
+        self.assertNotEqual(payload["jti"], original["jti"])
+
+    def test_extended_token_is_spent(self):
+        first = JWTUtils.generate_tokens(self.user)["access"]
+        second = JWTUtils.refresh_sliding_token(first)["access"]
+
+        self.assertRejected(first, "blacklisted")
+        with self.assertRaises(jwt.InvalidTokenError):
+            JWTUtils.refresh_sliding_token(first)
+        JWTUtils.refresh_sliding_token(second)
+
+    def test_concurrent_extensions_yield_one_token(self):
+        first = JWTUtils.generate_tokens(self.user)["access"]
+        payload = JWTUtils.decode_token(first)
+
+        # Another worker extended it between our checks and our claim
+        with mock.patch.object(JWTUtils, "decode_token", return_value=payload):
+            JWTUtils.refresh_sliding_token(first)
+            with self.assertRaisesMessage(
+                jwt.InvalidTokenError, "already been extended"
+            ):
+                JWTUtils.refresh_sliding_token(first)
+
+    def test_logout_rejects_every_token_of_the_chain(self):
+        first = JWTUtils.generate_tokens(self.user)["access"]
+        second = JWTUtils.refresh_sliding_token(first)["access"]
+
+        # What LogoutView does for a single device
+        self.assertTrue(JWTUtils.blacklist_token(second))
+
+        for token in (first, second):
+            self.assertRejected(token, "blacklisted")
+            with self.assertRaises(jwt.InvalidTokenError):
+                JWTUtils.refresh_sliding_token(token)
+
+    def test_ceiling_is_enforced(self):
+        now = datetime.utcnow()
+        payload = JWTUtils._access_payload(
+            self.user.id, self.user.email, self.user.username, 0, now
+        )
+        payload["refresh_exp"] = now - timedelta(seconds=1)
+        token = get_token_codec().encode(payload)
+
+        with self.assertRaisesMessage(jwt.InvalidTokenError, "Sliding session"):
+            JWTUtils.refresh_sliding_token(token)
+
+    def test_only_sliding_access_tokens_extend(self):
+        with self.jwt_settings(SLIDING_TOKENS=False):
+            tokens = JWTUtils.generate_tokens(self.user)
+
+        for token in (tokens["access"], tokens["refresh"]):
+            with self.assertRaisesMessage(jwt.InvalidTokenError, "Not a sliding"):
+                JWTUtils.refresh_sliding_token(token)
+
+
+class RefreshCoalescingTests(JWTFlowTestCase):
+    TOKEN = "header.payload.signature"
+
+    def setUp(self):
+        super().setUp()
+        flight = f"{JWTUtils._hash_refresh_token(self.TOKEN)}:1"
+        self.result_key = f"refresh_result:{flight}"
+        self.lock_key = f"refresh_lock:{flight}"
+
+    def run_in_thread(self, results, name):
+        def refresh():
+            try:
+                results[name] = JWTUtils.refresh_access_token(self.TOKEN, rotate=True)
+            except jwt.InvalidTokenError as e:
+                results[name] = e
+
+        thread = threading.Thread(target=refresh)
+        thread.start()
+        return thread
+
+    def test_follower_receives_the_leaders_result(self):
+        leading, release = threading.Event(), threading.Event()
+        calls = []
+
+        def refresh(token, rotate):
+            calls.append(token)
+            leading.set()
+            release.wait(5)
+            return {"access": "new-access", "refresh": "new-refresh"}
+
+        results = {}
+        with mock.patch.object(JWTUtils, "_refresh_access_token", side_effect=refresh):
+            leader = self.run_in_thread(results, "leader")
+            self.assertTrue(leading.wait(5))
+            follower = self.run_in_thread(results, "follower")
+            # The follower is polling for the result while the lock is held
+            time.sleep(0.1)
+            release.set()
+            leader.join(5)
+            follower.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results["follower"], results["leader"])
+        self.assertIsNone(cache.get(self.lock_key))
+
+    def test_follower_receives_the_leaders_error(self):
+        cache.add(self.lock_key, 1)
+        threading.Timer(
+            0.1, cache.set, (self.result_key, {"error": "Token refresh failed"})
+        ).start()
+
+        with mock.patch.object(JWTUtils, "_refresh_access_token") as refresh:
+            with self.assertRaisesMessage(jwt.InvalidTokenError, "refresh failed"):
+                JWTUtils.refresh_access_token(self.TOKEN, rotate=True)
+        refresh.assert_not_called()
+
+    def test_error_never_hides_a_success(self):
+        success = {"access": "new-access", "refresh": "new-refresh"}
+        first_running, second_failing = threading.Event(), threading.Event()
+        published = threading.Event()
+
+        def refresh(token, rotate):
+            if not first_running.is_set():
+                # The first leader's lock runs out while it is still working
+                first_running.set()
+                cache.delete(self.lock_key)
+                second_failing.wait(5)
+                return success
+            # The second leader loses the session claim, after the first
+            # published its result
+            second_failing.set()
+            published.wait(5)
+            raise jwt.InvalidTokenError("Refresh token not found")
+
+        results = {}
+        with mock.patch.object(JWTUtils, "_refresh_access_token", side_effect=refresh):
+            first = self.run_in_thread(results, "first")
+            self.assertTrue(first_running.wait(5))
+            second = self.run_in_thread(results, "second")
+            first.join(5)
+            published.set()
+            second.join(5)
+
+            self.assertEqual(results["first"], success)
+            self.assertIsInstance(results["second"], jwt.InvalidTokenError)
+            # Anyone arriving now still gets the success
+            self.assertEqual(
+                JWTUtils.refresh_access_token(self.TOKEN, rotate=True), success
+            )
+
+    def test_success_replaces_an_earlier_error(self):
+        success = {"access": "new-access"}
+
+        def refresh(token, rotate):
+            # A second leader fails while this one is still working
+            cache.add(self.result_key, {"error": "Refresh token not found"})
+            return success
+
+        with mock.patch.object(JWTUtils, "_refresh_access_token", side_effect=refresh):
+            self.assertEqual(
+                JWTUtils.refresh_access_token(self.TOKEN, rotate=True), success
+            )
+        self.assertEqual(cache.get(self.result_key), {"result": success})
+
+    def test_result_is_only_shared_for_the_wait(self):
+        with mock.patch.object(
+            JWTUtils, "_refresh_access_token", return_value={"access": "a"}
+        ):
+            JWTUtils.refresh_access_token(self.TOKEN, rotate=True)
+
+        clock = mock.Mock()
+        clock.time.return_value = time.time() + JWTUtils._refresh_wait() + 1
+        with mock.patch("django.core.cache.backends.locmem.time", clock):
+            self.assertIsNone(cache.get(self.result_key))
+
+    def test_coalescing_can_be_disabled(self):
+        with self.jwt_settings(REFRESH_COALESCE_WINDOW=timedelta(0)):
+            with mock.patch.object(
+                JWTUtils, "_refresh_access_token", return_value={"access": "a"}
+            ) as refresh:
+                JWTUtils.refresh_access_token(self.TOKEN, rotate=True)
+                JWTUtils.refresh_access_token(self.TOKEN, rotate=True)
+
+        self.assertEqual(refresh.call_count, 2)
+        self.assertIsNone(cache.get(self.result_key))
+
+
+class PasswordHashingExecutorTests(TestCase):
+    def test_runs_the_function_in_a_slot(self):
+        executor = PasswordHashingExecutor(max_concurrency=2, queue_timeout=1)
+
+        self.assertEqual(executor.run(lambda a, b=0: a + b, 1, b=2), 3)
+        stats = executor.stats()
+        self.assertEqual((stats["completed"], stats["running"]), (1, 0))
+        self.assertEqual(stats["rejected"], 0)
+
+    def test_busy_when_no_slot_frees_up(self):
+        executor = PasswordHashingExecutor(max_concurrency=1, queue_timeout=0.05)
+        holding, release = threading.Event(), threading.Event()
+
+        def hold():
+            holding.set()
+            release.wait(5)
+
+        holder = threading.Thread(target=executor.run, args=(hold,))
+        holder.start()
+        self.assertTrue(holding.wait(5))
+        try:
+            self.assertEqual(executor.stats()["running"], 1)
+            with self.assertRaises(PasswordHashingBusy):
+                executor.run(lambda: None)
+        finally:
+            release.set()
+            holder.join(5)
+
+        stats = executor.stats()
+        self.assertEqual((stats["completed"], stats["rejected"]), (1, 1))
+        self.assertEqual((stats["running"], stats["waiting"]), (0, 0))
+        # The slot is free again
+        self.assertEqual(executor.run(lambda: "ok"), "ok")
+
+    def test_waiters_get_the_slot_when_it_frees(self):
+        executor = PasswordHashingExecutor(max_concurrency=1, queue_timeout=5)
+        holding, release = threading.Event(), threading.Event()
+
+        def hold():
+            holding.set()
+            release.wait(5)
+
+        holder = threading.Thread(target=executor.run, args=(hold,))
+        holder.start()
+        self.assertTrue(holding.wait(5))
+        threading.Timer(0.1, release.set).start()
+
+        self.assertEqual(executor.run(lambda: "ok"), "ok")
+        holder.join(5)
+        stats = executor.stats()
+        self.assertEqual((stats["completed"], stats["rejected"]), (2, 0))
+        self.assertGreater(stats["queue_time_max"], 0.05)
+        self.assertLessEqual(stats["queue_time_avg"], stats["queue_time_max"])
+
+    def test_errors_release_the_slot(self):
+        executor = PasswordHashingExecutor(max_concurrency=1, queue_timeout=0.05)
+
+        with self.assertRaises(ZeroDivisionError):
+            executor.run(lambda: 1 / 0)
+        self.assertEqual(executor.run(lambda: "ok"), "ok")
+        self.assertEqual(executor.stats()["completed"], 2)
+
+    def test_arun(self):
+        executor = PasswordHashingExecutor(max_concurrency=1, queue_timeout=1)
+
+        result = asyncio.run(executor.arun(lambda a: a * 2, 21))
+        self.assertEqual(result, 42)
+        self.assertEqual(executor.stats()["completed"], 1)
+
+
+class CalibratedHasherTests(TestCase):
+    def calibrate(self, params):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "password_hasher.json")
+        with open(path, "w", encoding="utf-8") as fh:
+            json.dump({"preferred": "pbkdf2_sha256", "params": params}, fh)
+        patcher = mock.patch("accounts.hashers.calibration", Calibration(path))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def stored(self, iterations):
+        return f"pbkdf2_sha256${iterations}${'a' * 22}$hash"
+
+    def test_costs_never_drop_below_django_defaults(self):
+        self.calibrate(
+            {
+                "pbkdf2_sha256": {"iterations": 1000},
+                "bcrypt_sha256": {"rounds": 4},
+                "argon2": {"time_cost": 1, "memory_cost": 8},
+            }
+        )
+        pbkdf2 = CalibratedPBKDF2PasswordHasher()
+
+        self.assertEqual(pbkdf2.iterations, PBKDF2PasswordHasher.iterations)
+        self.assertEqual(
+            CalibratedBCryptSHA256PasswordHasher().rounds,
+            BCryptSHA256PasswordHasher.rounds,
+        )
+        argon2 = CalibratedArgon2PasswordHasher()
+        self.assertEqual(argon2.time_cost, Argon2PasswordHasher.time_cost)
+        self.assertEqual(argon2.memory_cost, Argon2PasswordHasher.memory_cost)
+        # A hash at Django's cost is never re-hashed downwards
+        self.assertFalse(pbkdf2.must_update(self.stored(pbkdf2.iterations)))
+
+    def test_higher_costs_are_applied(self):
+        iterations = PBKDF2PasswordHasher.iterations * 2
+        self.calibrate({"pbkdf2_sha256": {"iterations": iterations}})
+        pbkdf2 = CalibratedPBKDF2PasswordHasher()
+
+        self.assertEqual(pbkdf2.iterations, iterations)
+        self.assertTrue(
+            pbkdf2.must_update(self.stored(PBKDF2PasswordHasher.iterations))
+        )
+
+
+class ThrottleTests(TestCase):
+    RATES = {
+        "login": {"ip": "20/m", "email": "5/15m", "user": "10/h", "global": "500/s"}
+    }
+
+    def request(self, data=None, user=None):
+        return SimpleNamespace(
+            data=data if data is not None else {},
+            user=user or SimpleNamespace(is_authenticated=False),
+            META={"REMOTE_ADDR": "203.0.113.7"},
+        )
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("5/s"), (5, 1))
+        self.assertEqual(parse_rate("5/m"), (5, 60))
+        self.assertEqual(parse_rate("100/15m"), (100, 900))
+        self.assertEqual(parse_rate("1000/2h"), (1000, 7200))
+        self.assertEqual(parse_rate("3/d"), (3, 86400))
+        for rate in ("5/w", "five/m", "5"):
+            with self.subTest(rate=rate):
+                with self.assertRaises((KeyError, ValueError, IndexError)):
+                    parse_rate(rate)
+
+    @override_settings(AUTH_THROTTLES=RATES)
+    def test_limits_per_dimension(self):
+        user = SimpleNamespace(is_authenticated=True, id="u1")
+        request = self.request({"email": " Ada@Example.com "}, user)
+
+        limits = LoginThrottle().get_limits(request)
+        windows = {key.split(":")[1]: (limit, window) for key, limit, window in limits}
+        self.assertEqual(
+            windows,
+            {"ip": (20, 60), "email": (5, 900), "user": (10, 3600), "global": (500, 1)},
+        )
+
+        keys = [key for key, _, _ in limits]
+        self.assertIn("login:ip:203.0.113.7", keys)
+        self.assertIn("login:user:u1", keys)
+        self.assertIn("login:global:all", keys)
+        # Emails are hashed after trimming and lower-casing
+        self.assertFalse(any("example.com" in key for key in keys))
+        same = self.request({"email": "ada@example.com"}, user)
+        self.assertEqual(LoginThrottle().get_limits(same), limits)
+
+    @override_settings(AUTH_THROTTLES=RATES)
+    def test_dimensions_without_a_value_are_skipped(self):
+        # No email in the body, and an anonymous user
+        for data in ({}, {"email": "  "}, {"email": ["a@example.com"]}, "raw"):
+            with self.subTest(data=data):
+                limits = LoginThrottle().get_limits(self.request(data))
+                dimensions = sorted(key.split(":")[1] for key, _, _ in limits)
+                self.assertEqual(dimensions, ["global", "ip"])
+
+    @override_settings(AUTH_THROTTLES={"login": {"country": "5/m"}})
+    def test_unknown_dimension(self):
+        with self.assertRaises(ValueError):
+            LoginThrottle().get_limits(self.request())
+
+    @override_settings(AUTH_THROTTLES={})
+    def test_unconfigured_scope_has_no_limits(self):
+        self.assertEqual(LoginThrottle().get_limits(self.request()), [])
+
+    @override_settings(AUTH_THROTTLES=RATES)
+    def test_allow_request(self):
+        throttle = LoginThrottle()
+        with mock.patch("accounts.throttling.limiter") as limiter:
+            limiter.hit.return_value = 0.0
+            self.assertTrue(throttle.allow_request(self.request(), None))
+
+            limiter.hit.return_value = 12.5
+            self.assertFalse(throttle.allow_request(self.request(), None))
+            self.assertEqual(throttle.wait(), 12.5)
+
+            # Redis down: fail open
+            limiter.hit.side_effect = ConnectionError("refused")
+            self.assertTrue(throttle.allow_request(self.request(), None))
+
+
+class AutoCreateIndexTests(TestCase):
+    def setUp(self):
+        saved = {document: dict(document._meta) for document in managed_documents()}
+
+        def restore():
+            for document, meta in saved.items():
+                document._meta.clear()
+                document._meta.update(meta)
+
+        self.addCleanup(restore)
+
+    def flags(self):
+        return {
+            (
+                document._meta.get("auto_create_index"),
+                bool(document._meta.get("auto_create_index_on_save")),
+            )
+            for document in managed_documents()
+        }
+
+    def test_switch_never_turns_on_index_checks_on_save(self):
+        set_auto_create_index(True)
+        self.assertEqual(self.flags(), {(True, False)})
+
+        set_auto_create_index(False)
+        self.assertEqual(self.flags(), {(False, False)})
+
+    def test_covers_every_collection(self):
+        names = [document._get_collection_name() for document in managed_documents()]
+        self.assertEqual(
+            names,
+            ["categories", "comments", "posts", "sessions", "user_activities", "users"],
+        )
@@ -0,0 +1,196 @@
+import hashlib
+import logging
+import time
+import uuid
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from rest_framework.throttling import BaseThrottle
+
+logger = logging.getLogger("accounts")
+
+# Sliding-window log over sorted sets, one per limit. Every window is
+# checked before any is recorded, so a rejected attempt uses up nothing and
+# the limits never disagree. Returns 0 if allowed, else the milliseconds
+# until the fullest window frees a slot.
+#
+# KEYS: one sorted set per limit
+# ARGV: now_ms, member, then (limit, window_ms) for each key
+SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local retry = 0
+for i, key in ipairs(KEYS) do
+    local limit = tonumber(ARGV[1 + 2 * i])
+    local window = tonumber(ARGV[2 + 2 * i])
+    redis.call('ZREMRANGEBYSCORE', key, '-inf', now - window)
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        local wait = window
+        if oldest[2] then
+            wait = tonumber(oldest[2]) + window - now
+        end
+        if wait > retry then
+            retry = wait
+        end
+    end
+end
+if retry > 0 then
+    return retry
+end
+for i, key in ipairs(KEYS) do
+    redis.call('ZADD', key, now, ARGV[2])
+    redis.call('PEXPIRE', key, ARGV[2 + 2 * i])
+end
+return 0
+"""
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """
+    Parse a rate such as "5/m" or "100/15m".
+
+    Returns:
+        tuple: (limit, window in seconds)
+    """
+    count, _, period = rate.partition("/")
+    multiplier = int(period[:-1] or 1)
+    return int(count), multiplier * PERIODS[period[-1]]
+
+
+class SlidingWindowLimiter:
+    """
+    Atomic sliding-window rate limiter in Redis.
+
+    ``hit`` checks and records one attempt against several limits (per IP,
+    per email, global, ...) in a single EVALSHA round trip.
+    """
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+        self._script = None
+
+    @property
+    def script(self):
+        if self._script is None:
+            client = get_redis_connection(self.alias)
+            self._script = client.register_script(SLIDING_WINDOW_SCRIPT)
+        return self._script
+
+    def hit(self, limits, now=None):
+        """
+        Record one attempt unless it would exceed a limit.
+
+        Args:
+            limits: list of (key, limit, window seconds)
+            now: Current time in seconds (defaults to time.time())
+
+        Returns:
+            float: 0 if allowed, else seconds until a retry can succeed
+        """
+        if not limits:
+            return 0.0
+        now_ms = int((now if now is not None else time.time()) * 1000)
+
+        keys = []
+        args = [now_ms, f"{now_ms}-{uuid.uuid4().hex[:8]}"]
+        for key, limit, window in limits:
+            keys.append(cache.make_key(f"throttle:{key}"))
+            args.extend((limit, int(window * 1000)))
+
+        retry_ms = self.script(keys=keys, args=args)
+        return int(retry_ms) / 1000.0
+
+
+limiter = SlidingWindowLimiter()
+
+
+class SlidingWindowThrottle(BaseThrottle):
+    """
+    DRF throttle backed by ``SlidingWindowLimiter``.
+
+    Limits come from ``AUTH_THROTTLES[scope]``, a mapping of dimension to
+    rate::
+
+        {"ip": "20/m", "email": "5/m", "global": "500/s"}
+
+    Dimensions are ``ip``, ``email`` (from the request body), ``user``
+    (authenticated user id) and ``global``; a dimension the request has no
+    value for is skipped. DRF checks throttles before the view runs, so a
+    rejected attempt never reaches MongoDB or the password hasher.
+
+    If Redis is unavailable the request is allowed and a warning logged.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    def get_limits(self, request):
+        rates = getattr(settings, "AUTH_THROTTLES", {}).get(self.scope, {})
+        limits = []
+        for dimension, rate in rates.items():
+            value = self.get_value(request, dimension)
+            if value is None:
+                continue
+            limit, window = parse_rate(rate)
+            limits.append((f"{self.scope}:{dimension}:{value}", limit, window))
+        return limits
+
+    def get_value(self, request, dimension):
+        if dimension == "global":
+            return "all"
+        if dimension == "ip":
+            return self.get_ident(request)
+        if dimension == "user":
+            user = getattr(request, "user", None)
+            if user is None or not user.is_authenticated:
+                return None
+            return str(user.id)
+        if dimension == "email":
+            try:
+                email = request.data.get("email")
+            except AttributeError:
+                return None
+            if not isinstance(email, str) or not email.strip():
+                return None
+            # Hashed so attacker-chosen strings never become Redis keys as-is
+            return hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+        raise ValueError(f"Unknown throttle dimension {dimension!r}")
+
+    def allow_request(self, request, view):
+        limits = self.get_limits(request)
+        try:
+            self.wait_seconds = limiter.hit(limits)
+        except Exception as e:
+            logger.warning(f"Throttle check for {self.scope} failed, allowing: {e}")
+            return True
+
+        if self.wait_seconds:
+            logger.warning(
+                f"Throttled {self.scope} from {self.get_ident(request)} "
+                f"for {self.wait_seconds:.1f}s"
+            )
+            return False
+        return True
+
+    def wait(self):
+        return self.wait_seconds
+
+
+class LoginThrottle(SlidingWindowThrottle):
+    scope = "login"
+
+
+class RegisterThrottle(SlidingWindowThrottle):
+    scope = "register"
+
+
+class RefreshThrottle(SlidingWindowThrottle):
+    scope = "refresh"
+
+
+class LikeThrottle(SlidingWindowThrottle):
+    scope = "like"
@@ -0,0 +1,125 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenCache:
+    """
+    Bounded per-process LRU of verified token payloads.
+
+    Entries are keyed by a SHA-256 digest of the raw token so the token
+    itself never sits in memory as a dict key, and each entry is kept only
+    until the token's own ``exp``. A secondary jti index lets a blacklisted
+    token be dropped without knowing its raw value.
+    """
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # digest -> (payload, expires_at, jti)
+        self._jti_index = {}  # jti -> digest
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(token):
+        """Return the cache key for a raw token string."""
+        if isinstance(token, str):
+            token = token.encode("utf-8")
+        return hashlib.sha256(token).digest()
+
+    def get(self, token):
+        """
+        Return a copy of the cached payload for a token, or None.
+
+        Args:
+            token: Raw JWT string
+
+        Returns:
+            dict: Payload if cached and not yet expired, otherwise None
+        """
+        key = self.digest(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            payload, expires_at, _ = entry
+            if expires_at <= now:
+                self._discard(key)
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+        # Callers are free to mutate what they get back
+        return dict(payload)
+
+    def set(self, token, payload, expires_at=None):
+        """
+        Store a verified payload until ``expires_at`` (defaults to ``exp``).
+
+        Args:
+            token: Raw JWT string
+            payload: Decoded and verified payload
+            expires_at: Unix timestamp after which the entry is stale
+        """
+        if self.max_size <= 0:
+            return
+
+        if expires_at is None:
+            expires_at = payload.get("exp")
+        if not expires_at or expires_at <= time.time():
+            return
+
+        key = self.digest(token)
+        jti = payload.get("jti")
+
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._entries[key] = (dict(payload), expires_at, jti)
+            if jti:
+                self._jti_index[jti] = key
+
+            while len(self._entries) > self.max_size:
+                _, (_, _, oldest_jti) = self._entries.popitem(last=False)
+                self._jti_index.pop(oldest_jti, None)
+
+    def invalidate_jti(self, jti):
+        """Drop the cached entry for a token id, if present."""
+        with self._lock:
+            key = self._jti_index.pop(jti, None)
+            if key is not None:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._jti_index.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits / total) if total else 0.0,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    def _discard(self, key):
+        """Remove an entry and its jti index; caller must hold the lock."""
+        entry = self._entries.pop(key, None)
+        if entry is not None and entry[2]:
+            self._jti_index.pop(entry[2], None)
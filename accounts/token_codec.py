@@ -0,0 +1,154 @@
+import base64
+import binascii
+import json
+from calendar import timegm
+from datetime import datetime
+import jwt
+
+# Claim profiles map our canonical claim names to the names put on the wire.
+# Decoding always expands every known wire name, so tokens minted under
+# either profile stay readable when the profile is switched.
+FULL_CLAIMS = {}
+
+COMPACT_CLAIMS = {
+    "user_id": "sub",
+    "token_type": "tt",
+    "email": "em",
+    "username": "un",
+    "refresh_exp": "rx",
+}
+
+CLAIM_PROFILES = {"full": FULL_CLAIMS, "compact": COMPACT_CLAIMS}
+
+# Claims only carried for convenience; nothing server-side depends on them
+USER_CLAIMS = ("email", "username")
+
+_EXPANDED = {wire: name for name, wire in COMPACT_CLAIMS.items()}
+
+_dumps = json.JSONEncoder(separators=(",", ":")).encode
+
+
+def b64encode(data):
+    """Unpadded base64url, as used by JWS."""
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def b64decode(data):
+    """Decode unpadded base64url."""
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+class TokenCodec:
+    """
+    Compact JWS encoder/decoder for the tokens we mint.
+
+    The header segment of every key in the ring is encoded once, so minting
+    only serialises the claims, and a token whose header matches one of
+    those segments byte-for-byte is verified without parsing its header.
+    Datetimes become integer timestamps and claim names follow the
+    configured profile; decoded payloads always use the canonical names.
+
+    Tokens are standard JWTs: anything PyJWT can verify against the ring's
+    keys (including tokens minted by older releases) decodes here too.
+    """
+
+    def __init__(self, key_ring, profile="full", include_user_claims=True):
+        if profile not in CLAIM_PROFILES:
+            raise ValueError(f"Unknown claim profile {profile!r}")
+
+        self.key_ring = key_ring
+        self.claim_names = CLAIM_PROFILES[profile]
+        self.include_user_claims = include_user_claims
+
+        self._headers = {}  # kid -> encoded header segment
+        self._header_keys = {}  # encoded header segment -> SigningKey
+        for key in key_ring.keys.values():
+            # Same bytes PyJWT produces (sorted keys, no whitespace)
+            header = {"alg": key.algorithm, "kid": key.kid, "typ": "JWT"}
+            segment = b64encode(_dumps(header).encode("utf-8"))
+            self._headers[key.kid] = segment
+            self._header_keys[segment] = key
+
+    def encode(self, payload):
+        """
+        Sign a payload with the ring's current key.
+
+        Args:
+            payload: Claims using canonical names; datetimes are allowed
+
+        Returns:
+            str: Compact JWS
+        """
+        claims = {}
+        names = self.claim_names
+        for name, value in payload.items():
+            if value is None:
+                continue
+            if not self.include_user_claims and name in USER_CLAIMS:
+                continue
+            if isinstance(value, datetime):
+                value = timegm(value.utctimetuple())
+            claims[names.get(name, name)] = value
+
+        key = self.key_ring.current
+        payload_segment = b64encode(_dumps(claims).encode("utf-8"))
+        signing_input = self._headers[key.kid] + b"." + payload_segment
+        signature = b64encode(key.sign(signing_input))
+        return (signing_input + b"." + signature).decode("ascii")
+
+    def decode(self, token):
+        """
+        Verify a token's signature and return its claims.
+
+        Expiry is not checked here; callers compare ``exp`` themselves.
+
+        Raises:
+            jwt.InvalidTokenError: If the token is malformed or the
+                signature does not verify
+        """
+        if isinstance(token, str):
+            token = token.encode("utf-8")
+
+        try:
+            signing_input, signature = token.rsplit(b".", 1)
+            header_segment, payload_segment = signing_input.split(b".", 1)
+            signature = b64decode(signature)
+        except (ValueError, binascii.Error):
+            raise jwt.DecodeError("Not enough segments")
+
+        key = self._header_keys.get(header_segment)
+        if key is None:
+            key = self._key_for_header(header_segment)
+        elif key.not_after is not None and key.is_expired():
+            raise jwt.InvalidTokenError("Signing key has expired")
+
+        if not key.verify(signing_input, signature):
+            raise jwt.InvalidSignatureError("Signature verification failed")
+
+        try:
+            claims = json.loads(b64decode(payload_segment))
+        except (ValueError, binascii.Error):
+            raise jwt.DecodeError("Invalid payload padding")
+        if not isinstance(claims, dict):
+            raise jwt.DecodeError("Invalid payload string: must be a json object")
+
+        exp = claims.get("exp")
+        if exp is not None and not isinstance(exp, (int, float)):
+            raise jwt.DecodeError("Expiration Time claim (exp) must be an integer.")
+
+        return {_EXPANDED.get(name, name): value for name, value in claims.items()}
+
+    def _key_for_header(self, header_segment):
+        """Resolve the key for a header we didn't mint ourselves."""
+        try:
+            header = json.loads(b64decode(header_segment))
+        except (ValueError, binascii.Error):
+            raise jwt.DecodeError("Invalid header padding")
+        if not isinstance(header, dict):
+            raise jwt.DecodeError("Invalid header string: must be a json object")
+
+        key = self.key_ring.get(header.get("kid"))
+        # Only the key's own algorithm is accepted (no alg confusion)
+        if header.get("alg") != key.algorithm:
+            raise jwt.InvalidAlgorithmError("The specified alg value is not allowed")
+        return key
@@ -3,10 +3,13 @@ from .views import (
     UserRegistrationView,
     UserLoginView,
     TokenRefreshView,
+    SlidingTokenRefreshView,
+    TokenIntrospectionView,
     UserProfileView,
     ChangePasswordView,
     LogoutView,
     auth_status,
+    jwks,
 )
 
 urlpatterns = [  # Authentication endpoints
@@ -15,6 +18,13 @@ urlpatterns = [  # Authentication endpoints
     path("logout/", LogoutView.as_view(), name="user-logout"),
     # Token management
     path("token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
+    path(
+        "token/refresh-sliding/",
+        SlidingTokenRefreshView.as_view(),
+        name="token-refresh-sliding",
+    ),
+    path("introspect/", TokenIntrospectionView.as_view(), name="token-introspect"),
+    path("jwks/", jwks, name="jwks"),
     # User profile
     path("profile/", UserProfileView.as_view(), name="user-profile"),
     path("change-password/", ChangePasswordView.as_view(), name="change-password"),
@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from .broadcast import broadcast
+
+USER_CHANNEL = "user:invalidate"
+
+
+def is_missing(identity):
+    """True for the negative entry cached for users that don't exist."""
+    return identity.get("missing", False)
+
+
+class UserCache:
+    """
+    Two-tier cache of user identities for the authentication hot path.
+
+    L1 is a per-worker TTL + LRU dict; L2 is the shared ``user:<id>`` key
+    in Redis with a short timeout. ``invalidate`` deletes the L2 entry and
+    publishes the user id, and every worker drops its L1 copy on receipt.
+
+    L1 is only consulted while this worker's pub/sub subscription is live:
+    it is emptied whenever the subscription (re)connects and bypassed after
+    it drops, so a missed invalidation can never be served from memory.
+    """
+
+    def __init__(self, max_size=10000, local_ttl=30, timeout=300):
+        self.max_size = max_size
+        self.local_ttl = local_ttl
+        self.timeout = timeout
+        self._entries = OrderedDict()  # user_id -> (identity, expires_at)
+        self._lock = threading.Lock()
+        # Bumped by every invalidation; a value read from L2 before an
+        # invalidation arrived must not be stored in L1 after it
+        self._version = 0
+        self._live = False
+
+    @staticmethod
+    def key(user_id):
+        """Cache key of a user's identity in L2."""
+        return f"user:{user_id}"
+
+    @property
+    def local_enabled(self):
+        return self._live and self.max_size > 0
+
+    def get_local(self, user_id):
+        """
+        Return the L1 identity for a user, if any.
+
+        Returns:
+            tuple: (identity or None, version to pass to ``remember``)
+        """
+        with self._lock:
+            version = self._version
+            if not self.local_enabled:
+                return None, version
+
+            entry = self._entries.get(user_id)
+            if entry is None:
+                return None, version
+            identity, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[user_id]
+                return None, version
+            self._entries.move_to_end(user_id)
+            return identity, version
+
+    def remember(self, user_id, identity, version):
+        """
+        Store an identity fetched from L2 or MongoDB in L1.
+
+        Args:
+            user_id: User id
+            identity: Identity dict
+            version: Value returned by ``get_local`` before the fetch
+        """
+        with self._lock:
+            if not self.local_enabled or version != self._version:
+                return
+            self._entries[user_id] = (identity, time.monotonic() + self.local_ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def get(self, user_id):
+        """Return a user's identity from L1 or L2, or None on a miss."""
+        identity, version = self.get_local(user_id)
+        if identity is None:
+            identity = cache.get(self.key(user_id))
+            if identity is not None:
+                self.remember(user_id, identity, version)
+        return identity
+
+    def set(self, user_id, identity, timeout=None):
+        """Store a freshly loaded identity in both tiers."""
+        _, version = self.get_local(user_id)
+        cache.set(self.key(user_id), identity, timeout=timeout or self.timeout)
+        self.remember(user_id, identity, version)
+
+    def invalidate(self, user_id):
+        """Drop a user's identity from L2 and from every worker's L1."""
+        cache.delete(self.key(user_id))
+        self.discard(user_id)
+        broadcast.publish(USER_CHANNEL, str(user_id))
+
+    def discard(self, user_id):
+        """Drop a user's identity from this worker's L1."""
+        with self._lock:
+            self._version += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Drop every L1 entry."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def resume(self):
+        """Enable L1 once the subscription is live (it starts empty)."""
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+            self._live = True
+
+    def suspend(self):
+        """Empty and bypass L1 while invalidations cannot be received."""
+        with self._lock:
+            self._live = False
+            self._version += 1
+            self._entries.clear()
+
+
+user_cache = UserCache(
+    max_size=settings.JWT_SETTINGS.get("USER_CACHE_LOCAL_SIZE", 10000),
+    local_ttl=settings.JWT_SETTINGS.get("USER_CACHE_LOCAL_TTL", 30),
+    timeout=settings.JWT_SETTINGS.get("USER_CACHE_TIMEOUT", 300),
+)
+
+broadcast.subscribe(
+    USER_CHANNEL,
+    user_cache.discard,
+    on_connect=user_cache.resume,
+    on_disconnect=user_cache.suspend,
+)
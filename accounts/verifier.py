@@ -0,0 +1,259 @@
+"""
+Django-free access token verification.
+
+Sidecars, gateways and background workers that only need to check our
+tokens can use ``TokenVerifier`` without importing Django, the MongoEngine
+models or the project settings; it needs PyJWT and, for revocation checks,
+a redis-py client. ``JWTUtils`` is built on the same class, so both apply
+identical signature, expiry, blacklist and generation rules.
+
+Example:
+
+    verifier = TokenVerifier.from_env()
+    payload = verifier.verify(token)
+"""
+
+import os
+import time
+import jwt
+from .keys import KeyRing, KeyRingFile, UnknownKeyError
+from .token_cache import TokenCache
+from .token_codec import TokenCodec
+
+# django-redis stores keys as "<KEY_PREFIX>:<VERSION>:<key>"
+DEFAULT_KEY_PREFIX = ""
+DEFAULT_KEY_VERSION = 1
+
+
+def check_expiry(payload, grace_seconds=0, allow_grace_period=False, now=None):
+    """
+    Enforce ``exp`` on an already verified payload.
+
+    Tokens accepted inside the grace period get ``_grace_period`` set.
+
+    Raises:
+        jwt.ExpiredSignatureError: If expired (beyond the grace period)
+    """
+    exp = payload.get("exp")
+    if exp is None:
+        return
+
+    overdue = (time.time() if now is None else now) - exp
+    if overdue < 0:
+        return
+
+    if allow_grace_period and overdue <= grace_seconds:
+        payload["_grace_period"] = True
+        return
+
+    raise jwt.ExpiredSignatureError("Signature has expired")
+
+
+def check_revocation(payload, blacklisted, generation):
+    """
+    Reject blacklisted tokens and tokens older than the user's generation.
+
+    Args:
+        payload: Verified token payload
+        blacklisted: Whether a ``blacklist:<jti>`` entry exists
+        generation: Current ``token_gen:<user_id>`` value (0 if unset)
+
+    Raises:
+        jwt.InvalidTokenError: If the token has been revoked
+    """
+    if blacklisted:
+        raise jwt.InvalidTokenError("Token is blacklisted")
+
+    if payload.get("gen", 0) < int(generation or 0):
+        raise jwt.InvalidTokenError("Token has been revoked")
+
+
+class TokenVerifier:
+    """
+    Verifies tokens against a key ring, with a per-process payload cache.
+
+    With a ``KeyRingFile`` the ring follows rotations written to the file;
+    keys whose ``not_after`` has passed are dropped either way, and every
+    ring change clears the payload cache so no payload verified under a
+    retired key outlives it.
+
+    Revocation is only checked when a Redis client is given. The client
+    must point at the database the Django cache uses, and ``key_prefix``
+    and ``key_version`` must match its KEY_PREFIX and VERSION.
+    """
+
+    def __init__(
+        self,
+        key_ring=None,
+        key_ring_file=None,
+        redis=None,
+        key_prefix=DEFAULT_KEY_PREFIX,
+        key_version=DEFAULT_KEY_VERSION,
+        grace_seconds=0,
+        claim_profile="full",
+        include_user_claims=True,
+        cache_size=10000,
+    ):
+        if key_ring is None and key_ring_file is None:
+            raise ValueError("A key ring or key ring file is required")
+
+        self.key_ring_file = key_ring_file
+        self.redis = redis
+        self.key_prefix = key_prefix
+        self.key_version = key_version
+        self.grace_seconds = grace_seconds
+        self.claim_profile = claim_profile
+        self.include_user_claims = include_user_claims
+        self.token_cache = TokenCache(max_size=cache_size)
+
+        self.key_ring = key_ring_file.ring if key_ring_file is not None else key_ring
+        self._source_ring = self.key_ring
+        self._codec = self._build_codec(self.key_ring)
+
+    def _build_codec(self, ring):
+        return TokenCodec(
+            ring,
+            profile=self.claim_profile,
+            include_user_claims=self.include_user_claims,
+        )
+
+    def codec(self, force_reload=False):
+        """
+        Return the codec for the live key ring.
+
+        Args:
+            force_reload: Check the key ring file now rather than on its
+                interval
+        """
+        ring = self.key_ring
+        if self.key_ring_file is not None:
+            loaded = self.key_ring_file.refresh(force=force_reload)
+            if loaded is not self._source_ring:
+                self._source_ring = ring = loaded
+        if ring.next_expiry is not None and time.time() >= ring.next_expiry:
+            ring = ring.prune()
+
+        if ring is not self.key_ring:
+            self.key_ring, self._codec = ring, self._build_codec(ring)
+            self.token_cache.clear()
+        return self._codec
+
+    def verify_signature(self, token):
+        """
+        Verify a token's signature and return its payload (expiry unchecked).
+
+        Repeat calls with the same token are served from the payload cache.
+        """
+        # Resolved first: a key rotation clears the payload cache
+        codec = self.codec()
+
+        # Repeat requests with the same token skip signature and JSON work
+        payload = self.token_cache.get(token)
+        if payload is not None:
+            return payload
+
+        try:
+            payload = codec.decode(token)
+        except UnknownKeyError:
+            if self.key_ring_file is None:
+                raise
+            # Another process may already be signing with a key this one
+            # has not loaded yet
+            payload = self.codec(force_reload=True).decode(token)
+
+        exp = payload.get("exp")
+        if exp:
+            self.token_cache.set(token, payload, expires_at=exp + self.grace_seconds)
+        return payload
+
+    def check_expiry(self, payload, allow_grace_period=False):
+        """``check_expiry`` with this verifier's grace period."""
+        check_expiry(payload, self.grace_seconds, allow_grace_period)
+
+    def verify(self, token, verify_exp=True, allow_grace_period=False):
+        """
+        Verify a token the way ``JWTUtils.decode_token`` does.
+
+        Args:
+            token: JWT token string
+            verify_exp: Whether to verify token expiration
+            allow_grace_period: Accept tokens that expired less than the
+                grace period ago (``_grace_period`` is set on the payload)
+
+        Returns:
+            dict: Token payload if valid
+
+        Raises:
+            jwt.ExpiredSignatureError: If the token has expired
+            jwt.InvalidTokenError: If token is invalid or revoked
+        """
+        payload = self.verify_signature(token)
+
+        if verify_exp:
+            self.check_expiry(payload, allow_grace_period)
+
+        if self.redis is not None:
+            jti = payload.get("jti")
+            user_id = payload.get("user_id")
+            # One round trip; a missing claim reads a key that never exists
+            blacklisted, generation = self.redis.mget(
+                [
+                    self.make_key(f"blacklist:{jti}"),
+                    self.make_key(f"token_gen:{user_id}"),
+                ]
+            )
+            check_revocation(
+                payload,
+                bool(jti) and blacklisted is not None,
+                generation if user_id else 0,
+            )
+
+        return payload
+
+    def make_key(self, key):
+        """Build the raw Redis key django-redis uses for a cache key."""
+        return f"{self.key_prefix}:{self.key_version}:{key}"
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """
+        Build a verifier from environment variables.
+
+        ``JWT_KEY_RING_FILE`` (a rotating key ring file) or
+        ``JWT_SIGNING_KEY`` with ``JWT_ALGORITHM`` (default HS256) select the
+        keys; ``REDIS_URL`` enables revocation checks. ``JWT_GRACE_SECONDS``,
+        ``JWT_CLAIM_PROFILE``, ``CACHE_KEY_PREFIX`` and ``CACHE_VERSION`` match
+        the corresponding Django settings.
+        """
+        environ = os.environ if environ is None else environ
+
+        key_ring = key_ring_file = None
+        if environ.get("JWT_KEY_RING_FILE"):
+            key_ring_file = KeyRingFile(
+                environ["JWT_KEY_RING_FILE"],
+                check_interval=float(environ.get("JWT_KEY_RING_CHECK_INTERVAL", 5)),
+            )
+        else:
+            key_ring = KeyRing.from_settings(
+                {
+                    "SIGNING_KEY": environ["JWT_SIGNING_KEY"],
+                    "ALGORITHM": environ.get("JWT_ALGORITHM", "HS256"),
+                }
+            )
+
+        redis = None
+        if environ.get("REDIS_URL"):
+            # Only imported when revocation checks are wanted
+            import redis as redis_py
+
+            redis = redis_py.Redis.from_url(environ["REDIS_URL"])
+
+        return cls(
+            key_ring=key_ring,
+            key_ring_file=key_ring_file,
+            redis=redis,
+            key_prefix=environ.get("CACHE_KEY_PREFIX", DEFAULT_KEY_PREFIX),
+            key_version=int(environ.get("CACHE_VERSION", DEFAULT_KEY_VERSION)),
+            grace_seconds=float(environ.get("JWT_GRACE_SECONDS", 0)),
+            claim_profile=environ.get("JWT_CLAIM_PROFILE", "full"),
+        )
@@ -1,7 +1,12 @@
 from rest_framework import status, permissions
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.decorators import api_view, permission_classes
+from rest_framework.decorators import (
+    api_view,
+    permission_classes,
+    authentication_classes,
+)
+from django.conf import settings
 from django.utils import timezone
 from datetime import datetime
 import jwt
@@ -13,14 +18,33 @@ from .serializers import (
     UserUpdateSerializer,
     ChangePasswordSerializer,
     RefreshTokenSerializer,
+    SlidingTokenRefreshSerializer,
+    TokenIntrospectionSerializer,
     LogoutSerializer,
 )
+from .hashing import PasswordHashingBusy
 from .jwt_utils import JWTUtils
+from .last_login import record_login
+from .permissions import HasIntrospectionKey
+from .throttling import LoginThrottle, RefreshThrottle, RegisterThrottle
 import logging
 
 logger = logging.getLogger("accounts")
 
 
+def get_device_id(request, validated_data):
+    """
+    Client device id for the refresh session.
+
+    Taken from the ``device_id`` field, else the ``X-Device-Id`` header;
+    empty if the client sent neither.
+    """
+    device_id = validated_data.get("device_id") or request.META.get(
+        "HTTP_X_DEVICE_ID", ""
+    )
+    return device_id.strip()[:100]
+
+
 class UserRegistrationView(APIView):
     """
     User registration endpoint.
@@ -28,16 +52,18 @@ class UserRegistrationView(APIView):
     """
 
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RegisterThrottle]
 
     def post(self, request):
         serializer = UserRegistrationSerializer(data=request.data)
 
         if serializer.is_valid():
             try:
+                device_id = get_device_id(request, serializer.validated_data)
                 user = serializer.save()
 
                 # Generate tokens
-                tokens = JWTUtils.generate_tokens(user)
+                tokens = JWTUtils.generate_tokens(user, device_id=device_id)
 
                 logger.info(f"New user registered: {user.email}")
 
@@ -56,6 +82,8 @@ class UserRegistrationView(APIView):
                     status=status.HTTP_201_CREATED,
                 )
 
+            except PasswordHashingBusy:
+                raise
             except Exception as e:
                 logger.error(f"Registration error: {str(e)}")
                 return Response(
@@ -84,6 +112,7 @@ class UserLoginView(APIView):
     """
 
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [LoginThrottle]
 
     def post(self, request):
         serializer = UserLoginSerializer(data=request.data)
@@ -93,12 +122,13 @@ class UserLoginView(APIView):
                 user = serializer.validated_data["user"]
                 remember_me = serializer.validated_data.get("remember_me", False)
 
-                # Update last login
-                user.last_login = datetime.utcnow()
-                user.save()
+                # Update last login (buffered, see accounts.last_login)
+                record_login(user, datetime.utcnow())
 
                 # Generate tokens
-                tokens = JWTUtils.generate_tokens(user)
+                tokens = JWTUtils.generate_tokens(
+                    user, device_id=get_device_id(request, serializer.validated_data)
+                )
 
                 logger.info(f"User logged in: {user.email}")
 
@@ -152,6 +182,7 @@ class TokenRefreshView(APIView):
     """
 
     permission_classes = [permissions.AllowAny]
+    throttle_classes = [RefreshThrottle]
 
     def post(self, request):
         serializer = RefreshTokenSerializer(data=request.data)
@@ -160,9 +191,76 @@ class TokenRefreshView(APIView):
             refresh_token = serializer.validated_data["refresh"]
 
             try:
-                # Generate new access token
+                # Generate new access token (and rotated refresh token)
                 new_tokens = JWTUtils.refresh_access_token(refresh_token)
 
+                tokens = {
+                    "access": new_tokens["access"],
+                    "expires": new_tokens["expires"].isoformat(),
+                }
+                if "refresh" in new_tokens:
+                    tokens["refresh"] = new_tokens["refresh"]
+                    tokens["refresh_expires"] = new_tokens[
+                        "refresh_expires"
+                    ].isoformat()
+
+                return Response(
+                    {
+                        "success": True,
+                        "message": "Token refreshed successfully",
+                        "tokens": tokens,
+                    },
+                    status=status.HTTP_200_OK,
+                )
+
+            except jwt.InvalidTokenError as e:
+                return Response(
+                    {
+                        "success": False,
+                        "message": "Token refresh failed",
+                        "error": str(e),
+                    },
+                    status=status.HTTP_401_UNAUTHORIZED,
+                )
+            except Exception as e:
+                logger.error(f"Token refresh error: {str(e)}")
+                return Response(
+                    {
+                        "success": False,
+                        "message": "Token refresh failed",
+                        "error": str(e),
+                    },
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+
+        return Response(
+            {
+                "success": False,
+                "message": "Validation failed",
+                "errors": serializer.errors,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+
+class SlidingTokenRefreshView(APIView):
+    """
+    Sliding token refresh endpoint.
+    POST /api/auth/token/refresh-sliding/
+    """
+
+    permission_classes = [permissions.AllowAny]
+    throttle_classes = [RefreshThrottle]
+
+    def post(self, request):
+        serializer = SlidingTokenRefreshSerializer(data=request.data)
+
+        if serializer.is_valid():
+            try:
+                new_tokens = JWTUtils.refresh_sliding_token(
+                    serializer.validated_data["token"]
+                )
+
                 return Response(
                     {
                         "success": True,
@@ -170,6 +268,9 @@ class TokenRefreshView(APIView):
                         "tokens": {
                             "access": new_tokens["access"],
                             "expires": new_tokens["expires"].isoformat(),
+                            "refresh_expires": new_tokens[
+                                "refresh_expires"
+                            ].isoformat(),
                         },
                     },
                     status=status.HTTP_200_OK,
@@ -185,7 +286,7 @@ class TokenRefreshView(APIView):
                     status=status.HTTP_401_UNAUTHORIZED,
                 )
             except Exception as e:
-                logger.error(f"Token refresh error: {str(e)}")
+                logger.error(f"Sliding token refresh error: {str(e)}")
                 return Response(
                     {
                         "success": False,
@@ -205,6 +306,56 @@ class TokenRefreshView(APIView):
         )
 
 
+class TokenIntrospectionView(APIView):
+    """
+    Token introspection endpoint for internal services (RFC 7662 style).
+    POST /api/auth/introspect/
+
+    Accepts ``{"token": ...}`` and answers with a single RFC 7662 response,
+    or ``{"tokens": [...]}`` and answers with one result per token.
+    """
+
+    authentication_classes = []
+    permission_classes = [HasIntrospectionKey]
+
+    def post(self, request):
+        serializer = TokenIntrospectionSerializer(data=request.data)
+
+        if serializer.is_valid():
+            data = serializer.validated_data
+            try:
+                if "token" in data:
+                    return Response(JWTUtils.introspect_tokens([data["token"]])[0])
+
+                return Response(
+                    {
+                        "success": True,
+                        "results": JWTUtils.introspect_tokens(data["tokens"]),
+                    },
+                    status=status.HTTP_200_OK,
+                )
+
+            except Exception as e:
+                logger.error(f"Token introspection error: {str(e)}")
+                return Response(
+                    {
+                        "success": False,
+                        "message": "Token introspection failed",
+                        "error": str(e),
+                    },
+                    status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                )
+
+        return Response(
+            {
+                "success": False,
+                "message": "Validation failed",
+                "errors": serializer.errors,
+            },
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+
 class UserProfileView(APIView):
     """
     User profile endpoint.
@@ -217,8 +368,7 @@ class UserProfileView(APIView):
     def get(self, request):
         """Get current user profile."""
         try:
-            # Get user from database (request.user might be cached)
-            user = User.objects.get(id=request.user.id)
+            user = request.user.load()
 
             return Response(
                 {"success": True, "user": UserSerializer(user).data},
@@ -234,7 +384,7 @@ class UserProfileView(APIView):
     def patch(self, request):
         """Update user profile."""
         try:
-            user = User.objects.get(id=request.user.id)
+            user = request.user.load()
             serializer = UserUpdateSerializer(
                 data=request.data, partial=True, context={"user": user}
             )
@@ -285,7 +435,7 @@ class ChangePasswordView(APIView):
 
     def post(self, request):
         try:
-            user = User.objects.get(id=request.user.id)
+            user = request.user.load()
             serializer = ChangePasswordSerializer(data=request.data)
 
             if serializer.is_valid():
@@ -330,6 +480,8 @@ class ChangePasswordView(APIView):
                 {"success": False, "message": "User not found"},
                 status=status.HTTP_404_NOT_FOUND,
             )
+        except PasswordHashingBusy:
+            raise
         except Exception as e:
             logger.error(f"Password change error: {str(e)}")
             return Response(
@@ -352,7 +504,8 @@ class LogoutView(APIView):
 
     def post(self, request):
         try:
-            user = User.objects.get(id=request.user.id)
+            # The identity proxy carries the id and email; no document load
+            user = request.user
             serializer = LogoutSerializer(data=request.data)
 
             if serializer.is_valid():
@@ -367,6 +520,10 @@ class LogoutView(APIView):
                     # Logout from current device only
                     if refresh_token:
                         JWTUtils.logout_user(user, refresh_token)
+                    # The presented access token isn't tied to the session;
+                    # revoke it too, or a sliding token could keep being
+                    # extended until its refresh_exp
+                    JWTUtils.blacklist_token(request.auth)
                     message = "Logged out successfully"
 
                 logger.info(
@@ -391,11 +548,6 @@ class LogoutView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        except User.DoesNotExist:
-            return Response(
-                {"success": False, "message": "User not found"},
-                status=status.HTTP_404_NOT_FOUND,
-            )
         except Exception as e:
             logger.error(f"Logout error: {str(e)}")
             return Response(
@@ -411,11 +563,26 @@ def auth_status(request):
     Check authentication status.
     GET /api/auth/status/
     """
-    if hasattr(request, "user") and request.user and hasattr(request.user, "id"):
+    if request.user.is_authenticated:
         try:
-            user = User.objects.get(id=request.user.id)
+            user = request.user.load()
             return Response({"authenticated": True, "user": UserSerializer(user).data})
         except User.DoesNotExist:
             pass
 
     return Response({"authenticated": False, "user": None})
+
+
+@api_view(["GET"])
+@authentication_classes([])
+@permission_classes([permissions.AllowAny])
+def jwks(request):
+    """
+    Public keys for verifying our tokens (RFC 7517 JWK Set).
+    GET /api/auth/jwks/
+    """
+    response = Response(JWTUtils.jwks())
+    response["Cache-Control"] = (
+        f"public, max-age={settings.JWT_SETTINGS.get('JWKS_MAX_AGE', 3600)}"
+    )
+    return response
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand, CommandError
+from accounts.indexes import plan_summary
+from api.models import Comment, Post
+
+# Placeholder ids; plans depend on the query shape, not the values
+SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+
+# The listing queries of api/views.py and api/serializers.py, each of which
+# must be answered from an index without an in-memory sort
+QUERY_SHAPES = [
+    (
+        "post feed",
+        lambda: Post.objects.filter(status="published").order_by("-published_at"),
+    ),
+    (
+        "posts by category",
+        lambda: Post.objects.filter(status="published", category=SAMPLE_ID).order_by(
+            "-published_at"
+        ),
+    ),
+    (
+        "posts by author",
+        lambda: Post.objects.filter(status="published", author_id=SAMPLE_ID).order_by(
+            "-published_at"
+        ),
+    ),
+    (
+        "featured posts",
+        lambda: Post.objects.filter(status="published", is_featured=True).order_by(
+            "-published_at"
+        ),
+    ),
+    (
+        "my posts",
+        lambda: Post.objects.filter(author_id=SAMPLE_ID).order_by("-created_at"),
+    ),
+    (
+        "my posts by status",
+        lambda: Post.objects.filter(author_id=SAMPLE_ID, status="draft").order_by(
+            "-created_at"
+        ),
+    ),
+    (
+        "post comments",
+        lambda: Comment.objects.filter(
+            post=SAMPLE_ID, parent=None, is_approved=True
+        ).order_by("-created_at"),
+    ),
+    (
+        "comment replies",
+        lambda: Comment.objects.filter(parent=SAMPLE_ID, is_approved=True).order_by(
+            "created_at"
+        ),
+    ),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Explain the API's listing queries and fail if any of them needs a "
+        "collection scan or an in-memory SORT stage. Run after "
+        "`sync_indexes --apply`."
+    )
+
+    def handle(self, *args, **options):
+        failures = []
+
+        for name, build in QUERY_SHAPES:
+            stages, indexes = plan_summary(build())
+            problems = sorted(stages & {"SORT", "COLLSCAN"})
+            used = ", ".join(sorted(indexes)) or "no index"
+
+            if problems:
+                failures.append(name)
+                self.stdout.write(
+                    self.style.ERROR(f"  {name}: {'+'.join(problems)} ({used})")
+                )
+            else:
+                self.stdout.write(f"  {name}: {used}")
+
+        if failures:
+            raise CommandError(f"Unindexed query shapes: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All query shapes use an index"))
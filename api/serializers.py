@@ -106,7 +106,7 @@ class PostSerializer(serializers.Serializer):
     def get_author(self, obj):
         """Get author information."""
         try:
-            author = User.objects.get(id=obj.author_id)
+            author = User.objects.profile("card").get(id=obj.author_id)
             return AuthorSerializer(author).data
         except User.DoesNotExist:
             return None
@@ -212,7 +212,7 @@ class CommentSerializer(serializers.Serializer):
     def get_author(self, obj):
         """Get author information."""
         try:
-            author = User.objects.get(id=obj.author_id)
+            author = User.objects.profile("card").get(id=obj.author_id)
             return AuthorSerializer(author).data
         except User.DoesNotExist:
             return None
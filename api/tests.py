@@ -1,3 +1,45 @@
+import unittest
+from django.conf import settings
 from django.test import TestCase
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+from accounts.indexes import plan_summary
+from api.management.commands.check_query_plans import QUERY_SHAPES
+from api.models import Comment, Post
 
-# Create your tests here.
+
+def mongodb_reachable():
+    """Ping the configured server without waiting out the 30s default."""
+    client = MongoClient(
+        settings.MONGODB_SETTINGS["host"],
+        settings.MONGODB_SETTINGS["port"],
+        serverSelectionTimeoutMS=1000,
+    )
+    try:
+        client.admin.command("ping")
+        return True
+    except PyMongoError:
+        return False
+    finally:
+        client.close()
+
+
+class QueryPlanTests(TestCase):
+    """The listing queries of check_query_plans, as a CI check."""
+
+    @classmethod
+    def setUpClass(cls):
+        if not mongodb_reachable():
+            raise unittest.SkipTest("MongoDB is not reachable")
+        super().setUpClass()
+        Post.ensure_indexes()
+        Comment.ensure_indexes()
+
+    def test_query_shapes_use_an_index(self):
+        for name, build in QUERY_SHAPES:
+            with self.subTest(name):
+                stages, indexes = plan_summary(build())
+                self.assertFalse(
+                    stages & {"SORT", "COLLSCAN"},
+                    f"{name} is not answered from an index: {sorted(stages)}",
+                )
@@ -4,6 +4,7 @@ from rest_framework.views import APIView
 from rest_framework.decorators import api_view, permission_classes
 from django.core.cache import cache
 from accounts.models import User
+from accounts.throttling import LikeThrottle
 from .models import Post, Category, Comment, UserActivity
 from .serializers import (
     PostSerializer,
@@ -603,6 +604,7 @@ class PostLikeView(APIView):
     """
 
     permission_classes = [permissions.IsAuthenticated]
+    throttle_classes = [LikeThrottle]
 
     def post(self, request, post_slug):
         """Toggle like on a post."""
@@ -1,7 +1,7 @@
 import os
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 import mongoengine
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -36,6 +36,9 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    # Non-blocking JWT authentication under ASGI (pass-through under WSGI)
+    "accounts.middleware.AsyncJWTAuthenticationMiddleware",
+    "accounts.middleware.TokenRefreshMiddleware",  # Refresh hint headers
 ]
 
 ROOT_URLCONF = "myproject.urls"
@@ -77,6 +80,11 @@ MONGODB_SETTINGS = {
     "connect": False,  # Important for avoiding connection issues
 }
 
+# Build indexes lazily on first use of each collection. Deployments that
+# build them with `manage.py sync_indexes --apply` can turn this off; the
+# unique email/username/session indexes must exist either way
+MONGODB_AUTO_CREATE_INDEX = config("MONGODB_AUTO_CREATE_INDEX", default=True, cast=bool)
+
 # Connect to MongoDB
 try:
     mongoengine.connect(**MONGODB_SETTINGS)
@@ -134,6 +142,36 @@ REST_FRAMEWORK = {
     "EXCEPTION_HANDLER": "accounts.exceptions.custom_exception_handler",
 }
 
+# Sliding-window limits (see accounts.throttling), checked in Redis before
+# the view touches MongoDB or hashes a password. Rates are "count/period"
+# with s, m, h or d periods, e.g. "5/m" or "100/15m".
+AUTH_THROTTLES = {
+    "login": {"ip": "20/m", "email": "5/m", "global": "200/s"},
+    "register": {"ip": "5/h", "global": "20/s"},
+    "refresh": {"ip": "60/m", "global": "500/s"},
+    "like": {"user": "30/m", "ip": "120/m"},
+}
+
+# Hashers keep Django's algorithm names; their cost (and which one new
+# hashes use) comes from `manage.py calibrate_password_hasher --write`
+PASSWORD_HASHERS = [
+    "accounts.hashers.CalibratedPBKDF2PasswordHasher",
+    "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    "accounts.hashers.CalibratedArgon2PasswordHasher",
+    "accounts.hashers.CalibratedBCryptSHA256PasswordHasher",
+    "django.contrib.auth.hashers.ScryptPasswordHasher",
+]
+PASSWORD_HASHER_CALIBRATION_FILE = config(
+    "PASSWORD_HASHER_CALIBRATION_FILE", default=str(BASE_DIR / "password_hasher.json")
+)
+
+# Password hashes running at once per worker process; further logins wait
+# up to the queue timeout (seconds) and then get a 503
+PASSWORD_HASHING_CONCURRENCY = config(
+    "PASSWORD_HASHING_CONCURRENCY", default=max(1, (os.cpu_count() or 2) // 2), cast=int
+)
+PASSWORD_HASHING_QUEUE_TIMEOUT = 5.0
+
 # Authentication backends
 AUTHENTICATION_BACKENDS = [
     "accounts.authentication.MongoEngineBackend",  # Our MongoDB backend
@@ -144,19 +182,68 @@ AUTHENTICATION_BACKENDS = [
 JWT_SETTINGS = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=15),  # Short-lived for security
     "REFRESH_TOKEN_LIFETIME": timedelta(days=7),  # Longer-lived
+    "SLIDING_TOKENS": False,  # Issue sliding-session access tokens
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),  # Optional: sliding session
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
+    # Key ring: list of {"kid", "algorithm", "secret" | "private_key_path" |
+    # "public_key_path"}. Empty means a single HS256 key from SIGNING_KEY.
+    # Keep a {"kid": "default", "algorithm": "HS256", "secret": SECRET_KEY}
+    # entry while tokens issued without a kid header are still in flight.
+    "SIGNING_KEYS": [],
+    "CURRENT_SIGNING_KID": config("JWT_CURRENT_KID", default=""),
+    # JSON key ring ({"current_kid", "keys": [...]}) reloaded on change;
+    # overrides SIGNING_KEYS. Rotate with `manage.py rotate_signing_key`.
+    "KEY_RING_FILE": config("JWT_KEY_RING_FILE", default=""),
+    "KEY_RING_CHECK_INTERVAL": 5,  # seconds between file mtime checks
+    "JWKS_MAX_AGE": 3600,  # Cache-Control max-age for /api/auth/jwks/
+    # "full" claim names or "compact" (sub/tt/em/un/rx); both always decode
+    "TOKEN_CLAIM_PROFILE": "full",
+    "TOKEN_USER_CLAIMS": True,  # Put email/username in tokens
     "AUTH_HEADER_TYPES": ("Bearer",),
     "AUTH_HEADER_NAME": "HTTP_AUTHORIZATION",
     # Auto-refresh settings
     "ROTATE_REFRESH_TOKENS": True,  # Generate new refresh token on use
     "BLACKLIST_AFTER_ROTATION": True,  # Invalidate old refresh token
+    # Random refresh tokens looked up by hash in the sessions collection
+    # instead of signed JWTs
+    "OPAQUE_REFRESH_TOKENS": False,
+    # Concurrent refreshes of the same token share one result; the leader's
+    # lock lasts at most this long (0 disables coalescing)
+    "REFRESH_COALESCE_WINDOW": timedelta(seconds=10),
+    # Follower wait for the leader; results are shared for this long only
+    "REFRESH_COALESCE_WAIT": timedelta(seconds=2),
     "UPDATE_LAST_LOGIN": True,  # Track last activity
+    # Buffer last_login per worker and flush as one bulk $max write
+    "LAST_LOGIN_WRITE_BEHIND": True,
+    "LAST_LOGIN_FLUSH_INTERVAL": 5,  # seconds
+    "LAST_LOGIN_MAX_PENDING": 10000,  # flush early past this many users
     # Grace period settings
     "ACCESS_TOKEN_GRACE_PERIOD": timedelta(minutes=2),  # Allow expired tokens briefly
     "REFRESH_TOKEN_GRACE_PERIOD": timedelta(hours=1),  # Grace for refresh
+    # Suggest a refresh (X-Token-Refresh-Suggested) this close to expiry
+    "REFRESH_HINT_WINDOW": timedelta(minutes=2),
+    # Per-worker LRU of verified token payloads (0 disables)
+    "TOKEN_CACHE_SIZE": 10000,
+    # User identities: per-worker L1 in front of Redis, invalidated over
+    # pub/sub when the user is saved
+    "USER_CACHE_TIMEOUT": 300,  # seconds in Redis
+    "USER_CACHE_LOCAL_TTL": 30,  # seconds in worker memory
+    "USER_CACHE_LOCAL_SIZE": 10000,  # 0 disables the in-process tier
+    "USER_NEGATIVE_CACHE_TIMEOUT": 60,  # seconds to remember unknown user ids
+    # Concurrent misses for one user wait this long for a single loader
+    "USER_LOAD_WAIT": timedelta(seconds=2),
+    # Per-worker Bloom filter of blacklisted jtis, synced over Redis pub/sub
+    "BLACKLIST_FILTER_ENABLED": True,
+    "BLACKLIST_FILTER_CAPACITY": 100000,
+    "BLACKLIST_FILTER_ERROR_RATE": 0.001,
+    "BLACKLIST_FILTER_REBUILD_INTERVAL": 600,  # seconds
+    # Token introspection for internal services (POST /api/auth/introspect/).
+    # Callers send one of these keys in X-Introspection-Key; empty disables.
+    "INTROSPECTION_KEYS": config("JWT_INTROSPECTION_KEYS", default="", cast=Csv()),
+    "INTROSPECTION_MAX_BATCH": 500,
+    "INTROSPECTION_CACHE_TTL": 5,  # seconds; revocations may lag this much
 }
 
 # CORS settings
@@ -168,6 +255,11 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 CORS_ALLOW_CREDENTIALS = True
+CORS_EXPOSE_HEADERS = [
+    "X-Token-Refresh-Suggested",
+    "X-Token-Expires-In",
+    "X-Token-Grace-Period",
+]
 CORS_ALLOW_ALL_ORIGINS = DEBUG  # Only in development
 
 # Internationalization
@@ -0,0 +1,101 @@
+"""
+Microbenchmark: PyJWT vs TokenCodec for minting and verifying access tokens.
+
+Run from the project root (no Django settings needed):
+
+    python scripts/bench_token_codec.py
+"""
+
+import os
+import sys
+import timeit
+import uuid
+from datetime import datetime, timedelta
+
+import jwt
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from accounts.keys import KeyRing  # noqa: E402
+from accounts.token_codec import TokenCodec  # noqa: E402
+
+NUMBER = 20000
+
+key_ring = KeyRing.from_settings(
+    {"SIGNING_KEY": "bench-secret-key-" + "x" * 32, "ALGORITHM": "HS256"}
+)
+
+
+def make_payload():
+    now = datetime.utcnow()
+    return {
+        "user_id": str(uuid.uuid4()),
+        "email": "author@example.com",
+        "username": "author",
+        "token_type": "access",
+        "gen": 0,
+        "iat": now,
+        "exp": now + timedelta(hours=1),
+        "jti": str(uuid.uuid4()),
+    }
+
+
+def pyjwt_encode(payload):
+    key = key_ring.current
+    return jwt.encode(
+        payload, key.signing_key, algorithm=key.algorithm, headers={"kid": key.kid}
+    )
+
+
+def pyjwt_decode(token):
+    header = jwt.get_unverified_header(token)
+    key = key_ring.get(header.get("kid"))
+    return jwt.decode(
+        token,
+        key.verification_key,
+        algorithms=[key.algorithm],
+        options={"verify_exp": False},
+    )
+
+
+def report(label, seconds):
+    print(f"  {label:<28} {seconds / NUMBER * 1e6:8.2f} us/op")
+
+
+def main():
+    payload = make_payload()
+
+    print(f"Encode ({NUMBER} iterations)")
+    report("pyjwt", timeit.timeit(lambda: pyjwt_encode(payload), number=NUMBER))
+
+    codecs = {
+        "full": TokenCodec(key_ring, profile="full"),
+        "compact": TokenCodec(key_ring, profile="compact"),
+        "compact, no user claims": TokenCodec(
+            key_ring, profile="compact", include_user_claims=False
+        ),
+    }
+    for name, codec in codecs.items():
+        report(
+            f"codec ({name})",
+            timeit.timeit(lambda: codec.encode(payload), number=NUMBER),
+        )
+
+    print(f"\nDecode ({NUMBER} iterations)")
+    token = pyjwt_encode(payload)
+    report("pyjwt", timeit.timeit(lambda: pyjwt_decode(token), number=NUMBER))
+    for name, codec in codecs.items():
+        minted = codec.encode(payload)
+        report(
+            f"codec ({name})",
+            timeit.timeit(lambda: codec.decode(minted), number=NUMBER),
+        )
+
+    print("\nToken size")
+    print(f"  {'pyjwt':<28} {len(token):5d} bytes")
+    for name, codec in codecs.items():
+        print(f"  {'codec (' + name + ')':<28} {len(codec.encode(payload)):5d} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Benchmark: loading a user with each field profile vs the whole document.
+
+Needs the project's MongoDB (settings are read from .env). A throwaway user
+with a long bio and a legacy refresh_tokens list is created and removed:
+
+    python scripts/bench_user_profiles.py
+"""
+
+import os
+import sys
+import timeit
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "myproject.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import bson  # noqa: E402
+from accounts.models import User  # noqa: E402
+
+NUMBER = 2000
+
+
+def make_user():
+    suffix = uuid.uuid4().hex[:12]
+    user = User(
+        email=f"bench-{suffix}@example.com",
+        username=f"bench-{suffix}",
+        password="pbkdf2_sha256$1000000$" + "x" * 66,
+        first_name="Bench",
+        last_name="User",
+        bio="lorem ipsum " * 200,
+        profile_image="https://example.com/" + "i" * 200 + ".png",
+        refresh_tokens=[str(uuid.uuid4()) for _ in range(200)],
+    )
+    user.save()
+    return user
+
+
+def document_size(user_id, projection=None):
+    document = User._get_collection().find_one({"_id": user_id}, projection)
+    return len(bson.encode(document))
+
+
+def report(label, seconds, size):
+    print(f"  {label:<12} {seconds / NUMBER * 1e6:9.1f} us/load {size:7d} bytes")
+
+
+def main():
+    user = make_user()
+    try:
+        print(f"Loading one user {NUMBER} times:")
+        seconds = timeit.timeit(lambda: User.objects.get(id=user.id), number=NUMBER)
+        report("unprofiled", seconds, document_size(user.id))
+
+        for name in ("full", "card", "auth"):
+            queryset = User.objects.profile(name)
+            if name == "full":
+                projection = {f: 0 for f in User.FULL_PROFILE_EXCLUDE}
+            else:
+                projection = {
+                    User._fields[f].db_field: 1 for f in User.FIELD_PROFILES[name]
+                }
+            seconds = timeit.timeit(
+                lambda: queryset.clone().get(id=user.id), number=NUMBER
+            )
+            report(name, seconds, document_size(user.id, projection))
+    finally:
+        User._get_collection().delete_one({"_id": user.id})
+
+
+if __name__ == "__main__":
+    main()